@@ -0,0 +1,271 @@
+"""
+Сборка контекста промпта ответа в пределах бюджета токенов.
+
+Промпт ответа = инструкции (SYSTEM_PROMPT) + каталог + скрипты продаж +
+история переписки + блок заказа (order guard) + сообщение клиента. Раньше
+найденные товары, скрипты и история склеивались целиком, и размер промпта
+(а с ним время до первого токена и стоимость) зависел от того, сколько
+нашёл поиск и насколько длинный диалог.
+
+Теперь на весь запрос действует бюджет PROMPT_TOKEN_BUDGET:
+  - инструкции, блок заказа и сообщение клиента не сокращаются — их размер
+    вычитается из бюджета первым;
+  - остаток делится между каталогом, скриптами и историей по долям
+    _SHARES; то, что раздел не использовал, достаётся остальным;
+  - внутри раздела элементы идут по убыванию релевантности (товары — в
+    порядке engine, скрипты — в порядке поиска, история — от новых сообщений
+    к старым, сводка старой переписки — первой) и добавляются, пока
+    помещаются; первый элемент, если не помещается целиком, обрезается.
+
+Токены считаются tiktoken (кодировка модели OPENAI_MODEL). Кодировка
+загружается один раз при старте (load_encoding в lifespan main.py, в пуле
+потоков): при холодном кэше tiktoken скачивает и разбирает файл BPE, и в
+event loop это остановило бы все чаты. Пока кодировка не загружена, без
+tiktoken или без доступа к файлам кодировки — оценка ~3 символа на токен,
+как в ai/llm_gateway.py.
+"""
+
+import logging
+import threading
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any
+
+from config import OPENAI_MODEL, PROMPT_TOKEN_BUDGET
+
+try:
+    import tiktoken
+except ImportError:  # необязательная зависимость
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+PRODUCTS = "products"
+SCRIPTS = "scripts"
+HISTORY = "history"
+
+# Доли бюджета разделов (после инструкций, блока заказа и сообщения клиента)
+_SHARES = {PRODUCTS: 0.4, SCRIPTS: 0.3, HISTORY: 0.3}
+
+_SEPARATORS = {PRODUCTS: "\n---\n", SCRIPTS: "\n---\n", HISTORY: "\n"}
+
+# Символов на токен для оценки без tiktoken
+_CHARS_PER_TOKEN = 3
+
+
+# Кодировка tiktoken (None — не загружена, считаем по длине)
+_tiktoken_encoding: Any = None
+
+
+def load_encoding() -> bool:
+    """
+    Загрузить кодировку tiktoken (блокирующий вызов — только вне event loop).
+
+    Returns:
+        True, если токены считаются tiktoken.
+    """
+    global _tiktoken_encoding
+    if _tiktoken_encoding is not None:
+        return True
+    if tiktoken is None:
+        return False
+    try:
+        try:
+            encoding = tiktoken.encoding_for_model(OPENAI_MODEL)
+        except KeyError:
+            encoding = tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        logger.warning(f"tiktoken encoding unavailable, estimating tokens by length: {e}")
+        return False
+    _tiktoken_encoding = encoding
+    # Оценки по длине, посчитанные до загрузки, больше не нужны
+    count_tokens.cache_clear()
+    return True
+
+
+def _encoding():
+    return _tiktoken_encoding
+
+
+@lru_cache(maxsize=4096)
+def count_tokens(text: str) -> int:
+    """Число токенов текста (tiktoken или оценка по длине)."""
+    if not text:
+        return 0
+    encoding = _encoding()
+    if encoding is None:
+        return len(text) // _CHARS_PER_TOKEN + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """Начало текста не длиннее max_tokens токенов."""
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+    # Один токен — на многоточие
+    keep = max_tokens - 1
+    encoding = _encoding()
+    if encoding is None:
+        return text[:keep * _CHARS_PER_TOKEN].rstrip() + "…"
+    return encoding.decode(encoding.encode(text, disallowed_special=())[:keep]).rstrip() + "…"
+
+
+def _allocate(available: int, needs: dict[str, int]) -> dict[str, int]:
+    """Поделить available по _SHARES; неиспользованное разделом — остальным пропорционально долям."""
+    budgets = {name: 0 for name in needs}
+    pending = {name for name, need in needs.items() if need > 0}
+    left = available
+    while pending and left > 0:
+        total_share = sum(_SHARES[name] for name in pending)
+        satisfied = {
+            name for name in pending
+            if needs[name] - budgets[name] <= left * _SHARES[name] / total_share
+        }
+        if not satisfied:
+            for name in pending:
+                budgets[name] += int(left * _SHARES[name] / total_share)
+            break
+        for name in satisfied:
+            left -= needs[name] - budgets[name]
+            budgets[name] = needs[name]
+        pending -= satisfied
+    return budgets
+
+
+def _fit(items: list[str], budget: int, separator: str) -> list[str]:
+    """Элементы по порядку, пока помещаются; первый при нехватке места обрезается."""
+    kept: list[str] = []
+    used = 0
+    sep_tokens = count_tokens(separator)
+    for item in items:
+        cost = count_tokens(item) + (sep_tokens if kept else 0)
+        if used + cost > budget:
+            if not kept:
+                truncated = truncate_tokens(item, budget)
+                if truncated:
+                    kept.append(truncated)
+            break
+        kept.append(item)
+        used += cost
+    return kept
+
+
+@dataclass
+class PromptContext:
+    """Разделы промпта после сокращения и их размер в токенах."""
+
+    product_context: str
+    sales_context: str
+    conversation_history: str
+    tokens: dict[str, int] = field(default_factory=dict)
+    dropped: dict[str, int] = field(default_factory=dict)
+    truncated: bool = False
+
+    @property
+    def total_tokens(self) -> int:
+        return sum(self.tokens.values())
+
+
+def assemble(
+    instructions: str,
+    order_guard: str,
+    user_message: str,
+    products: list[str],
+    scripts: list[str],
+    history_lines: list[str],
+    history_summary: str | None = None,
+    budget: int = PROMPT_TOKEN_BUDGET,
+) -> PromptContext:
+    """
+    Собрать каталог, скрипты и историю в пределах бюджета.
+
+    Args:
+        instructions: Инструкции (шаблон SYSTEM_PROMPT)
+        order_guard: Блок состояния заказа
+        user_message: Сообщение клиента
+        products: Тексты товаров, самые релевантные первыми
+        scripts: Тексты скриптов продаж, самые релевантные первыми
+        history_lines: Строки истории, старые первыми
+        history_summary: Строка сводки старой переписки (всегда первой в истории)
+        budget: Бюджет токенов на весь запрос; 0 — без ограничения
+    """
+    header = [history_summary] if history_summary else []
+    full = {
+        PRODUCTS: products,
+        SCRIPTS: scripts,
+        # От новых к старым: при нехватке места выпадают самые старые сообщения
+        HISTORY: header + history_lines[::-1],
+    }
+    fixed = count_tokens(instructions) + count_tokens(order_guard) + count_tokens(user_message)
+
+    if budget > 0:
+        needs = {
+            name: sum(count_tokens(item) for item in items)
+            + count_tokens(_SEPARATORS[name]) * max(0, len(items) - 1)
+            for name, items in full.items()
+        }
+        budgets = _allocate(max(0, budget - fixed), needs)
+        kept = {name: _fit(items, budgets[name], _SEPARATORS[name]) for name, items in full.items()}
+    else:
+        kept = dict(full)
+
+    # Сводка (если поместилась) первой, сообщения — снова в хронологическом порядке
+    history_kept = kept[HISTORY]
+    head = 1 if header and history_kept else 0
+    history_kept = history_kept[:head] + history_kept[head:][::-1]
+
+    context = PromptContext(
+        product_context=_SEPARATORS[PRODUCTS].join(kept[PRODUCTS]),
+        sales_context=_SEPARATORS[SCRIPTS].join(kept[SCRIPTS]),
+        conversation_history=_SEPARATORS[HISTORY].join(history_kept),
+        dropped={name: len(full[name]) - len(kept[name]) for name in full},
+        truncated=any(kept[name] and kept[name][0] != full[name][0] for name in full),
+    )
+    context.tokens = {
+        "fixed": fixed,
+        PRODUCTS: count_tokens(context.product_context),
+        SCRIPTS: count_tokens(context.sales_context),
+        HISTORY: count_tokens(context.conversation_history),
+    }
+    prompt_stats.record(context)
+    return context
+
+
+class PromptStats:
+    """Размер промптов ответа и число сокращённых."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.prompts = 0
+        self.trimmed = 0
+        self.tokens_total = 0
+        self.tokens_max = 0
+
+    def record(self, context: PromptContext) -> None:
+        total = context.total_tokens
+        with self._lock:
+            self.prompts += 1
+            self.trimmed += int(context.truncated or any(context.dropped.values()))
+            self.tokens_total += total
+            self.tokens_max = max(self.tokens_max, total)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "budget": PROMPT_TOKEN_BUDGET,
+                "tokenizer": "tiktoken" if _encoding() is not None else "estimate",
+                "prompts": self.prompts,
+                "trimmed": self.trimmed,
+                "tokens_avg": round(self.tokens_total / self.prompts) if self.prompts else 0,
+                "tokens_max": self.tokens_max,
+            }
+
+
+prompt_stats = PromptStats()
+
+
+def get_prompt_budget_stats() -> dict:
+    """Статистика размера промптов ответа (для /health)."""
+    return prompt_stats.snapshot()
@@ -11,8 +11,13 @@ import time
 
 from openai import AsyncOpenAI
 
+from ai import context_budget, fast_path, history_summary, response_cache
+from ai import model_router
 from ai.prompts import SYSTEM_PROMPT
-from ai.rag import search_products, search_scripts
+from ai.rag import cached_query_embedding, get_scripts_version, search_products, search_scripts
+from ai.text_features import keyword_group, text_features
+from catalog.registry import find_mentioned_product, resolve_product
+from catalog.sheets_loader import get_catalog_version
 from db.conversations import (
     get_conversation_history,
     save_message,
@@ -29,9 +34,11 @@ from db.conversations import (
     set_order_pending_confirm,
 )
 from gdrive.photo_mapper import find_product_photos, tokenize_text, select_photos_with_color_variety
+from gdrive.photo_prefetch import discard_prefetched, prefetch_photos
 from inventory.stock_checker import check_product_availability, format_availability_message
 from greenapi.client import send_text, send_multiple_images
 from notifications import notify_error
+from executors import run_blocking
 from integrations.n8n import notify_order_confirmed
 from integrations.order_notifications import notify_order_to_group
 from ai.order_manager import (
@@ -55,16 +62,21 @@ from ai.order_manager import (
 )
 from config import (
     OPENAI_API_KEY,
-    OPENAI_MODEL,
     MAX_PHOTOS_PER_MESSAGE,
     MAX_PHOTOS_PRODUCT_SHOWCASE,
+    PHOTO_PREFETCH_COUNT,
+    PHOTO_PREFETCH_ENABLED,
     MAX_PHOTOS_PER_COLOR,
     MANAGER_CHAT_IDS,
+    FAST_PATH_ENABLED,
+    HISTORY_SUMMARY_ENABLED,
+    RESPONSE_CACHE_ENABLED,
 )
 
 logger = logging.getLogger(__name__)
 
-openai_client = AsyncOpenAI(api_key=OPENAI_API_KEY)
+# Повторами и лимитами управляет ai/llm_gateway.py
+openai_client = AsyncOpenAI(api_key=OPENAI_API_KEY, max_retries=0)
 
 
 async def transcribe_voice(audio_bytes: bytes, mime_type: str = "audio/ogg") -> str | None:
@@ -73,10 +85,14 @@ async def transcribe_voice(audio_bytes: bytes, mime_type: str = "audio/ogg") ->
     if "mpeg" in mime_type or "mpga" in mime_type:
         ext = "mp3"
     try:
-        transcript = await openai_client.audio.transcriptions.create(
-            model="whisper-1",
-            file=(f"voice.{ext}", audio_bytes),
-            language="ru",
+        transcript = await model_router.call(
+            model_router.TASK_TRANSCRIPTION,
+            "whisper-1",
+            lambda: openai_client.audio.transcriptions.create(
+                model="whisper-1",
+                file=(f"voice.{ext}", audio_bytes),
+                language="ru",
+            ),
         )
         text = transcript.text.strip()
         logger.info(f"Whisper transcription ({len(audio_bytes)} bytes): {text[:100]}")
@@ -92,6 +108,8 @@ _PHOTO_REQUEST_PATTERNS = [
     "скинь", "скиньте", "пришли", "пришлите", "кинь", "киньте",
     "отправь", "отправьте",
 ]
+_PHOTO_REQUEST = keyword_group(_PHOTO_REQUEST_PATTERNS)
+_LOOKS_LIKE_RE = re.compile(r"как\s+(?:он\s+выгляд|выглядит)")
 
 _PRODUCT_HINT_TOKENS = {
     "chanel", "шанел", "шанель", "miu", "miu miu", "джимми", "jimmy", "choo",
@@ -103,6 +121,7 @@ _PRODUCT_RAW_HINTS = [
     "джимми", "jimmy", "чу", "choo", "саеда", "saeda", "азия", "azia",
     "миу", "miu", "arcadie", "слингбэк", "slingback",
 ]
+_PRODUCT_RAW = keyword_group(_PRODUCT_RAW_HINTS)
 
 # Слова категорий товаров — если клиент упоминает категорию, это новый запрос, а не follow-up
 _CATEGORY_WORDS = {
@@ -118,7 +137,7 @@ def _is_category_browsing(user_message: str) -> bool:
     """Клиент просматривает категорию ('какие сумки есть', 'покажите кроссовки').
     НЕ считается категорией, если упомянут конкретный бренд/модель.
     """
-    words = re.findall(r'[а-яА-ЯёЁa-zA-Z]+', user_message.lower())
+    words = text_features(user_message).words
     has_category = any(w in _CATEGORY_WORDS for w in words)
     if not has_category:
         return False
@@ -129,18 +148,16 @@ def _is_category_browsing(user_message: str) -> bool:
     return True
 
 
+_BROWSING_BAG = keyword_group(["сумк", "сумоч"])
+_BROWSING_SHOES = keyword_group(["кроссовк", "туфл", "балетк", "обувь", "обуви"])
+
+
 def _detect_browsing_category(user_message: str) -> str:
     """Определить тип товара из категориального запроса. Возвращает product_type или ''."""
-    text_l = user_message.lower()
-    if any(w in text_l for w in ("сумк", "сумоч")):
+    features = text_features(user_message)
+    if features.has_any(_BROWSING_BAG):
         return "bag"
-    if any(w in text_l for w in ("кроссовк", )):
-        return "shoes"
-    if any(w in text_l for w in ("туфл", )):
-        return "shoes"
-    if any(w in text_l for w in ("балетк", )):
-        return "shoes"
-    if any(w in text_l for w in ("обувь", "обуви")):
+    if features.has_any(_BROWSING_SHOES):
         return "shoes"
     return ""
 
@@ -161,47 +178,50 @@ def _is_vague_followup(text: str) -> bool:
     return all(w in vague_patterns for w in words)
 
 
+_ASSISTANT_SHOES = keyword_group(["обув", "туфл", "кроссовк", "балетк", "лофер", "ботин", "каблук"])
+_ASSISTANT_BAG = keyword_group(["сумк", "сумоч", "клатч", "рюкзак"])
+_ASSISTANT_ACCESSORY = keyword_group(["аксессуар", "украшен", "ремен", "ремн", "кошелёк", "кошелек"])
+
+
 def _infer_product_type_from_assistant_message(text: str) -> str:
     """Извлечь тип товара из ответа ассистента."""
-    t = (text or "").lower()
-    if any(x in t for x in ["обув", "туфл", "кроссовк", "балетк", "лофер", "ботин", "каблук"]):
+    features = text_features(text or "")
+    if features.has_any(_ASSISTANT_SHOES):
         return "shoes"
-    if any(x in t for x in ["сумк", "сумоч", "клатч", "рюкзак"]):
+    if features.has_any(_ASSISTANT_BAG):
         return "bag"
-    if any(x in t for x in ["аксессуар", "украшен", "ремен", "ремн", "кошелёк", "кошелек"]):
+    if features.has_any(_ASSISTANT_ACCESSORY):
         return "accessory"
     return ""
 
 
+# Подстрока в ответе ассистента → запрос для поиска фото (по порядку приоритета)
+_SEARCH_HINT_QUERIES = {
+    "кроссовк": "кроссовки",
+    "туфл": "туфли",
+    "балетк": "балетки",
+    "лофер": "лоферы",
+    "ботин": "ботинки",
+    "обув": "обувь",
+    "сумоч": "сумочка",
+    "сумк": "сумка",
+    "клатч": "клатч",
+    "аксессуар": "аксессуары",
+}
+_SEARCH_HINTS = keyword_group(_SEARCH_HINT_QUERIES)
+
+
 def _extract_search_hint_from_assistant(text: str) -> str:
     """Извлечь ключевое слово для поиска фото из предыдущего ответа ассистента."""
-    t = (text or "").lower()
-    for pattern, query in [
-        ("кроссовк", "кроссовки"),
-        ("туфл", "туфли"),
-        ("балетк", "балетки"),
-        ("лофер", "лоферы"),
-        ("ботин", "ботинки"),
-        ("обув", "обувь"),
-        ("сумоч", "сумочка"),
-        ("сумк", "сумка"),
-        ("клатч", "клатч"),
-        ("аксессуар", "аксессуары"),
-    ]:
-        if pattern in t:
-            return query
-    return ""
+    pattern = text_features(text or "").first(_SEARCH_HINTS)
+    return _SEARCH_HINT_QUERIES[pattern] if pattern else ""
 
 
 def _is_photo_request(text: str) -> bool:
-    t = text.lower()
-    if any(p in t for p in _PHOTO_REQUEST_PATTERNS):
-        return True
-    if re.search(r"как\s+он\s+выгляд", t):
-        return True
-    if re.search(r"как\s+выглядит", t):
+    features = text_features(text)
+    if features.has_any(_PHOTO_REQUEST):
         return True
-    return False
+    return bool(_LOOKS_LIKE_RE.search(features.lower))
 
 
 def _build_product_key(user_tokens: set[str], photos: list[dict]) -> str:
@@ -218,18 +238,18 @@ def _build_product_key(user_tokens: set[str], photos: list[dict]) -> str:
 def _should_use_active_product_query(user_message: str, active_product: str) -> bool:
     if not active_product:
         return False
-    user_tokens = tokenize_text(user_message)
-    product_tokens = tokenize_text(active_product)
+    features = text_features(user_message)
+    user_tokens = features.tokens
+    product_tokens = text_features(active_product).tokens
     if user_tokens & product_tokens:
         return False
-    text_l = user_message.lower()
-    if any(h in text_l for h in _PRODUCT_RAW_HINTS):
+    if features.has_any(_PRODUCT_RAW):
         return False
     # If user explicitly names another product/brand, keep current message as query.
     if any(tok in _PRODUCT_HINT_TOKENS for tok in user_tokens):
         return False
     # Клиент упоминает категорию товара ("сумки", "кроссовки", "туфли") — это новый запрос
-    if any(w in _CATEGORY_WORDS for w in re.findall(r'[а-яА-ЯёЁa-zA-Z]+', text_l)):
+    if any(w in _CATEGORY_WORDS for w in features.words):
         return False
     return True
 
@@ -304,6 +324,7 @@ _COLOR_CACHE_TTL = 1800  # 30 minutes
 _AVAILABILITY_HINTS = [
     "есть", "имеется", "в наличии", "бывает", "были", "будет",
 ]
+_AVAILABILITY = keyword_group(_AVAILABILITY_HINTS)
 _MODEL_QUERY_IGNORE_TOKENS = {
     "есть", "какой", "какая", "какие", "нужен", "нужна", "нужны",
     "покажи", "показать", "пришли", "скинь", "модель", "модели",
@@ -384,28 +405,33 @@ def _extract_product_mention(text: str) -> str:
     return brand
 
 
-def _infer_result_product_type(result: dict) -> str:
-    name = _extract_product_name_from_result(result)
+def _infer_result_product_type(result: dict, name: str | None = None) -> str:
+    if name is None:
+        name = _extract_product_name_from_result(result)
     text = (result.get("text") or "")[:260]
     return _infer_product_type_from_text(f"{name} {text}")
 
 
+_NOT_PRODUCT_NAME = keyword_group(["именно по", "описание", "цены", "вместе с ценой", "приветствие"])
+_LABEL_BRANDS = keyword_group(["chanel", "saint", "laurent", "jimmy", "miu", "louis", "golden"])
+_NAME_BRANDS = keyword_group(["chanel", "saint", "laurent", "jimmy", "miu", "louis", "golden", "ysl"])
+
+
 def _looks_like_product_name(name: str) -> bool:
     n = (name or "").strip()
     if not n:
         return False
-    low = n.lower()
-    if any(bad in low for bad in ["именно по", "описание", "цены", "вместе с ценой", "приветствие"]):
+    features = text_features(n)
+    if features.has_any(_NOT_PRODUCT_NAME):
         return False
-    if ":" in n and not any(h in n.lower() for h in ["chanel", "saint", "laurent", "jimmy", "miu", "louis", "golden"]):
+    if ":" in n and not features.has_any(_LABEL_BRANDS):
         return False
-    words = re.findall(r"[a-zA-Zа-яА-ЯёЁ0-9]+", n.lower())
+    words = re.findall(r"[a-zA-Zа-яА-ЯёЁ0-9]+", features.lower)
     if len(words) > 8:
         return False
-    tokens = tokenize_text(n)
-    if tokens & _PRODUCT_HINT_TOKENS:
+    if features.tokens & _PRODUCT_HINT_TOKENS:
         return True
-    if any(b in n.lower() for b in ["chanel", "saint", "laurent", "jimmy", "miu", "louis", "golden", "ysl"]):
+    if features.has_any(_NAME_BRANDS):
         return True
     return False
 
@@ -422,50 +448,56 @@ def _filter_photos_by_requested_type(photos: list[dict], requested_type: str) ->
     return matched
 
 
+_YSL_HINTS = keyword_group(["сан лоран", "ив сан", "saint laurent", "ysl"])
+
+
 def _build_fallback_photo_queries(user_message: str, requested_type: str) -> list[str]:
-    t = (user_message or "").lower()
+    mentions_ysl = text_features(user_message or "").has_any(_YSL_HINTS)
     queries: list[str] = []
     if requested_type == "shoes":
-        if any(x in t for x in ["сан лоран", "ив сан", "saint laurent", "ysl"]):
+        if mentions_ysl:
             queries.append("Saint Laurent Opyum")
     if requested_type == "bag":
-        if any(x in t for x in ["сан лоран", "ив сан", "saint laurent", "ysl"]):
+        if mentions_ysl:
             queries.append("Yves Saint Laurent Monogram")
     return queries
 
 
 def _is_availability_request(text: str) -> bool:
-    t = (text or "").lower()
-    return any(h in t for h in _AVAILABILITY_HINTS)
+    return text_features(text or "").has_any(_AVAILABILITY)
 
 
 def _extract_specific_query_tokens(text: str) -> set[str]:
-    tokens = tokenize_text(text or "")
+    tokens = text_features(text or "").tokens
     specific = set()
     for tok in tokens:
         if not tok or tok.isdigit() or len(tok) < 3:
             continue
         if tok in _MODEL_QUERY_IGNORE_TOKENS:
             continue
-        if tok in _COLOR_PREFIXES.values():
+        if tok in _COLOR_NAMES:
             continue
-        if any(tok.startswith(prefix) for prefix in _COLOR_PREFIXES):
+        if _COLOR_PREFIX_RE.match(tok):
             continue
         specific.add(tok)
     return specific
 
 
 def _match_name_overlap(query_text: str, product_name: str) -> int:
-    q = tokenize_text(query_text or "")
-    p = tokenize_text(product_name or "")
+    q = text_features(query_text or "").tokens
+    p = text_features(product_name or "").tokens
     return len(q & p)
 
 
-def _pick_primary_product_match(product_results: list[dict], query_text: str) -> str:
+def _pick_primary_product_match(
+    product_results: list[dict],
+    query_text: str,
+    analysis: "TurnAnalysis | None" = None,
+) -> str:
     best_name = ""
     best_score = -1
     for r in product_results:
-        name = _extract_product_name_from_result(r)
+        name = analysis.result_name(r) if analysis else _extract_product_name_from_result(r)
         if not name:
             continue
         score = _match_name_overlap(query_text, name)
@@ -475,24 +507,47 @@ def _pick_primary_product_match(product_results: list[dict], query_text: str) ->
     return best_name
 
 
+def _rank_product_results(
+    product_results: list[dict],
+    primary_match: str,
+    active_product: str,
+    analysis: "TurnAnalysis | None" = None,
+) -> list[dict]:
+    """Результаты поиска по релевантности: лучшее совпадение, товар из заказа, остальные по порядку."""
+    primary = (primary_match or "").strip().lower()
+    active = (active_product or "").strip().lower()
+
+    def rank(r: dict) -> int:
+        name = (analysis.result_name(r) if analysis else _extract_product_name_from_result(r)) or ""
+        name = name.strip().lower()
+        if primary and name == primary:
+            return 0
+        if active and name == active:
+            return 1
+        return 2
+
+    return sorted(product_results, key=rank)
+
+
 def _collect_similar_product_names(
     product_results: list[dict],
     requested_type: str = "",
     exclude_names: set[str] | None = None,
     limit: int = 3,
+    analysis: "TurnAnalysis | None" = None,
 ) -> list[str]:
     excluded = {(x or "").strip().lower() for x in (exclude_names or set()) if x}
     names: list[str] = []
     seen = set()
     for r in product_results:
-        name = _extract_product_name_from_result(r)
+        name = analysis.result_name(r) if analysis else _extract_product_name_from_result(r)
         if not name:
             continue
         name_l = name.lower()
         if name_l in seen or name_l in excluded:
             continue
         if requested_type:
-            r_type = _infer_result_product_type(r)
+            r_type = analysis.result_type(r) if analysis else _infer_result_product_type(r)
             if r_type and r_type != requested_type:
                 continue
         seen.add(name_l)
@@ -602,6 +657,20 @@ def _format_order_context_for_prompt(order_ctx: dict, missing_fields: list[str],
     )
 
 
+_ORDER_FIELD_TYPES = {"", "shoes", "bag", "accessory", "other", "unknown"}
+
+
+def _valid_order_fields(parsed: dict) -> bool:
+    """Ответ извлечения полей: строки (или пусто) в полях заказа, известный product_type."""
+    for field in ("city", "product", "product_type", "size", "color", "address"):
+        value = parsed.get(field)
+        if value is not None and not isinstance(value, (str, int, float)):
+            return False
+    if str(parsed.get("product_type") or "").strip().lower() not in _ORDER_FIELD_TYPES:
+        return False
+    return isinstance(parsed.get("ready_to_order", False), (bool, str, int))
+
+
 async def _extract_order_fields(
     user_message: str, history: list[dict], current_ctx: dict, product_names: list[str] | None = None
 ) -> dict:
@@ -634,19 +703,20 @@ async def _extract_order_fields(
         f"Контекст профиля: {json.dumps(current_ctx, ensure_ascii=False)}\n"
         f"История: {history_text}"
     )
+    messages = [
+        {"role": "system", "content": system_text},
+        {"role": "user", "content": user_text},
+    ]
     try:
-        completion = await openai_client.chat.completions.create(
-            model=OPENAI_MODEL,
+        # Маленькая модель; основная — только если JSON не прошёл проверку
+        parsed = await model_router.chat_json(
+            model_router.TASK_EXTRACTION,
+            openai_client,
+            messages,
+            _valid_order_fields,
             temperature=0,
             max_tokens=220,
-            response_format={"type": "json_object"},
-            messages=[
-                {"role": "system", "content": system_text},
-                {"role": "user", "content": user_text},
-            ],
         )
-        raw = completion.choices[0].message.content or "{}"
-        parsed = json.loads(raw)
         return {
             "city": str(parsed.get("city") or ""),
             "product": str(parsed.get("product") or ""),
@@ -749,23 +819,42 @@ _COLOR_PREFIXES = {
     "коричнев": "коричневые", "brown": "коричневые",
     "зелен": "зеленые", "green": "зеленые",
 }
+_COLORS = keyword_group(_COLOR_PREFIXES)
+_COLOR_NAMES = frozenset(_COLOR_PREFIXES.values())
+_COLOR_PREFIX_RE = re.compile("|".join(re.escape(prefix) for prefix in _COLOR_PREFIXES))
 
 
 def _detect_color_in_text(text: str) -> str | None:
     """Определить цвет, упомянутый в тексте. Возвращает нормализованный ключ или None."""
-    t = text.lower()
-    for prefix, color_key in _COLOR_PREFIXES.items():
-        if prefix in t:
-            return color_key
-    return None
+    prefix = text_features(text).first(_COLORS)
+    return _COLOR_PREFIXES[prefix] if prefix else None
 
 
 def _detect_color_from_filename(filename: str) -> str:
-    f = (filename or "").lower()
-    for prefix, color_name in _COLOR_PREFIXES.items():
-        if prefix in f:
-            return color_name
-    return ""
+    prefix = text_features(filename or "").first(_COLORS)
+    return _COLOR_PREFIXES[prefix] if prefix else ""
+
+
+async def _resolve_catalog_product(product_name: str):
+    """
+    Товар каталога с наличием и фото из реестра (catalog/registry.py).
+    None — название не сопоставилось с каталогом, нужен прежний путь.
+    """
+    if not (product_name or "").strip():
+        return None
+    try:
+        return await run_blocking("sheets", resolve_product, product_name)
+    except Exception as e:
+        logger.warning(f"Failed to resolve '{product_name}' in product registry: {e}")
+        return None
+
+
+async def _product_photos(product_name: str) -> list[dict]:
+    """Фото товара: из реестра, если товар в каталоге, иначе поиском по названию."""
+    record = await _resolve_catalog_product(product_name)
+    if record is not None and record.photos:
+        return list(record.photos)
+    return await find_product_photos(product_name=product_name)
 
 
 async def _is_color_required(product_name: str) -> bool:
@@ -778,7 +867,7 @@ async def _is_color_required(product_name: str) -> bool:
         if time.time() - ts < _COLOR_CACHE_TTL:
             return value
     try:
-        photos = await find_product_photos(product_name=product_name)
+        photos = await _product_photos(product_name)
         colors = {_detect_color_from_filename(p.get("filename", "")) for p in photos}
         colors.discard("")
         required = len(colors) > 1
@@ -794,7 +883,7 @@ async def _get_available_colors_for_product(product_name: str) -> set[str]:
     if not product:
         return set()
     try:
-        photos = await find_product_photos(product_name=product)
+        photos = await _product_photos(product)
         colors = {_detect_color_from_filename(p.get("filename", "")) for p in photos}
         colors.discard("")
         return colors
@@ -829,10 +918,10 @@ def _pick_product_photos(
     limit = max_showcase or MAX_PHOTOS_PRODUCT_SHOWCASE
     if requested_color:
         # Конкретный цвет — фильтруем по имени файла и отдаём все
-        color_prefixes = [p for p, key in _COLOR_PREFIXES.items() if key == requested_color]
+        color_prefixes = {p for p, key in _COLOR_PREFIXES.items() if key == requested_color}
         matching = [
             img for img in found_photos
-            if any(cp in img.get("filename", "").lower() for cp in color_prefixes)
+            if not text_features(img.get("filename", "")).keywords.isdisjoint(color_prefixes)
         ]
         # Если клиент запросил конкретный цвет и совпадений нет, не отправляем другой цвет.
         source = matching
@@ -878,10 +967,259 @@ def _pick_product_photos(
         ]
 
 
-async def generate_response(chat_id: str, user_message: str, sender_name: str) -> dict:
+async def _lookup_primary_photos(
+    chat_id: str,
+    query: str,
+    requested_color: str | None,
+    max_showcase: int,
+) -> list[dict]:
+    """
+    Основной поиск фото (по сообщению клиента или товару заказа). Идёт
+    одновременно с запросом к GPT; первые найденные фото сразу начинают
+    скачиваться (gdrive/photo_prefetch.py).
+    """
+    try:
+        found_photos = await find_product_photos(product_name=query)
+    except Exception as e:
+        logger.warning(f"[{chat_id}] Failed to find photos by message text: {e}")
+        return []
+    if not found_photos:
+        return []
+    photos = _pick_product_photos(found_photos, requested_color, max_showcase=max_showcase)
+    if PHOTO_PREFETCH_ENABLED:
+        prefetch_photos(chat_id, [p["file_id"] for p in photos[:PHOTO_PREFETCH_COUNT]])
+    return photos
+
+
+class TurnAnalysis:
+    """
+    Разбор сообщения клиента на один ход диалога: токены, цвет, тип товара,
+    признаки просмотра категории и названия товаров из результатов RAG.
+
+    Считается один раз и передаётся через generate_response и handle_message,
+    вместо того чтобы каждая эвристика заново токенизировала сообщение и
+    разбирала тексты результатов поиска.
+    """
+
+    __slots__ = (
+        "message", "features", "tokens", "product_type", "color",
+        "browsing_category", "browsing_type", "specific_tokens", "is_photo_request",
+        "_results",
+    )
+
+    def __init__(self, message: str):
+        self.message = message
+        self.features = text_features(message or "")
+        self.tokens = self.features.tokens
+        self.product_type = _infer_product_type_from_text(message)
+        self.color = _detect_color_in_text(message)
+        self.browsing_category = _is_category_browsing(message)
+        self.browsing_type = _detect_browsing_category(message) if self.browsing_category else ""
+        self.specific_tokens = _extract_specific_query_tokens(message)
+        self.is_photo_request = _is_photo_request(message)
+        # id(результата RAG) → (результат, название, тип товара)
+        self._results: dict[int, tuple[dict, str, str | None]] = {}
+
+    def _result_entry(self, result: dict) -> tuple[dict, str, str | None]:
+        entry = self._results.get(id(result))
+        if entry is None or entry[0] is not result:
+            entry = self._results[id(result)] = (result, _extract_product_name_from_result(result), None)
+        return entry
+
+    def result_name(self, result: dict) -> str:
+        """Название товара из результата RAG (_extract_product_name_from_result)."""
+        return self._result_entry(result)[1]
+
+    def result_type(self, result: dict) -> str:
+        """Тип товара результата RAG (_infer_result_product_type)."""
+        entry = self._result_entry(result)
+        if entry[2] is None:
+            entry = self._results[id(result)] = (result, entry[1], _infer_result_product_type(result, entry[1]))
+        return entry[2]
+
+    def mentions(self, product_name: str) -> bool:
+        """Есть ли в сообщении хоть один токен названия товара."""
+        return bool(self.tokens & text_features(product_name or "").tokens)
+
+
+async def _confirm_order(chat_id: str, order_ctx: dict, sender_name: str) -> dict:
+    """Клиент подтвердил сводку заказа — оформляем и уведомляем."""
+    confirm_text = "Отлично, оформляю заказ! Скоро свяжемся с вами для уточнения деталей доставки ✨"
+    await save_message(chat_id, "assistant", confirm_text, "Алина")
+    await set_order_pending_confirm(chat_id, False)
+    asyncio.create_task(notify_order_confirmed(chat_id, order_ctx, sender_name))
+    asyncio.create_task(notify_order_to_group(chat_id, order_ctx, sender_name))
+    logger.info(f"[{chat_id}] Order confirmed by client, notifications sent")
+    return {"text": confirm_text, "photos": []}
+
+
+async def _mentioned_catalog_product(text: str):
+    """Товар каталога, полное название которого есть в сообщении (None — не найден)."""
+    try:
+        return await run_blocking("sheets", find_mentioned_product, text)
+    except Exception as e:
+        logger.warning(f"Failed to look up product mention in registry: {e}")
+        return None
+
+
+async def _try_fast_path(
+    chat_id: str,
+    analysis: TurnAnalysis,
+    order_ctx: dict,
+    history: list[dict],
+    sender_name: str,
+) -> tuple[str, dict] | None:
+    """
+    Ответить без GPT (ai/fast_path.py): приветствие нового клиента,
+    подтверждение заказа, наличие/цена/фото модели, названной полностью.
+
+    Returns:
+        (вид ответа, результат generate_response) или None — нужен обычный путь.
+    """
+    user_message = analysis.message
+    is_new_client = len(history) <= 1
+
+    if await get_order_pending_confirm(chat_id):
+        # Только «да»/«верно» без других слов (_is_order_confirmation — точное совпадение):
+        # новых полей в сообщении нет, сохранённый контекст заказа полный
+        if _is_order_confirmation(user_message):
+            return fast_path.CONFIRM, await _confirm_order(chat_id, order_ctx, sender_name)
+        return None
+    if order_ctx.get("order_type") == "alternatives_offered":
+        return None
+
+    if is_new_client:
+        if not fast_path.is_pure_greeting(user_message):
+            return None
+        text = fast_path.greeting_reply()
+        # Как ответ GPT (generate_response): без лишних пробелов, без имени отправителя
+        await save_message(chat_id, "assistant", re.sub(r"\s{2,}", " ", text.replace("|||", " ")).strip())
+        return fast_path.GREETING, {
+            "text": text,
+            "photos": [],
+            "is_new_client": True,
+            "order_context": order_ctx,
+            "missing_order_fields": _build_missing_fields(order_ctx, False),
+        }
+
+    # Размер, цвет, оформление, просмотр категории — это диалог о заказе, его ведёт GPT
+    if (
+        analysis.color
+        or analysis.browsing_category
+        or fast_path.mentions_size(user_message)
+        or _has_order_intent(user_message)
+    ):
+        return None
+    asks_price = fast_path.is_price_question(user_message)
+    asks_availability = _is_availability_request(user_message)
+    if not (asks_price or asks_availability or analysis.is_photo_request):
+        return None
+
+    record = await _mentioned_catalog_product(user_message)
+    if record is None or record.inventory is None:
+        return None
+    # Кроме модели и вопроса в сообщении что-то ещё (город, пожелание) — это может
+    # быть поле заказа, его извлекает обычный путь
+    if fast_path.has_extra_words(user_message, record.name):
+        return None
+    availability = record.availability()
+    if not availability["available"]:
+        return None
+    photos = _pick_product_photos(list(record.photos)) if record.photos else []
+
+    if asks_price or asks_availability:
+        intent = fast_path.PRICE if asks_price else fast_path.AVAILABILITY
+        price = record.price
+        if asks_price and not price:
+            return None
+        text = fast_path.availability_reply(
+            record.name,
+            price,
+            str(record.product.get("descriptions", "") or "").strip(),
+            with_price=asks_price,
+        )
+    else:
+        if not photos:
+            return None
+        intent = fast_path.PHOTOS
+        text = fast_path.photos_reply(record.name)
+
+    product_type = _normalize_product_type(str(record.product.get("category", ""))) or (
+        _infer_product_type_from_text(f"{record.name} {record.product.get('category', '')}")
+    )
+    order_ctx = _merge_order_context(order_ctx, {"product": record.name, "product_type": product_type})
+    await upsert_order_context(chat_id, order_ctx)
+    missing_order_fields = _build_missing_fields(order_ctx, await _is_color_required(record.name))
+    if missing_order_fields:
+        text = f"{text}|||{_question_for_missing(missing_order_fields[0])}"
+
+    clean_text = re.sub(r"\s{2,}", " ", text.replace("|||", " ")).strip()
+    await save_message(chat_id, "assistant", clean_text)
+    return intent, {
+        "text": text,
+        "photos": photos,
+        "is_new_client": False,
+        "order_context": order_ctx,
+        "missing_order_fields": missing_order_fields,
+    }
+
+
+# Сколько сообщений может быть в диалоге до общего вопроса, чтобы ответ можно было кэшировать
+_CACHEABLE_HISTORY_MAX = 4
+
+
+def _is_response_cacheable(
+    analysis: TurnAnalysis,
+    order_ctx: dict,
+    extracted_fields: dict,
+    is_new_client: bool,
+    browsing_category: bool,
+    history: list[dict],
+    has_summary: bool,
+) -> bool:
+    """
+    Можно ли отдать на сообщение общий (не персональный) ответ из кэша:
+    общий вопрос, клиент не новый (ему нужно приветствие), в сообщении нет
+    данных заказа, товара, цвета, фото и оформления.
+
+    Ответ GPT строится по промпту с историей и блоком заказа, поэтому он
+    общий, только если в них нет ничего личного: в заказе нет города,
+    размера, цвета и адреса, сводки переписки нет, а до вопроса клиент
+    только поздоровался.
+    """
+    if is_new_client or browsing_category or order_ctx.get("order_type"):
+        return False
+    if not response_cache.is_general_question(analysis.message):
+        return False
+    if any(extracted_fields.get(f) for f in ("city", "product", "size", "color", "address")):
+        return False
+    if has_summary or any(order_ctx.get(f) for f in ("city", "size", "color", "address")):
+        return False
+    earlier = history[:-1] if history and history[-1].get("content") == analysis.message else history
+    if len(earlier) > _CACHEABLE_HISTORY_MAX or any(
+        m.get("role") == "user" and not fast_path.is_pure_greeting(m.get("content", ""))
+        for m in earlier
+    ):
+        return False
+    return not (
+        analysis.color
+        or analysis.is_photo_request
+        or _has_order_intent(analysis.message)
+        or _is_availability_request(analysis.message)
+    )
+
+
+async def generate_response(
+    chat_id: str,
+    user_message: str,
+    sender_name: str,
+    analysis: TurnAnalysis | None = None,
+) -> dict:
     """
     Генерирует ответ бота.
     Возвращает: {'text': str, 'photos': list[dict]}
+
+    analysis — разбор user_message, если вызывающий код уже его построил.
     """
     # 1. Сохраняем входящее сообщение
     await save_message(chat_id, "user", user_message, sender_name)
@@ -889,16 +1227,18 @@ async def generate_response(chat_id: str, user_message: str, sender_name: str) -
     # Сбрасываем дожим когда клиент отвечает
     await reset_nudge_state(chat_id)
 
-    # Токенизируем сообщение пользователя (используется в нескольких местах ниже)
-    user_tokens = tokenize_text(user_message)
+    # Разбираем сообщение один раз: токены, цвет, тип товара, просмотр категории
+    if analysis is None or analysis.message != user_message:
+        analysis = TurnAnalysis(user_message)
+    user_tokens = analysis.tokens
 
     # Предварительно читаем контекст заказа, чтобы не терять активный товар
     current_order_ctx = await get_order_context(chat_id)
-    requested_product_type = _infer_product_type_from_text(user_message)
+    requested_product_type = analysis.product_type
 
     # Определяем, просматривает ли клиент категорию ("какие сумки есть?")
-    browsing_category = _is_category_browsing(user_message)
-    browsing_type = _detect_browsing_category(user_message) if browsing_category else ""
+    browsing_category = analysis.browsing_category
+    browsing_type = analysis.browsing_type
 
     # Если клиент переключился на ДРУГУЮ категорию — сбросить контекст заказа
     if browsing_category and current_order_ctx.get("product"):
@@ -918,6 +1258,17 @@ async def generate_response(chat_id: str, user_message: str, sender_name: str) -
                 current_order_ctx["product_type"] = browsing_type
             await upsert_order_context(chat_id, current_order_ctx)
 
+    history = await get_conversation_history(chat_id)
+    is_new_client = len(history) <= 1
+
+    # Простые ходы (приветствие, «да», наличие/цена/фото модели) — без GPT
+    fast = None
+    if FAST_PATH_ENABLED:
+        fast = await _try_fast_path(chat_id, analysis, current_order_ctx, history, sender_name)
+    fast_path.record_turn(chat_id, fast[0] if fast else None)
+    if fast:
+        return fast[1]
+
     product_query = user_message
     if _should_use_active_product_query(user_message, current_order_ctx.get("product", "")):
         product_query = current_order_ctx.get("product", "") or user_message
@@ -930,34 +1281,18 @@ async def generate_response(chat_id: str, user_message: str, sender_name: str) -
     if requested_product_type:
         filtered_results = []
         for r in product_results:
-            result_type = _infer_result_product_type(r)
+            result_type = analysis.result_type(r)
             if not result_type or result_type == requested_product_type:
                 filtered_results.append(r)
         product_results = filtered_results
-    primary_product_match = _pick_primary_product_match(product_results, user_message)
-    specific_query_tokens = _extract_specific_query_tokens(user_message)
-
-    # 3. Собираем контексты
-    product_context = "\n---\n".join([r["text"] for r in product_results])
-    product_context = product_context or "Нет релевантных товаров в базе."
-
-    sales_context = "\n---\n".join([r["text"] for r in script_results])
-    sales_context = sales_context or "Нет релевантных скриптов."
-
-    # 4. История переписки
-    history = await get_conversation_history(chat_id)
-    is_new_client = len(history) <= 1
-    history_text = "\n".join(
-        [f"{'Клиент' if m['role'] == 'user' else 'Алина'}: {m['content']}"
-         for m in history
-         if not m['content'].startswith("[Показаны фото:")]
-    )
+    primary_product_match = _pick_primary_product_match(product_results, user_message, analysis)
+    specific_query_tokens = analysis.specific_tokens
 
     order_ctx = current_order_ctx
     # Собираем каноничные имена товаров из RAG для точного извлечения
     _rag_product_names = []
     for r in product_results:
-        _name = _extract_product_name_from_result(r)
+        _name = analysis.result_name(r)
         if _name and _name not in _rag_product_names:
             _rag_product_names.append(_name)
     extracted_fields = await _extract_order_fields(user_message, history, order_ctx, _rag_product_names)
@@ -965,7 +1300,7 @@ async def generate_response(chat_id: str, user_message: str, sender_name: str) -
 
     rag_product_name = ""
     if product_results:
-        rag_product_name = _extract_product_name_from_result(product_results[0]) or ""
+        rag_product_name = analysis.result_name(product_results[0]) or ""
     target_product_type = requested_product_type or _infer_product_type_from_text(primary_product_match or rag_product_name)
 
     # Если сообщение расплывчатое ("Какие?", "Покажи") и тип товара не определён —
@@ -990,6 +1325,7 @@ async def generate_response(chat_id: str, user_message: str, sender_name: str) -
         requested_type=target_product_type,
         exclude_names={primary_product_match} if primary_product_match else set(),
         limit=3,
+        analysis=analysis,
     )
 
     # При browse категории НЕ назначаем RAG продукт в заказ (клиент ещё не выбрал)
@@ -999,7 +1335,7 @@ async def generate_response(chat_id: str, user_message: str, sender_name: str) -
         and not extracted_fields.get("product")
         and not order_ctx.get("product")
         and not browsing_category
-        and (user_tokens & tokenize_text(rag_product_name))  # сообщение должно упоминать товар
+        and analysis.mentions(rag_product_name)  # сообщение должно упоминать товар
     ):
         extracted_fields["product"] = rag_product_name
     if not extracted_fields.get("product_type"):
@@ -1018,7 +1354,7 @@ async def generate_response(chat_id: str, user_message: str, sender_name: str) -
         not order_ctx.get("product")
         and rag_product_name
         and not browsing_category
-        and (user_tokens & tokenize_text(rag_product_name))
+        and analysis.mentions(rag_product_name)
     ):
         order_ctx["product"] = rag_product_name
     if not order_ctx.get("product_type"):
@@ -1031,13 +1367,7 @@ async def generate_response(chat_id: str, user_message: str, sender_name: str) -
     if pending_confirm:
         if _is_order_confirmation(user_message):
             # Клиент подтвердил — оформляем заказ
-            confirm_text = "Отлично, оформляю заказ! Скоро свяжемся с вами для уточнения деталей доставки ✨"
-            await save_message(chat_id, "assistant", confirm_text, "Алина")
-            await set_order_pending_confirm(chat_id, False)
-            asyncio.create_task(notify_order_confirmed(chat_id, order_ctx, sender_name))
-            asyncio.create_task(notify_order_to_group(chat_id, order_ctx, sender_name))
-            logger.info(f"[{chat_id}] Order confirmed by client, notifications sent")
-            return {"text": confirm_text, "photos": []}
+            return await _confirm_order(chat_id, order_ctx, sender_name)
         else:
             await set_order_pending_confirm(chat_id, False)
             logger.info(f"[{chat_id}] Client did not confirm order, resetting pending flag")
@@ -1101,11 +1431,17 @@ async def generate_response(chat_id: str, user_message: str, sender_name: str) -
         and (missing_order_fields == ["address"] or not missing_order_fields)
     ):
         try:
-            availability = check_product_availability(
-                order_ctx.get("product", ""),
-                order_ctx.get("size", ""),
-                order_ctx.get("color", ""),
-            )
+            record = await _resolve_catalog_product(order_ctx.get("product", ""))
+            if record is not None and record.inventory is not None:
+                availability = record.availability(order_ctx.get("size", ""), order_ctx.get("color", ""))
+            else:
+                availability = await run_blocking(
+                    "sheets",
+                    check_product_availability,
+                    order_ctx.get("product", ""),
+                    order_ctx.get("size", ""),
+                    order_ctx.get("color", ""),
+                )
             logger.info(
                 f"[{chat_id}] Inventory check for '{order_ctx['product']}' "
                 f"size='{order_ctx.get('size')}' color='{order_ctx.get('color')}': "
@@ -1146,81 +1482,37 @@ async def generate_response(chat_id: str, user_message: str, sender_name: str) -
 
     order_guard_prompt = _format_order_context_for_prompt(order_ctx, missing_order_fields, color_required)
 
+    # 5a. Товары, скрипты и история (сводка старой части + последние сообщения)
+    # в пределах бюджета токенов, самые релевантные — первыми
+    summary = await history_summary.get_summary(chat_id) if HISTORY_SUMMARY_ENABLED else None
+    summary_line, history_lines = history_summary.history_parts(history, summary)
+    prompt_context = context_budget.assemble(
+        SYSTEM_PROMPT,
+        order_guard_prompt,
+        user_message,
+        products=[r["text"] for r in _rank_product_results(
+            product_results, primary_product_match, order_ctx.get("product", ""), analysis
+        )],
+        scripts=[r["text"] for r in script_results],
+        history_lines=history_lines,
+        history_summary=summary_line,
+    )
+    if prompt_context.truncated or any(prompt_context.dropped.values()):
+        logger.info(
+            f"[{chat_id}] Prompt trimmed to budget: tokens={prompt_context.tokens}, "
+            f"dropped={prompt_context.dropped}"
+        )
+    product_context = prompt_context.product_context or "Нет релевантных товаров в базе."
+    sales_context = prompt_context.sales_context or "Нет релевантных скриптов."
+
     system_prompt = SYSTEM_PROMPT.format(
         product_context=product_context,
         sales_context=sales_context,
-        conversation_history=history_text,
+        conversation_history=prompt_context.conversation_history,
     ) + "\n\n" + order_guard_prompt
 
-    # 6. Вызываем GPT
-    messages = [
-        {"role": "system", "content": system_prompt},
-        {"role": "user", "content": user_message},
-    ]
-
-    completion = await openai_client.chat.completions.create(
-        model=OPENAI_MODEL,
-        messages=messages,
-        temperature=0.7,
-        max_tokens=700,
-    )
-
-    assistant_text = completion.choices[0].message.content
-    logger.info(f"[{chat_id}] RAW GPT response: {assistant_text[:500]}")
-    logger.info(f"[{chat_id}] product_context (first 300): {product_context[:300]}")
-    logger.info(f"[{chat_id}] order_guard_prompt: {order_guard_prompt[:300]}")
-
-    # 7a. Убираем повторное приветствие и trust message на уровне кода
-    assistant_text = _strip_duplicate_greeting(assistant_text, history)
-    assistant_text = _strip_duplicate_trust_message(assistant_text, history)
-    user_order_intent = _has_order_intent(user_message)
-    logger.info(f"[{chat_id}] user_order_intent={user_order_intent}, user_message={user_message[:100]}")
-    # Не считаем заказ "готовым" только по предположению LLM без явного сигнала клиента.
-    ready_to_order = user_order_intent
-    address_just_collected = bool((extracted_fields.get("address") or "").strip())
-    if not user_order_intent:
-        stripped = _strip_checkout_prompts(assistant_text)
-        logger.info(f"[{chat_id}] After _strip_checkout_prompts: '{stripped[:300]}'")
-        if stripped:
-            assistant_text = stripped
-        elif not missing_order_fields and (llm_ready_to_order or address_just_collected):
-            # Все поля собраны, заказ будет подтверждён ниже — не нужен fallback
-            assistant_text = ""
-        else:
-            assistant_text = "Сейчас уточню по модели и наличию."
-
-    # 7b. Жесткая проверка: до сбора всех данных заказ не оформляем
-    if missing_order_fields:
-        if _contains_order_confirm(assistant_text):
-            assistant_text = _strip_order_confirm(assistant_text)
-        # Задаем вопрос о недостающих полях если:
-        # 1. Клиент хочет заказать ИЛИ только что дали адрес (как раньше)
-        # 2. ИЛИ товар определен в order_ctx (клиент интересуется товаром)
-        # 3. НО НЕ при первом приветствии (is_new_client) - тогда промпт сам задаст вопрос
-        should_force_missing_question = (
-            not is_new_client  # Добавлена проверка: не задаем доп. вопросы при первом контакте
-            and not browsing_category  # НЕ задавать вопросы при просмотре категории
-            and (
-                ready_to_order
-                or address_just_collected
-                or bool(order_ctx.get("product"))
-            )
-        )
-        if should_force_missing_question and not _assistant_already_requests_missing(assistant_text, missing_order_fields) and not _has_question(assistant_text):
-            assistant_text = f"{assistant_text}|||{_question_for_missing(missing_order_fields[0])}".strip("|")
-    elif (ready_to_order or address_just_collected or llm_ready_to_order):
-        # Все поля собраны — показываем сводку и ждём подтверждения клиента
-        assistant_text = _build_order_summary(order_ctx)
-        await set_order_pending_confirm(chat_id, True)
-        logger.info(f"[{chat_id}] All fields collected, showing order summary for confirmation")
-
-    assistant_text = _dedupe_response_parts(assistant_text)
-
-    # 8. Ищем фото товаров из Google Drive
-    photos = []
-
     # Определяем режим фото: конкретный цвет → все фото этого цвета, иначе → по 1 каждого цвета
-    requested_color = _detect_color_in_text(user_message)
+    requested_color = analysis.color
 
     # Проверяем, отвечает ли клиент на вопрос о недостающих полях
     # Если да - не отправляем фото заново
@@ -1244,12 +1536,120 @@ async def generate_response(chat_id: str, user_message: str, sender_name: str) -
     if is_answering_missing_field and order_ctx.get("product"):
         primary_search_query = order_ctx["product"]
         logger.info(f"[{chat_id}] Answering missing field — photo search by order product: {primary_search_query}")
+    # 5b. Основной поиск фото от ответа GPT не зависит — запускаем его сейчас,
+    # параллельно с запросом к модели (результат нужен на шаге 8)
+    primary_photos_task = asyncio.create_task(
+        _lookup_primary_photos(chat_id, primary_search_query, requested_color, photo_showcase_limit)
+    )
+
     try:
-        found_photos = await find_product_photos(product_name=primary_search_query)
-        if found_photos:
-            photos.extend(_pick_product_photos(found_photos, requested_color, max_showcase=photo_showcase_limit))
-    except Exception as e:
-        logger.warning(f"[{chat_id}] Failed to find photos by message text: {e}")
+        # 6. Вызываем GPT
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_message},
+        ]
+
+        # Общий вопрос вне персонального контекста — ответ может быть в кэше.
+        # Эмбеддинг сообщения уже посчитан поиском скриптов (шаг 2); если его
+        # нет (поиск не дошёл до эмбеддинга), кэш в этом ходе не используется
+        cache_probe = None
+        query_embedding = cached_query_embedding(user_message)
+        if query_embedding is not None and RESPONSE_CACHE_ENABLED and _is_response_cacheable(
+            analysis, order_ctx, extracted_fields, is_new_client, browsing_category, history, summary is not None
+        ):
+            cache_probe = await response_cache.lookup(
+                user_message,
+                response_cache.context_key(
+                    get_scripts_version(),
+                    get_catalog_version(),
+                    {
+                        "product": order_ctx.get("product", ""),
+                        "product_type": order_ctx.get("product_type", ""),
+                        "city": order_ctx.get("city", ""),
+                        "size": order_ctx.get("size", ""),
+                        "color": order_ctx.get("color", ""),
+                        "address": order_ctx.get("address", ""),
+                        "missing": missing_order_fields,
+                        "color_required": color_required,
+                    },
+                ),
+                query_embedding,
+            )
+
+        if cache_probe is not None and cache_probe.answer:
+            assistant_text = cache_probe.answer
+            logger.info(f"[{chat_id}] Response cache hit (similarity {cache_probe.similarity:.3f})")
+        else:
+            completion = await model_router.chat(
+                model_router.TASK_REPLY,
+                openai_client,
+                messages,
+                temperature=0.7,
+                max_tokens=700,
+            )
+            assistant_text = completion.choices[0].message.content
+            if cache_probe is not None:
+                await response_cache.store(cache_probe, assistant_text)
+
+        logger.info(f"[{chat_id}] RAW GPT response: {assistant_text[:500]}")
+        logger.info(f"[{chat_id}] product_context (first 300): {product_context[:300]}")
+        logger.info(f"[{chat_id}] order_guard_prompt: {order_guard_prompt[:300]}")
+
+        # 7a. Убираем повторное приветствие и trust message на уровне кода
+        assistant_text = _strip_duplicate_greeting(assistant_text, history)
+        assistant_text = _strip_duplicate_trust_message(assistant_text, history)
+        user_order_intent = _has_order_intent(user_message)
+        logger.info(f"[{chat_id}] user_order_intent={user_order_intent}, user_message={user_message[:100]}")
+        # Не считаем заказ "готовым" только по предположению LLM без явного сигнала клиента.
+        ready_to_order = user_order_intent
+        address_just_collected = bool((extracted_fields.get("address") or "").strip())
+        if not user_order_intent:
+            stripped = _strip_checkout_prompts(assistant_text)
+            logger.info(f"[{chat_id}] After _strip_checkout_prompts: '{stripped[:300]}'")
+            if stripped:
+                assistant_text = stripped
+            elif not missing_order_fields and (llm_ready_to_order or address_just_collected):
+                # Все поля собраны, заказ будет подтверждён ниже — не нужен fallback
+                assistant_text = ""
+            else:
+                assistant_text = "Сейчас уточню по модели и наличию."
+
+        # 7b. Жесткая проверка: до сбора всех данных заказ не оформляем
+        if missing_order_fields:
+            if _contains_order_confirm(assistant_text):
+                assistant_text = _strip_order_confirm(assistant_text)
+            # Задаем вопрос о недостающих полях если:
+            # 1. Клиент хочет заказать ИЛИ только что дали адрес (как раньше)
+            # 2. ИЛИ товар определен в order_ctx (клиент интересуется товаром)
+            # 3. НО НЕ при первом приветствии (is_new_client) - тогда промпт сам задаст вопрос
+            should_force_missing_question = (
+                not is_new_client  # Добавлена проверка: не задаем доп. вопросы при первом контакте
+                and not browsing_category  # НЕ задавать вопросы при просмотре категории
+                and (
+                    ready_to_order
+                    or address_just_collected
+                    or bool(order_ctx.get("product"))
+                )
+            )
+            if should_force_missing_question and not _assistant_already_requests_missing(assistant_text, missing_order_fields) and not _has_question(assistant_text):
+                assistant_text = f"{assistant_text}|||{_question_for_missing(missing_order_fields[0])}".strip("|")
+        elif (ready_to_order or address_just_collected or llm_ready_to_order):
+            # Все поля собраны — показываем сводку и ждём подтверждения клиента
+            assistant_text = _build_order_summary(order_ctx)
+            await set_order_pending_confirm(chat_id, True)
+            logger.info(f"[{chat_id}] All fields collected, showing order summary for confirmation")
+
+        assistant_text = _dedupe_response_parts(assistant_text)
+
+        # 8. Ищем фото товаров из Google Drive
+        # Основной поиск запущен одновременно с запросом к GPT (шаг 5b)
+        photos = list(await primary_photos_task)
+    except BaseException:
+        # Ход не удался — фото не понадобятся: останавливаем поиск и сбрасываем
+        # скачанное заранее
+        primary_photos_task.cancel()
+        discard_prefetched(chat_id)
+        raise
 
     if (
         not photos
@@ -1261,7 +1661,7 @@ async def generate_response(chat_id: str, user_message: str, sender_name: str) -
         )
     ):
         try:
-            found_photos = await find_product_photos(product_name=order_ctx["product"])
+            found_photos = await _product_photos(order_ctx["product"])
             if found_photos:
                 photos.extend(_pick_product_photos(found_photos, requested_color))
         except Exception as e:
@@ -1280,8 +1680,7 @@ async def generate_response(chat_id: str, user_message: str, sender_name: str) -
                 continue
             # Если в сообщении есть упоминание товара — приоритет; иначе всё равно пробуем (диалог уже про товар)
             if product_name and user_tokens:
-                product_tokens = tokenize_text(product_name)
-                if not (user_tokens & product_tokens) and len(history) <= 2:
+                if not analysis.mentions(product_name) and len(history) <= 2:
                     continue
             try:
                 folder_photos = await find_product_photos(
@@ -1450,7 +1849,7 @@ async def generate_response(chat_id: str, user_message: str, sender_name: str) -
         and primary_product_match
         and not photos  # Если фото уже нашлись — товар есть, не помечаем как недоступный
     ):
-        match_tokens = tokenize_text(primary_product_match or "")
+        match_tokens = text_features(primary_product_match or "").tokens
         if not (specific_query_tokens & match_tokens):
             model_unavailable = True
 
@@ -1467,9 +1866,12 @@ async def generate_response(chat_id: str, user_message: str, sender_name: str) -
             requested_type=target_product_type,
             exclude_names=_exclude,
             limit=3,
+            analysis=analysis,
         )
         if not alternatives:
-            alternatives = _collect_similar_product_names(product_results, requested_type="", exclude_names=_exclude, limit=3)
+            alternatives = _collect_similar_product_names(
+                product_results, requested_type="", exclude_names=_exclude, limit=3, analysis=analysis,
+            )
         if not alternatives:
             alternatives = _fallback_alternative_names(
                 target_product_type,
@@ -1556,7 +1958,8 @@ async def handle_message(chat_id: str, sender_name: str, text: str):
             logger.info(f"[{chat_id}] Handoff enabled; saved message, bot skipped reply.")
             return
 
-        result = await generate_response(chat_id, text, sender_name)
+        analysis = TurnAnalysis(text)
+        result = await generate_response(chat_id, text, sender_name, analysis)
 
         # For new clients: insert trust message right after greeting
         is_new = result.get("is_new_client", False)
@@ -1582,10 +1985,9 @@ async def handle_message(chat_id: str, sender_name: str, text: str):
         # Determine if we should send photos
         should_send_photos = False
         if result["photos"]:
-            is_photo_request = _is_photo_request(text)
-            product_key = _build_product_key(tokenize_text(text), result["photos"])
+            product_key = _build_product_key(analysis.tokens, result["photos"])
 
-            if is_photo_request or _is_category_browsing(text):
+            if analysis.is_photo_request or analysis.browsing_category:
                 # Клиент просит показать/посмотреть — отправляем даже если уже отправляли
                 should_send_photos = True
             elif product_key and not await has_sent_product_photos(chat_id, product_key):
@@ -1631,7 +2033,7 @@ async def handle_message(chat_id: str, sender_name: str, text: str):
                 await save_message(chat_id, "assistant", photo_note, "")
 
             # Сообщение о качестве — только при запросе конкретной модели и только 1 раз за диалог
-            is_specific_product = not _is_category_browsing(text)
+            is_specific_product = not analysis.browsing_category
             quality_already_sent = await has_sent_product_photos(chat_id, "__quality_msg__")
             if is_specific_product and not quality_already_sent:
                 await asyncio.sleep(0.8)
@@ -1653,6 +2055,10 @@ async def handle_message(chat_id: str, sender_name: str, text: str):
                 if len(parts) > 1:
                     await asyncio.sleep(0.8)
 
+        # Сжимаем старую переписку в сводку — в фоне, после ответа
+        if HISTORY_SUMMARY_ENABLED:
+            history_summary.schedule_update(chat_id, openai_client)
+
     except Exception as e:
         logger.error(f"[{chat_id}] Error handling message: {e}", exc_info=True)
         await notify_error("handle_message", f"chat_id={chat_id} error={e}")
@@ -1663,4 +2069,7 @@ async def handle_message(chat_id: str, sender_name: str, text: str):
             )
         except Exception:
             logger.error(f"[{chat_id}] Failed to send error fallback", exc_info=True)
+    finally:
+        # Фото, скачанные заранее, но не отправленные (другой выбор, без фото или ошибка)
+        discard_prefetched(chat_id)
 
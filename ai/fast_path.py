@@ -0,0 +1,156 @@
+"""
+Быстрый путь: ответы без обращения к OpenAI.
+
+Часть ходов диалога не требует генерации — достаточно шаблона и данных
+каталога, наличия и индекса фото:
+  - первое сообщение клиента — только приветствие;
+  - «да» на сводку заказа (подтверждение);
+  - вопрос о наличии или цене модели, названной полностью;
+  - просьба показать фото модели, названной полностью.
+Вопрос о модели обслуживается, только если в сообщении нет других слов:
+город, размер или пожелание клиента — это поля заказа, их извлекает GPT.
+
+Здесь — правила распознавания, шаблоны ответов и счётчики ходов. Решение,
+какой ход обслужить быстрым путём, и сами ответы собирает
+engine._try_fast_path; всё, что не подходит под правила, идёт через GPT.
+"""
+
+import logging
+import re
+import threading
+
+from ai.text_features import keyword_group, text_features
+
+logger = logging.getLogger(__name__)
+
+GREETING = "greeting"
+CONFIRM = "confirm"
+AVAILABILITY = "availability"
+PRICE = "price"
+PHOTOS = "photos"
+
+_GREETINGS = {
+    "здравствуйте", "здравствуй", "здрасте", "привет", "приветствую",
+    "добрый день", "добрый вечер", "доброе утро", "доброй ночи",
+    "салам", "салем", "сәлем", "сәлеметсіз бе", "салеметсиз бе",
+    "hello", "hi",
+}
+
+_PRICE_HINTS = ["сколько стоит", "стоимость", "цена", "цену", "почем", "почём", "по чем", "прайс"]
+_PRICE = keyword_group(_PRICE_HINTS)
+
+# Размер в сообщении ("38", "38 размер") — поле заказа, такие ходы идут через GPT
+_SIZE_RE = re.compile(r"\b(3[4-9]|4[0-3])\b")
+
+# Слова, из которых (кроме названия модели) может состоять вопрос о наличии,
+# цене или фото. Любое другое слово — город, пожелание, уточнение — может
+# оказаться данными заказа, и такой ход идёт через GPT с извлечением полей.
+_QUESTION_WORDS = {
+    # приветствие и вежливость
+    "здравствуйте", "здравствуй", "здрасте", "привет", "приветствую", "добрый", "доброе",
+    "день", "вечер", "утро", "салам", "салем", "сәлем", "hello", "hi",
+    "пожалуйста", "подскажите", "скажите", "спасибо", "можно", "мне", "нам",
+    # служебные слова
+    "а", "и", "у", "вас", "ли", "в", "на", "по", "еще", "ещё", "сейчас", "тоже",
+    "эта", "эту", "это", "этой", "эти", "модель", "модели", "модельки",
+    # наличие
+    "есть", "имеется", "наличии", "наличие", "бывает", "были", "будет",
+    # цена
+    "сколько", "стоит", "стоимость", "цена", "цену", "почем", "почём", "чем", "прайс",
+    # фото
+    "фото", "фотку", "фотки", "фотографию", "фотографии", "снимок",
+    "покажи", "покажите", "покажешь", "показать", "посмотреть",
+    "скинь", "скиньте", "пришли", "пришлите", "кинь", "киньте", "отправь", "отправьте",
+}
+
+
+def is_pure_greeting(text: str) -> bool:
+    """Сообщение — только приветствие ("Здравствуйте!", "Добрый день")."""
+    t = re.sub(r"[^\w\s]", " ", (text or "").lower())
+    t = re.sub(r"\s+", " ", t).strip()
+    return t in _GREETINGS
+
+
+def is_price_question(text: str) -> bool:
+    return text_features(text or "").has_any(_PRICE)
+
+
+def mentions_size(text: str) -> bool:
+    return bool(_SIZE_RE.search(text or ""))
+
+
+def has_extra_words(text: str, product_name: str) -> bool:
+    """В сообщении есть слова кроме названия модели и слов вопроса (_QUESTION_WORDS)."""
+    name_words = set(text_features(product_name or "").words)
+    return any(
+        word not in name_words and word not in _QUESTION_WORDS
+        for word in text_features(text or "").words
+    )
+
+
+def greeting_reply() -> str:
+    """Ответ новому клиенту на приветствие."""
+    return (
+        "Здравствуйте✨|||Рады приветствовать вас в нашем бутике Ottenok! "
+        "Подскажите, какая модель вас интересует?"
+    )
+
+
+def availability_reply(product_name: str, price: str, description: str, with_price: bool) -> str:
+    """Ответ на вопрос о наличии/цене модели, которая есть в наличии."""
+    text = f"Да, {product_name} сейчас есть в наличии ✨"
+    if with_price and price:
+        text += f" Цена: {price}."
+    if description:
+        text += f"|||{description}"
+    return text
+
+
+def photos_reply(product_name: str) -> str:
+    return f"Сейчас покажу {product_name} ✨"
+
+
+class FastPathStats:
+    """Счётчики ходов: всего и обслуженных быстрым путём (по видам)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.turns = 0
+        self.served: dict[str, int] = {}
+
+    def record(self, intent: str | None) -> None:
+        with self._lock:
+            self.turns += 1
+            if intent:
+                self.served[intent] = self.served.get(intent, 0) + 1
+
+    def share(self) -> float:
+        with self._lock:
+            return sum(self.served.values()) / self.turns if self.turns else 0.0
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            served = sum(self.served.values())
+            return {
+                "turns": self.turns,
+                "served": served,
+                "share": round(served / self.turns, 3) if self.turns else 0.0,
+                "by_intent": dict(self.served),
+            }
+
+
+fast_path_stats = FastPathStats()
+
+
+def record_turn(chat_id: str, intent: str | None) -> None:
+    """Учесть ход диалога; для обслуженных быстрым путём — записать долю в лог."""
+    fast_path_stats.record(intent)
+    if intent:
+        logger.info(
+            f"[{chat_id}] Fast path '{intent}': {fast_path_stats.share():.0%} of turns served without GPT"
+        )
+
+
+def get_fast_path_stats() -> dict:
+    """Статистика быстрого пути с запуска процесса (для /health)."""
+    return fast_path_stats.snapshot()
@@ -0,0 +1,165 @@
+"""
+Сводка старой части переписки.
+
+В промпт ответа идёт история чата. В длинном диалоге она растёт до
+MAX_CONVERSATION_HISTORY сообщений, и с ней растут размер промпта и время
+ответа. Поэтому старые сообщения сжимаются в сводку по чату (таблица
+conversation_summaries), а промпт собирается так:
+
+  - сводка всего, что было до covered_until (id последнего сжатого сообщения);
+  - дословно — только сообщения после covered_until.
+
+Сводка обновляется в фоне после ответа клиенту (schedule_update), а не во
+время хода. Когда после covered_until накопилось больше
+HISTORY_RECENT_MESSAGES + HISTORY_SUMMARY_BATCH сообщений, всё, кроме
+последних HISTORY_RECENT_MESSAGES, дописывается в сводку дешёвой моделью
+(model_router.TASK_SUMMARY, фоновый приоритет в шлюзе). Длина сводки
+ограничена HISTORY_SUMMARY_MAX_CHARS, поэтому промпт не растёт, сколько бы
+ни длился диалог.
+
+Ошибка модели или базы — не ошибка хода: сводка останется прежней и
+обновится после следующего ответа.
+"""
+
+import asyncio
+import logging
+from dataclasses import dataclass
+
+from ai import model_router
+from config import (
+    HISTORY_RECENT_MESSAGES,
+    HISTORY_SUMMARY_BATCH,
+    HISTORY_SUMMARY_MAX_CHARS,
+)
+from db.conversations import get_conversation_summary, get_messages_after, save_conversation_summary
+
+logger = logging.getLogger(__name__)
+
+# Сколько старых сообщений сжимать за один запрос к модели (длинный чат без сводки — несколькими)
+MAX_MESSAGES_PER_UPDATE = 40
+
+_PHOTO_NOTE_PREFIX = "[Показаны фото:"
+
+_SUMMARY_PROMPT = (
+    "Ты ведёшь краткую сводку переписки менеджера бутика обуви и сумок (Алина) с клиентом. "
+    "Дополни прежнюю сводку новыми сообщениями и верни обновлённую сводку целиком. "
+    "Сохрани то, что важно для продолжения диалога: какие модели, размеры и цвета обсуждали, "
+    "что показали на фото, цены и наличие, город и адрес доставки, вопросы и возражения клиента, "
+    "о чём договорились и что осталось нерешённым. Без приветствий и вежливых фраз, "
+    "от третьего лица, не больше 120 слов."
+)
+
+
+@dataclass
+class HistorySummary:
+    """Сводка чата и id последнего сообщения, вошедшего в неё."""
+
+    text: str
+    covered_until: int
+
+
+async def get_summary(chat_id: str) -> HistorySummary | None:
+    """Сохранённая сводка чата (None, если её нет или база недоступна)."""
+    try:
+        row = await get_conversation_summary(chat_id)
+    except Exception as e:
+        logger.warning(f"[{chat_id}] Failed to load history summary: {e}")
+        return None
+    return HistorySummary(*row) if row else None
+
+
+def _line(m: dict) -> str:
+    return f"{'Клиент' if m['role'] == 'user' else 'Алина'}: {m['content']}"
+
+
+def history_parts(history: list[dict], summary: HistorySummary | None = None) -> tuple[str | None, list[str]]:
+    """
+    История для промпта: строка сводки старой части (или None) и строки
+    сообщений после неё, старые первыми. Служебные пометки о показанных фото
+    в промпт не попадают.
+    """
+    messages = [m for m in history if not m["content"].startswith(_PHOTO_NOTE_PREFIX)]
+    if summary is None:
+        return None, [_line(m) for m in messages]
+
+    recent = [m for m in messages if m.get("id", 0) > summary.covered_until]
+    return f"Ранее в диалоге (кратко): {summary.text}", [_line(m) for m in recent]
+
+
+def _transcript(messages: list[dict]) -> str:
+    lines = []
+    for m in messages:
+        content = m["content"]
+        if content.startswith(_PHOTO_NOTE_PREFIX):
+            lines.append(content)
+        else:
+            lines.append(_line(m))
+    return "\n".join(lines)
+
+
+async def update_summary(chat_id: str, client) -> bool:
+    """
+    Дописать в сводку сообщения старше последних HISTORY_RECENT_MESSAGES,
+    если их накопилось не меньше HISTORY_SUMMARY_BATCH.
+
+    Returns:
+        True, если сводка обновлена.
+    """
+    summary = await get_summary(chat_id)
+    updated = False
+    while True:
+        covered_until = summary.covered_until if summary else 0
+        pending = await get_messages_after(
+            chat_id, covered_until, MAX_MESSAGES_PER_UPDATE + HISTORY_RECENT_MESSAGES
+        )
+        if len(pending) < HISTORY_RECENT_MESSAGES + HISTORY_SUMMARY_BATCH:
+            return updated
+
+        old = pending[:len(pending) - HISTORY_RECENT_MESSAGES]
+        completion = await model_router.chat(
+            model_router.TASK_SUMMARY,
+            client,
+            [
+                {"role": "system", "content": _SUMMARY_PROMPT},
+                {
+                    "role": "user",
+                    "content": (
+                        f"Прежняя сводка: {summary.text if summary else 'нет'}\n\n"
+                        f"Новые сообщения:\n{_transcript(old)}"
+                    ),
+                },
+            ],
+            temperature=0.2,
+            max_tokens=400,
+        )
+        text = (completion.choices[0].message.content or "").strip()
+        if not text:
+            logger.warning(f"[{chat_id}] Empty history summary, keeping previous")
+            return updated
+
+        summary = HistorySummary(text[:HISTORY_SUMMARY_MAX_CHARS], old[-1]["id"])
+        await save_conversation_summary(chat_id, summary.text, summary.covered_until)
+        updated = True
+        logger.info(f"[{chat_id}] History summary updated: {len(old)} messages, up to id {summary.covered_until}")
+
+
+# Фоновые обновления по чатам: не больше одного на чат одновременно
+_updates: dict[str, asyncio.Task] = {}
+
+
+async def _run_update(chat_id: str, client) -> None:
+    try:
+        await update_summary(chat_id, client)
+    except Exception as e:
+        logger.warning(f"[{chat_id}] History summary update failed: {e}")
+
+
+def schedule_update(chat_id: str, client) -> asyncio.Task | None:
+    """Запустить фоновое обновление сводки (если для чата оно уже не идёт)."""
+    running = _updates.get(chat_id)
+    if running is not None and not running.done():
+        return None
+    task = asyncio.create_task(_run_update(chat_id, client))
+    _updates[chat_id] = task
+    task.add_done_callback(lambda t: _updates.pop(chat_id, None) if _updates.get(chat_id) is t else None)
+    return task
@@ -0,0 +1,334 @@
+"""
+Общий шлюз запросов к OpenAI.
+
+Все вызовы API (ответ клиенту, извлечение полей заказа, эмбеддинги,
+распознавание голоса) проходят через один LLMGateway:
+  - бюджеты запросов и токенов в минуту (token bucket) и лимит одновременных
+    запросов — вместо того чтобы десятки чатов одновременно получали 429;
+  - очередь с приоритетами: ответ клиенту раньше извлечения полей и эмбеддингов,
+    фоновые задачи — последними;
+  - обратное давление: при переполненной очереди запросы ниже приоритета
+    ответа клиенту сразу отклоняются (LLMGatewayBusy) — вызывающий код
+    деградирует, как при любой ошибке API;
+  - повтор с джиттером при 429/5xx/сетевых ошибках; Retry-After из ответа
+    соблюдается и приостанавливает весь шлюз, а не только один запрос;
+  - метрики очереди (get_llm_gateway_stats) для /health.
+
+Вызов передаётся фабрикой (lambda: client.chat.completions.create(...)) —
+метод клиента берётся в момент выполнения, а не постановки в очередь.
+Сами клиенты создаются с max_retries=0: повторами управляет шлюз.
+"""
+
+import asyncio
+import email.utils
+import heapq
+import itertools
+import logging
+import random
+import time
+from typing import Awaitable, Callable, TypeVar
+
+import openai
+
+from config import (
+    LLM_MAX_CONCURRENCY,
+    LLM_MAX_QUEUE,
+    LLM_MAX_RETRIES,
+    LLM_REQUESTS_PER_MINUTE,
+    LLM_TOKENS_PER_MINUTE,
+)
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Приоритеты (меньше — раньше)
+PRIORITY_REPLY = 0        # ответ клиенту, распознавание голоса
+PRIORITY_EXTRACTION = 1   # извлечение полей заказа, эмбеддинги запроса
+PRIORITY_BACKGROUND = 2   # фоновые задачи
+
+_PRIORITY_NAMES = {PRIORITY_REPLY: "reply", PRIORITY_EXTRACTION: "extraction", PRIORITY_BACKGROUND: "background"}
+
+# Экспоненциальная задержка повторов: база и потолок, сек
+_BACKOFF_BASE = 0.5
+_BACKOFF_MAX = 20.0
+
+
+class LLMGatewayBusy(Exception):
+    """Очередь шлюза переполнена — запрос отклонён без обращения к API."""
+
+
+def estimate_tokens(messages: list[dict], max_tokens: int = 0) -> int:
+    """Грубая оценка токенов запроса: ~3 символа кириллицы на токен плюс max_tokens ответа."""
+    chars = sum(len(str(m.get("content") or "")) for m in messages)
+    return chars // 3 + max_tokens
+
+
+class _Bucket:
+    """Token bucket: capacity единиц в минуту, пополняется непрерывно. 0 — без ограничения."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60.0)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Через сколько секунд в корзине будет amount (больше ёмкости — ждём полную)."""
+        if self.capacity <= 0:
+            return 0.0
+        self._refill(now)
+        need = min(amount, self.capacity) - self.level
+        return need * 60.0 / self.capacity if need > 0 else 0.0
+
+    def take(self, amount: float) -> None:
+        # Может уйти в минус: фактический расход токенов больше оценки — долг
+        if self.capacity > 0:
+            self.level -= amount
+
+
+class _Waiter:
+    __slots__ = ("priority", "seq", "tokens", "future", "enqueued_at")
+
+    def __init__(self, priority: int, seq: int, tokens: int, future: asyncio.Future):
+        self.priority = priority
+        self.seq = seq
+        self.tokens = tokens
+        self.future = future
+        self.enqueued_at = time.monotonic()
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+def _retry_after(error: Exception) -> float | None:
+    """Retry-After / retry-after-ms из ответа API, сек."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000.0
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            retry_at = email.utils.parsedate_to_datetime(value)
+            return max(0.0, retry_at.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class LLMGateway:
+    """Очередь с приоритетами, бюджетами в минуту и повторами для вызовов OpenAI."""
+
+    def __init__(
+        self,
+        requests_per_minute: float = LLM_REQUESTS_PER_MINUTE,
+        tokens_per_minute: float = LLM_TOKENS_PER_MINUTE,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        max_queue: int = LLM_MAX_QUEUE,
+        max_retries: int = LLM_MAX_RETRIES,
+    ):
+        self._requests = _Bucket(requests_per_minute)
+        self._tokens = _Bucket(tokens_per_minute)
+        self._max_concurrency = max(1, max_concurrency)
+        self._max_queue = max_queue
+        self._max_retries = max_retries
+
+        self._heap: list[_Waiter] = []
+        self._seq = itertools.count()
+        self._in_flight = 0
+        # До этого момента (monotonic) не отправляем ничего — после 429 с Retry-After
+        self._paused_until = 0.0
+        self._wakeup: asyncio.TimerHandle | None = None
+        self._wakeup_loop: asyncio.AbstractEventLoop | None = None
+        self._wakeup_at = 0.0
+
+        self._stats = {"calls": 0, "retries": 0, "rate_limited": 0, "rejected": 0, "errors": 0}
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._dispatched = 0
+
+    # ── Очередь ──────────────────────────────────────────────────────────────
+
+    def _schedule_wakeup(self, delay: float) -> None:
+        loop = asyncio.get_running_loop()
+        at = loop.time() + delay
+        if self._wakeup is not None:
+            if self._wakeup_loop is loop and not self._wakeup.cancelled() and self._wakeup_at <= at:
+                return
+            self._wakeup.cancel()
+        self._wakeup = loop.call_at(at, self._on_wakeup)
+        self._wakeup_loop = loop
+        self._wakeup_at = at
+
+    def _on_wakeup(self) -> None:
+        self._wakeup = None
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Выпустить из очереди столько запросов, сколько позволяют лимиты."""
+        while self._heap:
+            waiter = self._heap[0]
+            if waiter.future.done() or waiter.future.get_loop().is_closed():
+                heapq.heappop(self._heap)
+                continue
+            if self._in_flight >= self._max_concurrency:
+                return
+            now = time.monotonic()
+            delay = max(
+                self._paused_until - now,
+                self._requests.wait_time(1, now),
+                self._tokens.wait_time(waiter.tokens, now),
+            )
+            if delay > 0:
+                self._schedule_wakeup(delay)
+                return
+            heapq.heappop(self._heap)
+            self._requests.take(1)
+            self._tokens.take(waiter.tokens)
+            self._in_flight += 1
+            waited = now - waiter.enqueued_at
+            self._dispatched += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+            waiter.future.set_result(None)
+
+    async def _acquire(self, priority: int, tokens: int) -> None:
+        if priority > PRIORITY_REPLY and len(self._heap) >= self._max_queue:
+            self._stats["rejected"] += 1
+            raise LLMGatewayBusy(f"LLM queue is full ({len(self._heap)} waiting)")
+
+        waiter = _Waiter(priority, next(self._seq), tokens, asyncio.get_running_loop().create_future())
+        heapq.heappush(self._heap, waiter)
+        self._dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Слот уже выдан, но ожидающий отменён — возвращаем
+                self._release()
+            else:
+                waiter.future.cancel()
+            raise
+
+    def _release(self) -> None:
+        self._in_flight -= 1
+        self._dispatch()
+
+    # ── Вызов ────────────────────────────────────────────────────────────────
+
+    def _retry_delay(self, error: Exception, attempt: int) -> float | None:
+        """Задержка перед повтором или None, если ошибку не повторяем."""
+        if attempt >= self._max_retries:
+            return None
+        backoff = random.uniform(0, min(_BACKOFF_MAX, _BACKOFF_BASE * 2 ** attempt))
+
+        if isinstance(error, openai.RateLimitError):
+            if getattr(error, "code", None) == "insufficient_quota":
+                return None
+            self._stats["rate_limited"] += 1
+            retry_after = _retry_after(error)
+            if retry_after is None:
+                return backoff
+            # Ждёт весь шлюз: остальные запросы получили бы тот же 429
+            self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+            return retry_after + random.uniform(0, min(1.0, retry_after * 0.1))
+
+        if isinstance(error, (openai.APIConnectionError, openai.InternalServerError)):
+            return _retry_after(error) or backoff
+        return None
+
+    def _account_usage(self, result, estimated: int) -> None:
+        # Фактический расход токенов вместо оценки, если API его вернул
+        total = getattr(getattr(result, "usage", None), "total_tokens", None)
+        if isinstance(total, int):
+            self._tokens.take(total - estimated)
+
+    async def call(
+        self,
+        request: Callable[[], Awaitable[T]],
+        *,
+        priority: int = PRIORITY_REPLY,
+        tokens: int = 0,
+        label: str = "",
+    ) -> T:
+        """
+        Выполнить запрос к API через очередь.
+
+        Args:
+            request: Фабрика корутины запроса (вызывается на каждую попытку)
+            priority: PRIORITY_REPLY / PRIORITY_EXTRACTION / PRIORITY_BACKGROUND
+            tokens: Оценка токенов запроса (estimate_tokens) для бюджета в минуту
+            label: Название запроса для логов
+
+        Raises:
+            LLMGatewayBusy: очередь переполнена (кроме PRIORITY_REPLY)
+            Ошибку API, если повторы не помогли или её не повторяем.
+        """
+        self._stats["calls"] += 1
+        attempt = 0
+        while True:
+            await self._acquire(priority, tokens)
+            try:
+                result = await request()
+            except Exception as e:
+                error = e
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    self._stats["errors"] += 1
+                    raise
+            else:
+                self._account_usage(result, tokens)
+                return result
+            finally:
+                self._release()
+
+            attempt += 1
+            self._stats["retries"] += 1
+            logger.warning(
+                f"LLM {label or 'request'} failed ({type(error).__name__}), "
+                f"retry {attempt}/{self._max_retries} in {delay:.1f}s"
+            )
+            await asyncio.sleep(delay)
+
+    def stats(self) -> dict:
+        """Глубина очереди по приоритетам, запросы в работе и счётчики."""
+        depth: dict[str, int] = {}
+        for waiter in self._heap:
+            if not waiter.future.done():
+                name = _PRIORITY_NAMES.get(waiter.priority, str(waiter.priority))
+                depth[name] = depth.get(name, 0) + 1
+        return {
+            "queue_depth": sum(depth.values()),
+            "queue_by_priority": depth,
+            "in_flight": self._in_flight,
+            "paused_seconds": round(max(0.0, self._paused_until - time.monotonic()), 1),
+            **self._stats,
+            "wait_avg_ms": round(self._wait_total / self._dispatched * 1000) if self._dispatched else 0,
+            "wait_max_ms": round(self._wait_max * 1000),
+        }
+
+
+llm_gateway = LLMGateway()
+
+
+async def llm_call(
+    request: Callable[[], Awaitable[T]],
+    *,
+    priority: int = PRIORITY_REPLY,
+    tokens: int = 0,
+    label: str = "",
+) -> T:
+    """Выполнить запрос к OpenAI через общий шлюз (см. LLMGateway.call)."""
+    return await llm_gateway.call(request, priority=priority, tokens=tokens, label=label)
+
+
+def get_llm_gateway_stats() -> dict:
+    """Метрики общего шлюза (для /health)."""
+    return llm_gateway.stats()
@@ -0,0 +1,192 @@
+"""
+Выбор модели по задаче и учёт задержки/стоимости по классам задач.
+
+Ответ клиенту генерирует основная модель (OPENAI_MODEL); внутренние
+запросы — извлечение полей заказа в JSON — идут в более дешёвую и быструю
+OPENAI_EXTRACTION_MODEL. Основная модель для такой задачи вызывается
+повторно, только если ответ маленькой модели не прошёл проверку (не JSON
+или поля не того вида). Сводка старой переписки (ai/history_summary.py)
+тоже пишется дешёвой моделью, с фоновым приоритетом.
+
+По каждому классу задач (reply, extraction, summary, embedding, transcription)
+считаются вызовы, переходы на основную модель, ошибки, задержка и
+стоимость по токенам из usage (get_model_router_stats, /health).
+Все запросы идут через ai/llm_gateway.py.
+"""
+
+import json
+import logging
+import threading
+import time
+from typing import Awaitable, Callable, TypeVar
+
+from ai.llm_gateway import PRIORITY_BACKGROUND, PRIORITY_EXTRACTION, PRIORITY_REPLY, estimate_tokens, llm_call
+from config import OPENAI_EXTRACTION_MODEL, OPENAI_MODEL
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+TASK_REPLY = "reply"
+TASK_EXTRACTION = "extraction"
+TASK_SUMMARY = "summary"
+TASK_EMBEDDING = "embedding"
+TASK_TRANSCRIPTION = "transcription"
+
+_TASK_MODELS = {
+    TASK_REPLY: OPENAI_MODEL,
+    TASK_EXTRACTION: OPENAI_EXTRACTION_MODEL,
+    TASK_SUMMARY: OPENAI_EXTRACTION_MODEL,
+}
+
+# Приоритет в шлюзе; остальные задачи — PRIORITY_EXTRACTION
+_TASK_PRIORITIES = {
+    TASK_REPLY: PRIORITY_REPLY,
+    TASK_SUMMARY: PRIORITY_BACKGROUND,
+}
+
+# Цена, $ за 1M токенов: (вход, выход). Модели не из списка считаются без стоимости
+MODEL_PRICES = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1-nano": (0.10, 0.40),
+    "text-embedding-3-small": (0.02, 0.0),
+    "text-embedding-3-large": (0.13, 0.0),
+}
+
+
+def model_for(task: str) -> str:
+    """Модель для класса задач (по умолчанию — основная)."""
+    return _TASK_MODELS.get(task) or OPENAI_MODEL
+
+
+def _cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    price_in, price_out = MODEL_PRICES.get(model, (0.0, 0.0))
+    return (prompt_tokens * price_in + completion_tokens * price_out) / 1_000_000
+
+
+class _TaskStats:
+    __slots__ = ("calls", "fallbacks", "failures", "latency_total", "latency_max",
+                 "prompt_tokens", "completion_tokens", "cost_usd", "models")
+
+    def __init__(self):
+        self.calls = 0
+        self.fallbacks = 0
+        self.failures = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cost_usd = 0.0
+        self.models: dict[str, int] = {}
+
+
+_stats: dict[str, _TaskStats] = {}
+_stats_lock = threading.Lock()
+
+
+def _record(task: str, model: str, latency: float, result=None, failed: bool = False) -> None:
+    usage = getattr(result, "usage", None)
+    prompt_tokens = getattr(usage, "prompt_tokens", 0)
+    completion_tokens = getattr(usage, "completion_tokens", 0)
+    prompt_tokens = prompt_tokens if isinstance(prompt_tokens, int) else 0
+    completion_tokens = completion_tokens if isinstance(completion_tokens, int) else 0
+
+    with _stats_lock:
+        stats = _stats.setdefault(task, _TaskStats())
+        stats.calls += 1
+        stats.failures += int(failed)
+        stats.latency_total += latency
+        stats.latency_max = max(stats.latency_max, latency)
+        stats.prompt_tokens += prompt_tokens
+        stats.completion_tokens += completion_tokens
+        stats.cost_usd += _cost(model, prompt_tokens, completion_tokens)
+        stats.models[model] = stats.models.get(model, 0) + 1
+
+
+async def call(
+    task: str,
+    model: str,
+    request: Callable[[], Awaitable[T]],
+    *,
+    priority: int = PRIORITY_REPLY,
+    tokens: int = 0,
+) -> T:
+    """Выполнить запрос через шлюз и учесть его задержку и стоимость в классе task."""
+    started = time.monotonic()
+    try:
+        result = await llm_call(request, priority=priority, tokens=tokens, label=f"{task} ({model})")
+    except Exception:
+        _record(task, model, time.monotonic() - started, failed=True)
+        raise
+    _record(task, model, time.monotonic() - started, result)
+    return result
+
+
+async def chat(task: str, client, messages: list[dict], *, model: str | None = None, **params):
+    """chat.completions.create моделью задачи (или model). Приоритет — по задаче."""
+    model = model or model_for(task)
+    return await call(
+        task,
+        model,
+        lambda: client.chat.completions.create(model=model, messages=messages, **params),
+        priority=_TASK_PRIORITIES.get(task, PRIORITY_EXTRACTION),
+        tokens=estimate_tokens(messages, params.get("max_tokens", 0)),
+    )
+
+
+async def chat_json(
+    task: str,
+    client,
+    messages: list[dict],
+    validate: Callable[[dict], bool],
+    **params,
+) -> dict:
+    """
+    JSON-ответ модели задачи. Если ответ не JSON-объект или не прошёл
+    validate — один повтор основной моделью.
+
+    Raises:
+        ValueError: ни одна модель не вернула корректный JSON.
+        Ошибки API — как есть.
+    """
+    models = [model_for(task)]
+    if OPENAI_MODEL not in models:
+        models.append(OPENAI_MODEL)
+
+    for attempt, model in enumerate(models):
+        if attempt:
+            with _stats_lock:
+                _stats.setdefault(task, _TaskStats()).fallbacks += 1
+            logger.info(f"{task}: invalid JSON from {models[attempt - 1]}, retrying with {model}")
+        completion = await chat(
+            task, client, messages, model=model, response_format={"type": "json_object"}, **params
+        )
+        try:
+            parsed = json.loads(completion.choices[0].message.content or "")
+        except (TypeError, ValueError):
+            continue
+        if isinstance(parsed, dict) and validate(parsed):
+            return parsed
+    raise ValueError(f"{task}: no valid JSON from {', '.join(models)}")
+
+
+def get_model_router_stats() -> dict:
+    """Вызовы, переходы на основную модель, задержка и стоимость по классам задач (для /health)."""
+    with _stats_lock:
+        return {
+            task: {
+                "calls": s.calls,
+                "fallbacks": s.fallbacks,
+                "failures": s.failures,
+                "latency_avg_ms": round(s.latency_total / s.calls * 1000) if s.calls else 0,
+                "latency_max_ms": round(s.latency_max * 1000),
+                "prompt_tokens": s.prompt_tokens,
+                "completion_tokens": s.completion_tokens,
+                "cost_usd": round(s.cost_usd, 4),
+                "models": dict(s.models),
+            }
+            for task, s in _stats.items()
+        }
@@ -5,6 +5,7 @@
 
 import re
 
+from ai.text_features import keyword_group, text_features
 from gdrive.photo_mapper import tokenize_text
 
 # ── Константы ─────────────────────────────────────────────────────────────────
@@ -25,6 +26,18 @@ _FIELD_PROMPT_HINTS = {
     "color": ["цвет", "расцветк"],
     "address": ["адрес", "улиц", "дом", "кварти"],
 }
+_ORDER_INTENT = keyword_group(_ORDER_INTENT_PATTERNS)
+_CHECKOUT = keyword_group(_CHECKOUT_HINTS)
+_FIELD_PROMPTS = {field: keyword_group(hints) for field, hints in _FIELD_PROMPT_HINTS.items()}
+_SHOES_HINTS = keyword_group([
+    "туф", "крос", "ботин", "лофер", "балетк", "обув", "каблук", "лодоч",
+    "slingback", "джимми чу", "jimmy choo", "saeda", "azia", "opyum", "опиум",
+    "sneaker", "кед",
+])
+_BAG_HINTS = keyword_group([
+    "сумк", "bag", "chanel 25", "arcadie", "pochette", "flap",
+    "кошелек", "кошелёк", "wallet", "monogram", "jumbo",
+])
 _PRODUCT_COLOR_OVERRIDES = {
     "chanel jumbo classic flap": {"черные"},
     "шанель джумбо": {"черные"},
@@ -48,21 +61,14 @@ def _normalize_product_type(value: str) -> str:
 
 
 def _infer_product_type_from_text(text: str) -> str:
-    t = (text or "").lower()
     if "👠" in (text or "") or "👟" in (text or ""):
         return "shoes"
     if "👜" in (text or ""):
         return "bag"
-    if any(x in t for x in [
-        "туф", "крос", "ботин", "лофер", "балетк", "обув", "каблук", "лодоч",
-        "slingback", "джимми чу", "jimmy choo", "saeda", "azia", "opyum", "опиум",
-        "sneaker", "кед",
-    ]):
+    features = text_features(text or "")
+    if features.has_any(_SHOES_HINTS):
         return "shoes"
-    if any(x in t for x in [
-        "сумк", "bag", "chanel 25", "arcadie", "pochette", "flap",
-        "кошелек", "кошелёк", "wallet", "monogram", "jumbo",
-    ]):
+    if features.has_any(_BAG_HINTS):
         return "bag"
     return ""
 
@@ -192,14 +198,12 @@ def _has_question(text: str) -> bool:
 
 
 def _has_order_intent(text: str) -> bool:
-    t = (text or "").lower()
-    return any(p in t for p in _ORDER_INTENT_PATTERNS)
+    return text_features(text or "").has_any(_ORDER_INTENT)
 
 
 def _asks_for_field(text: str, field: str) -> bool:
-    t = (text or "").lower()
-    hints = _FIELD_PROMPT_HINTS.get(field, [])
-    return any(h in t for h in hints)
+    group = _FIELD_PROMPTS.get(field)
+    return group is not None and text_features(text or "").has_any(group)
 
 
 def _assistant_already_requests_missing(text: str, missing_fields: list[str]) -> bool:
@@ -212,8 +216,7 @@ def _strip_checkout_prompts(text: str) -> str:
     parts = [p.strip() for p in text.split("|||") if p.strip()]
     kept = []
     for p in parts:
-        low = p.lower()
-        if len(p) < 120 and any(h in low for h in _CHECKOUT_HINTS):
+        if len(p) < 120 and text_features(p).has_any(_CHECKOUT):
             continue
         kept.append(p)
     if not kept:
@@ -245,12 +248,13 @@ _NEGATIVE_PATTERNS = {
     "передумал", "передумала", "воздержусь", "пока",
 }
 _NEGATIVE_SUBSTRINGS = ["подумаю", "посмотрим", "позже", "потом", "когда-нибудь", "пока нет"]
+_NEGATIVE = keyword_group(_NEGATIVE_SUBSTRINGS)
 
 
 def _is_negative_or_undecided(text: str) -> bool:
     """Проверить, отказывается ли клиент или откладывает решение."""
     t = re.sub(r'[!.,?]+$', '', (text or "").strip().lower()).strip()
-    return t in _NEGATIVE_PATTERNS or any(p in t for p in _NEGATIVE_SUBSTRINGS)
+    return t in _NEGATIVE_PATTERNS or text_features(t).has_any(_NEGATIVE)
 
 
 def _build_item_desc(order_ctx: dict) -> str:
@@ -3,22 +3,45 @@ RAG-пайплайн: поиск по ChromaDB.
 """
 
 import logging
+import os
+from collections import OrderedDict
+
 import chromadb
 from openai import AsyncOpenAI
 
-from config import CHROMA_DB_PATH, OPENAI_API_KEY, OPENAI_EMBEDDING_MODEL, MAX_RAG_RESULTS
+from config import CHROMA_DB_PATH, OPENAI_API_KEY, OPENAI_EMBEDDING_MODEL, MAX_RAG_RESULTS, SCRIPTS_RETRIEVER
+from knowledge.vector_index import LocalVectorIndex, export_collection
+from executors import run_blocking
+from ai import model_router
+from ai.llm_gateway import PRIORITY_EXTRACTION
 
 logger = logging.getLogger(__name__)
 
-openai_client = AsyncOpenAI(api_key=OPENAI_API_KEY)
+# Повторами и лимитами управляет ai/llm_gateway.py
+openai_client = AsyncOpenAI(api_key=OPENAI_API_KEY, max_retries=0)
 chroma_client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
 
+# Локальный индекс sales_scripts (None — не загружен или недоступен, используем ChromaDB)
+_scripts_index: LocalVectorIndex | None = None
+_scripts_index_checked = False
+
+# Эмбеддинги последних запросов search_scripts: кэш ответов (ai/response_cache.py)
+# берёт эмбеддинг сообщения отсюда, а не запрашивает его второй раз
+_query_embeddings: OrderedDict[str, list[float]] = OrderedDict()
+_QUERY_EMBEDDINGS_MAX = 64
+
 
 async def get_embedding(text: str) -> list[float]:
     """Сгенерировать эмбеддинг для текстового запроса."""
-    response = await openai_client.embeddings.create(
-        input=text,
-        model=OPENAI_EMBEDDING_MODEL,
+    response = await model_router.call(
+        model_router.TASK_EMBEDDING,
+        OPENAI_EMBEDDING_MODEL,
+        lambda: openai_client.embeddings.create(
+            input=text,
+            model=OPENAI_EMBEDDING_MODEL,
+        ),
+        priority=PRIORITY_EXTRACTION,
+        tokens=len(text) // 3,
     )
     return response.data[0].embedding
 
@@ -44,7 +67,8 @@ async def search_products(query: str, n_results: int = MAX_RAG_RESULTS) -> list[
     from catalog.sheets_loader import search_catalog, format_product_for_prompt
 
     try:
-        products = search_catalog(query, max_results=n_results)
+        # Загрузка каталога из Google Sheets — блокирующий вызов
+        products = await run_blocking("sheets", search_catalog, query, max_results=n_results)
 
         # Форматируем в формат, ожидаемый engine.py
         formatted = []
@@ -66,17 +90,74 @@ async def search_products(query: str, n_results: int = MAX_RAG_RESULTS) -> list[
         return []
 
 
+def _get_scripts_index() -> LocalVectorIndex | None:
+    """
+    Открыть локальный индекс sales_scripts (один раз за процесс).
+    Если файла ещё нет — выгружаем его из ChromaDB.
+    """
+    global _scripts_index, _scripts_index_checked
+    if _scripts_index_checked:
+        return _scripts_index
+    _scripts_index_checked = True
+
+    index = LocalVectorIndex.load("sales_scripts")
+    if index is None:
+        try:
+            if export_collection(chroma_client.get_collection("sales_scripts"), "sales_scripts"):
+                index = LocalVectorIndex.load("sales_scripts")
+        except Exception as e:
+            logger.warning(f"Не удалось выгрузить sales_scripts в локальный индекс: {e}")
+    if index is not None:
+        logger.info(f"Local sales_scripts index loaded: {len(index)} vectors")
+    _scripts_index = index
+    return index
+
+
 async def search_scripts(query: str, n_results: int = 3) -> list[dict]:
     """Поиск в скриптах продаж и примерах переписок."""
-    try:
-        collection = chroma_client.get_collection("sales_scripts")
-    except Exception:
-        logger.warning("Коллекция sales_scripts не найдена")
-        return []
+    index = None
+    if SCRIPTS_RETRIEVER == "numpy":
+        index = _scripts_index if _scripts_index_checked else await run_blocking("chroma", _get_scripts_index)
+
+    collection = None
+    if index is None:
+        try:
+            collection = await run_blocking("chroma", chroma_client.get_collection, "sales_scripts")
+        except Exception:
+            logger.warning("Коллекция sales_scripts не найдена")
+            return []
 
     query_embedding = await get_embedding(query)
-    results = collection.query(
+    _remember_query_embedding(query, query_embedding)
+    if index is not None:
+        return index.query(query_embedding, n_results=n_results)
+
+    results = await run_blocking(
+        "chroma",
+        collection.query,
         query_embeddings=[query_embedding],
         n_results=n_results,
     )
     return _format_results(results)
+
+
+def _remember_query_embedding(query: str, embedding: list[float]) -> None:
+    _query_embeddings[query] = embedding
+    _query_embeddings.move_to_end(query)
+    while len(_query_embeddings) > _QUERY_EMBEDDINGS_MAX:
+        _query_embeddings.popitem(last=False)
+
+
+def cached_query_embedding(query: str) -> list[float] | None:
+    """Эмбеддинг, уже посчитанный search_scripts для query (None — не считался)."""
+    return _query_embeddings.get(query)
+
+
+def get_scripts_version() -> str:
+    """Версия базы скриптов продаж — меняется при пересборке knowledge.builder."""
+    if SCRIPTS_RETRIEVER == "numpy" and _scripts_index is not None:
+        return _scripts_index.version
+    try:
+        return str(os.stat(os.path.join(CHROMA_DB_PATH, "chroma.sqlite3")).st_mtime_ns)
+    except OSError:
+        return ""
@@ -0,0 +1,140 @@
+"""
+Семантический кэш ответов GPT на общие вопросы.
+
+Вопросы про доставку, адрес магазина, оплату, оригинальность и т.п.
+повторяются постоянно, а ответ на них не зависит от клиента. Такой ответ
+GPT сохраняется (таблица response_cache) и отдаётся на похожий вопрос
+без нового запроса к модели.
+
+Ключ записи:
+  - контекст (context_key) — хэш всего, от чего зависит ответ, кроме истории
+    переписки: версия SYSTEM_PROMPT, версии базы скриптов продаж и каталога,
+    состояние заказа. Найденные для вопроса скрипты и товары в ключ не
+    входят: перефразированный вопрос находит немного другие, и похожий
+    вопрос никогда не совпал бы. Изменился промпт (ai/prompts.py), пересобрана
+    база скриптов или изменился лист каталога — меняется ключ, старые ответы
+    больше не находятся и удаляются по TTL;
+  - эмбеддинг вопроса — тот же, по которому search_scripts искал скрипты
+    (второй запрос к API эмбеддингов не нужен); ответ отдаётся, если
+    косинусная близость с сохранённым вопросом не ниже RESPONSE_CACHE_SIMILARITY.
+
+Какие ходы вообще можно кэшировать, решает engine (нет персональных данных
+заказа в сообщении, клиент не новый и т.д.). Ошибка эмбеддинга или базы —
+не ошибка хода: кэш просто не используется.
+"""
+
+import hashlib
+import json
+import logging
+import re
+from dataclasses import dataclass
+
+import numpy as np
+
+from ai.prompts import SYSTEM_PROMPT
+from ai.text_features import keyword_group, text_features
+from config import OPENAI_EMBEDDING_MODEL, RESPONSE_CACHE_SIMILARITY, RESPONSE_CACHE_TTL
+from db.conversations import get_cached_responses, save_cached_response
+
+logger = logging.getLogger(__name__)
+
+# Сколько последних записей одного контекста сравнивать с вопросом
+MAX_CANDIDATES = 200
+
+PROMPT_VERSION = hashlib.sha1(SYSTEM_PROMPT.encode("utf-8")).hexdigest()[:12]
+
+# Темы, ответ на которые одинаков для всех клиентов
+_GENERAL_TOPICS = keyword_group([
+    "доставк", "доставля", "отправк", "отправля",
+    "адрес магазин", "ваш адрес", "где находит", "где вы наход", "шоурум",
+    "график", "режим работ", "до скольки", "во сколько", "работаете",
+    "оплат", "рассрочк", "каспи", "kaspi", "халык", "предоплат",
+    "оригинал", "реплик", "копия", "качеств", "фабрик",
+    "возврат", "обмен", "примерк", "гаранти",
+    "телеграм", "инстаграм",
+])
+
+
+def is_general_question(text: str) -> bool:
+    """Вопрос на общую тему (доставка, адрес, оплата, оригинальность...)."""
+    return text_features(text or "").has_any(_GENERAL_TOPICS)
+
+
+def normalize_question(text: str) -> str:
+    """Нижний регистр, без пунктуации и лишних пробелов."""
+    t = re.sub(r"[^\w\s]", " ", (text or "").lower())
+    return re.sub(r"\s+", " ", t).strip()
+
+
+def context_key(scripts_version: str, catalog_version: str, order_state: dict) -> str:
+    """Хэш контекста, от которого зависит ответ (кроме самого вопроса)."""
+    payload = json.dumps(
+        [PROMPT_VERSION, OPENAI_EMBEDDING_MODEL, scripts_version, catalog_version, order_state],
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class CacheProbe:
+    """Результат поиска в кэше; с ним же сохраняется свежий ответ GPT."""
+
+    question: str
+    context_key: str
+    embedding: np.ndarray
+    answer: str | None = None
+    similarity: float = 0.0
+
+
+async def lookup(question: str, key: str, embedding: list[float]) -> CacheProbe | None:
+    """
+    Найти сохранённый ответ на похожий вопрос в том же контексте.
+
+    Args:
+        question: Сообщение клиента
+        key: context_key хода
+        embedding: Эмбеддинг сообщения (уже посчитанный для поиска скриптов)
+
+    Returns:
+        CacheProbe (answer = None, если похожего вопроса нет) или None,
+        если кэш недоступен (пустой вопрос или эмбеддинг, ошибка базы).
+    """
+    normalized = normalize_question(question)
+    if not normalized:
+        return None
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = float(np.linalg.norm(vector))
+    if norm == 0:
+        return None
+    try:
+        probe = CacheProbe(question=normalized, context_key=key, embedding=vector / norm)
+        entries = await get_cached_responses(key, RESPONSE_CACHE_TTL, MAX_CANDIDATES)
+    except Exception as e:
+        logger.warning(f"Response cache unavailable: {e}")
+        return None
+
+    if entries:
+        matrix = np.stack([np.frombuffer(blob, dtype=np.float32) for blob, _ in entries])
+        scores = matrix @ probe.embedding
+        best = int(np.argmax(scores))
+        if scores[best] >= RESPONSE_CACHE_SIMILARITY:
+            probe.answer = entries[best][1]
+            probe.similarity = float(scores[best])
+    return probe
+
+
+async def store(probe: CacheProbe, answer: str) -> None:
+    """Сохранить ответ GPT для вопроса из probe."""
+    if not answer:
+        return
+    try:
+        await save_cached_response(
+            probe.context_key,
+            probe.question,
+            probe.embedding.astype(np.float32).tobytes(),
+            answer,
+            RESPONSE_CACHE_TTL,
+        )
+    except Exception as e:
+        logger.warning(f"Failed to store response in cache: {e}")
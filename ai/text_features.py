@@ -0,0 +1,148 @@
+"""
+Ключевые слова сообщения за один проход.
+
+Эвристики engine.py и order_manager.py проверяют текст десятками списков
+подстрок (фото-запрос, тип товара, цвет, намерение оформить заказ, ...).
+Вместо отдельного `any(p in t for p in ...)` на каждый список все списки
+регистрируются как группы одного общего матчера (keyword_group). Текст
+один раз приводится к нижнему регистру и сканируется одним регулярным
+выражением-деревом (trie) по всем подстрокам сразу; результат — объект
+TextFeatures с набором найденных подстрок — кэшируется по тексту, и все
+эвристики читают из него.
+
+Проверки эквивалентны прежним: has_any(group) — есть ли в тексте хоть одна
+подстрока группы, first(group) — первая в порядке группы найденная подстрока.
+"""
+
+import re
+import threading
+from functools import cached_property, lru_cache
+from typing import Iterable, Optional
+
+from gdrive.photo_mapper import tokenize_text
+
+# Сколько разных текстов держать в кэше признаков (сообщения, части ответов, имена файлов)
+FEATURES_CACHE_SIZE = 2048
+
+_WORD_RE = re.compile(r"[а-яА-ЯёЁa-zA-Z]+")
+
+
+class KeywordGroup:
+    """Список подстрок в порядке приоритета (для first)."""
+
+    __slots__ = ("patterns", "pattern_set")
+
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns: tuple[str, ...] = tuple(dict.fromkeys(patterns))
+        self.pattern_set = frozenset(self.patterns)
+
+
+def _trie_pattern(patterns: Iterable[str]) -> str:
+    """Регулярное выражение-дерево: на каждой позиции — самая длинная подстрока из списка."""
+    trie: dict = {}
+    for pattern in patterns:
+        node = trie
+        for ch in pattern:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node: dict) -> str:
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+
+class _Matcher:
+    """Все подстроки всех групп в одном выражении."""
+
+    def __init__(self, patterns: Iterable[str]):
+        patterns = sorted(set(p for p in patterns if p))
+        # Поиск с опережающей проверкой — находим совпадения, начинающиеся в каждой позиции,
+        # даже если они перекрываются
+        self._regex = re.compile("(?=(" + _trie_pattern(patterns) + "))") if patterns else None
+        # На одной позиции выражение отдаёт самую длинную подстроку — более короткие
+        # подстроки, которые являются её началом, тоже найдены
+        self._prefixes = {
+            p: tuple(q for q in patterns if q != p and p.startswith(q))
+            for p in patterns
+        }
+
+    def find_all(self, text: str) -> frozenset[str]:
+        if self._regex is None:
+            return frozenset()
+        found: set[str] = set()
+        for m in self._regex.finditer(text):
+            pattern = m.group(1)
+            if pattern and pattern not in found:
+                found.add(pattern)
+                found.update(self._prefixes[pattern])
+        return frozenset(found)
+
+
+_groups: list[KeywordGroup] = []
+_matcher: Optional[_Matcher] = None
+_lock = threading.Lock()
+
+
+def keyword_group(patterns: Iterable[str]) -> KeywordGroup:
+    """Зарегистрировать список подстрок (вызывается на уровне модуля)."""
+    global _matcher
+    group = KeywordGroup(patterns)
+    with _lock:
+        _groups.append(group)
+        _matcher = None
+        text_features.cache_clear()
+    return group
+
+
+def _get_matcher() -> _Matcher:
+    global _matcher
+    matcher = _matcher
+    if matcher is None:
+        with _lock:
+            if _matcher is None:
+                _matcher = _Matcher(p for group in _groups for p in group.patterns)
+            matcher = _matcher
+    return matcher
+
+
+class TextFeatures:
+    """Признаки одного текста: нижний регистр, найденные подстроки, слова и токены."""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.lower = text.lower()
+        self.keywords = _get_matcher().find_all(self.lower)
+
+    def has_any(self, group: KeywordGroup) -> bool:
+        """Есть ли в тексте хоть одна подстрока группы."""
+        return not self.keywords.isdisjoint(group.pattern_set)
+
+    def first(self, group: KeywordGroup) -> Optional[str]:
+        """Первая (в порядке группы) подстрока, найденная в тексте."""
+        if self.keywords.isdisjoint(group.pattern_set):
+            return None
+        for pattern in group.patterns:
+            if pattern in self.keywords:
+                return pattern
+        return None
+
+    @cached_property
+    def words(self) -> list[str]:
+        """Буквенные слова текста в нижнем регистре."""
+        return _WORD_RE.findall(self.lower)
+
+    @cached_property
+    def tokens(self) -> set[str]:
+        """Токены как в tokenize_text (с маппингом брендов). Не изменять — объект общий."""
+        return tokenize_text(self.text)
+
+
+@lru_cache(maxsize=FEATURES_CACHE_SIZE)
+def text_features(text: str) -> TextFeatures:
+    """Признаки текста (кэшируются по самому тексту)."""
+    return TextFeatures(text or "")
@@ -0,0 +1,219 @@
+"""
+Реестр товаров: одна запись на товар каталога со ссылками на его строки
+наличия и фото.
+
+Раньше одно и то же название товара независимо разбирали три поиска —
+search_catalog, check_product_availability и find_product_photos, — и их
+ответы могли расходиться. Реестр строится один раз на набор снимков
+(каталог, наличие, индекс фото): товары каталога индексируются по токенам
+названия, а к записи товара привязываются его строки наличия (тем же правилом,
+что и в check_product_availability) и фото (как find_product_photos по
+названию). Привязка считается при первом обращении к товару и живёт до
+перестройки реестра. Разрешение товара — один поиск по токенам названия,
+который сразу даёт цену, остатки по размерам/цветам и фото.
+
+Если название не удаётся однозначно сопоставить с товаром каталога,
+resolve_product возвращает None и вызывающий код идёт прежним путём.
+"""
+
+import logging
+import threading
+from dataclasses import dataclass, field
+from functools import cached_property
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from catalog.sheets_loader import get_catalog
+from gdrive.photo_mapper import get_photo_index_version, photos_by_name, tokenize_text
+from inventory.excel_loader import get_inventory_df
+from inventory.stock_checker import availability_for_rows, match_inventory_rows
+from inventory.stock_index import InventoryIndex, get_inventory_index
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ProductRecord:
+    """Товар каталога вместе с его строками наличия и фото."""
+
+    name: str
+    # Строка каталога (name, category, price, colors, descriptions)
+    product: dict
+    tokens: frozenset[str] = field(repr=False)
+    inventory: Optional[InventoryIndex] = field(default=None, repr=False)
+
+    @cached_property
+    def photos(self) -> list[dict]:
+        """Фото товара из индекса фото, для которого построен реестр."""
+        return photos_by_name(self.name)
+
+    @cached_property
+    def _inventory_match(self) -> tuple[np.ndarray, dict[int, int]]:
+        # Строки наличия этого товара и число совпавших токенов для каждой
+        if self.inventory is None:
+            return np.empty(0, dtype=np.int64), {}
+        return match_inventory_rows(self.inventory, set(self.tokens))
+
+    @property
+    def inventory_rows(self) -> np.ndarray:
+        return self._inventory_match[0]
+
+    @property
+    def price(self) -> str:
+        """Цена из каталога, иначе из первой строки наличия."""
+        price = str(self.product.get("price", "") or "").strip()
+        return price or self.availability()["price"]
+
+    def stock(self) -> list[dict]:
+        """Остатки по размерам и цветам: [{"size", "color", "quantity"}] в порядке таблицы."""
+        if self.inventory is None:
+            return []
+        return [
+            {
+                "size": self.inventory.sizes[row],
+                "color": self.inventory.colors[row],
+                "quantity": int(self.inventory.quantities[row]),
+            }
+            for row in self.inventory_rows
+        ]
+
+    def availability(self, size: str = "", color: str = "") -> dict:
+        """То же, что check_product_availability(name, size, color), без повторного поиска."""
+        # Без строк наличия (или без снимка наличия) — «не найден», как и там
+        rows, row_overlap = self._inventory_match
+        return availability_for_rows(self.inventory, rows, row_overlap, size, color)
+
+
+class ProductRegistry:
+    """Записи товаров каталога и поиск записи по токенам названия."""
+
+    def __init__(self, products: list[dict], inventory_df: pd.DataFrame):
+        inventory = get_inventory_index(inventory_df) if not inventory_df.empty else None
+
+        self.records: list[ProductRecord] = []
+        self.by_tokens: dict[frozenset[str], ProductRecord] = {}
+        # Токен → номера записей, в названии которых он есть
+        self.postings: dict[str, set[int]] = {}
+
+        for product in products:
+            name = str(product.get("name", "") or "").strip()
+            tokens = frozenset(tokenize_text(name))
+            # Товары с одинаковым набором токенов не различить — берём первый
+            if not tokens or tokens in self.by_tokens:
+                continue
+            record = ProductRecord(name=name, product=product, tokens=tokens, inventory=inventory)
+            record_id = len(self.records)
+            self.records.append(record)
+            self.by_tokens[tokens] = record
+            for token in tokens:
+                self.postings.setdefault(token, set()).add(record_id)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def resolve(self, product_name: str) -> Optional[ProductRecord]:
+        """
+        Запись товара по названию: точное совпадение набора токенов или
+        единственный товар, в названии которого есть все токены запроса.
+        """
+        tokens = frozenset(tokenize_text(product_name or ""))
+        if not tokens:
+            return None
+        record = self.by_tokens.get(tokens)
+        if record is not None:
+            return record
+
+        candidates: Optional[set[int]] = None
+        for token in tokens:
+            ids = self.postings.get(token)
+            if not ids:
+                return None
+            candidates = ids if candidates is None else candidates & ids
+            if not candidates:
+                return None
+        if len(candidates) != 1:
+            return None
+        return self.records[next(iter(candidates))]
+
+    def find_mentioned(self, text: str) -> Optional[ProductRecord]:
+        """
+        Товар, название которого целиком упомянуто в тексте (все токены
+        названия есть среди токенов текста). Если таких несколько — самый
+        длинный по числу токенов; при равенстве — None.
+        """
+        tokens = tokenize_text(text or "")
+        hits: dict[int, int] = {}
+        for token in tokens:
+            for record_id in self.postings.get(token, ()):
+                hits[record_id] = hits.get(record_id, 0) + 1
+
+        best: Optional[ProductRecord] = None
+        best_size = 0
+        ambiguous = False
+        for record_id, count in hits.items():
+            record = self.records[record_id]
+            size = len(record.tokens)
+            if count != size or size < best_size:
+                continue
+            ambiguous = size == best_size
+            best, best_size = record, size
+        return None if ambiguous else best
+
+
+# Реестр и снимки, из которых он построен: (каталог, наличие, версия индекса фото)
+_registry: Optional[tuple[tuple, ProductRegistry]] = None
+_lock = threading.Lock()
+
+
+def _same_sources(a: tuple, b: tuple) -> bool:
+    products_a, df_a, photos_a = a
+    products_b, df_b, photos_b = b
+    return products_a is products_b and df_a is df_b and photos_a == photos_b
+
+
+def get_product_registry() -> ProductRegistry:
+    """
+    Реестр для текущих снимков каталога, наличия и индекса фото.
+    Перестраивается, только если какой-то из снимков сменился.
+    """
+    global _registry
+    sources = (get_catalog(), get_inventory_df(), get_photo_index_version())
+    cached = _registry
+    if cached is not None and _same_sources(cached[0], sources):
+        return cached[1]
+
+    with _lock:
+        cached = _registry
+        if cached is not None and _same_sources(cached[0], sources):
+            return cached[1]
+        registry = ProductRegistry(sources[0], sources[1])
+        _registry = (sources, registry)
+        logger.info(f"Реестр товаров: {len(registry)} товаров каталога")
+        return registry
+
+
+def refresh_product_registry() -> ProductRegistry:
+    """Перестроить реестр после обновления снимков (для фоновой задачи)."""
+    return get_product_registry()
+
+
+def resolve_product(product_name: str) -> Optional[ProductRecord]:
+    """
+    Товар каталога по названию вместе с наличием и фото.
+
+    Returns:
+        None, если название не сопоставляется однозначно с товаром каталога —
+        тогда нужно идти прежним путём (check_product_availability, find_product_photos).
+    """
+    if not product_name or not product_name.strip():
+        return None
+    return get_product_registry().resolve(product_name)
+
+
+def find_mentioned_product(text: str) -> Optional[ProductRecord]:
+    """Товар каталога, полное название которого есть в сообщении (см. ProductRegistry.find_mentioned)."""
+    if not text or not text.strip():
+        return None
+    return get_product_registry().find_mentioned(text)
@@ -0,0 +1,115 @@
+"""
+Поисковый индекс каталога для search_catalog: инвертированный индекс + BM25F.
+
+Строится один раз на загрузку каталога (CatalogLoader.refresh): каждый товар
+токенизируется по полям (с транслитерацией брендов через _BRAND_MAP), для
+каждой пары (токен, товар) заранее считается вклад BM25F. Списки хранятся
+как numpy-массивы (id товаров, вклады), запрос — векторная сумма вкладов
+по спискам токенов запроса и argpartition для top-k.
+"""
+
+import math
+from collections import Counter
+
+import numpy as np
+
+from gdrive.photo_mapper import tokenize_terms, tokenize_text
+
+# Поле товара → (буст, b — нормализация по длине поля).
+# Бренд/модель в name важнее категории, цвета и тем более описания;
+# длинные descriptions штрафуются по длине сильнее коротких полей.
+FIELD_PARAMS = {
+    "name": (4.0, 0.5),
+    "category": (3.0, 0.3),
+    "colors": (2.0, 0.3),
+    "descriptions": (1.0, 0.75),
+}
+
+# Насыщение частоты терма (стандартное значение BM25)
+BM25_K1 = 1.2
+
+
+class CatalogSearchIndex:
+    """Токен → (id товаров, вклады BM25F) по всему каталогу."""
+
+    def __init__(self, products: list[dict], previous: "CatalogSearchIndex | None" = None):
+        """
+        Args:
+            products: Товары каталога
+            previous: Индекс прошлой загрузки — токены тех же объектов товаров
+                (неизменённых строк листа) берутся из него, а не считаются заново.
+                Статистики BM25 общие для каталога и пересчитываются всегда.
+        """
+        self.products = products
+        self.postings: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+
+        known: dict[int, dict[str, Counter]] = {}
+        if previous is not None:
+            known = {id(p): tfs for p, tfs in zip(previous.products, previous.field_tfs)}
+
+        # Частоты термов по полям и длины полей
+        field_tfs: list[dict[str, Counter]] = []
+        total_len = dict.fromkeys(FIELD_PARAMS, 0)
+        for product in products:
+            tfs = known.get(id(product))
+            if tfs is None:
+                tfs = {
+                    field: Counter(tokenize_terms(str(product.get(field, "") or "")))
+                    for field in FIELD_PARAMS
+                }
+            for field in FIELD_PARAMS:
+                total_len[field] += sum(tfs[field].values())
+            field_tfs.append(tfs)
+        self.field_tfs = field_tfs
+
+        n_docs = len(products)
+        avg_len = {field: (total_len[field] / n_docs if n_docs else 0.0) or 1.0 for field in FIELD_PARAMS}
+
+        # Взвешенная нормализованная частота терма в товаре (BM25F)
+        weighted_tf: dict[str, dict[int, float]] = {}
+        for product_id, tfs in enumerate(field_tfs):
+            for field, (boost, b) in FIELD_PARAMS.items():
+                counts = tfs[field]
+                if not counts:
+                    continue
+                norm = 1.0 - b + b * sum(counts.values()) / avg_len[field]
+                for term, tf in counts.items():
+                    posting = weighted_tf.setdefault(term, {})
+                    posting[product_id] = posting.get(product_id, 0.0) + boost * tf / norm
+
+        for term, posting in weighted_tf.items():
+            df = len(posting)
+            idf = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+            ids = np.fromiter(posting.keys(), dtype=np.int32, count=df)
+            tfs = np.fromiter(posting.values(), dtype=np.float32, count=df)
+            self.postings[term] = (ids, (idf * tfs / (BM25_K1 + tfs)).astype(np.float32))
+
+    def __len__(self) -> int:
+        return len(self.products)
+
+    def search(self, query: str, max_results: int = 5) -> list[dict]:
+        """Товары по убыванию BM25F; при равенстве — в порядке каталога."""
+        query_tokens = tokenize_text(query)
+        if not query_tokens or max_results <= 0:
+            return []
+
+        scores = np.zeros(len(self.products), dtype=np.float32)
+        matched = False
+        for token in query_tokens:
+            posting = self.postings.get(token)
+            if posting is None:
+                continue
+            ids, weights = posting
+            scores[ids] += weights  # id в одном списке уникальны
+            matched = True
+        if not matched:
+            return []
+
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > max_results:
+            top = np.argpartition(-scores[candidates], max_results - 1)[:max_results]
+            candidates = candidates[top]
+        # Стабильная сортировка по убыванию оценки: при равенстве — порядок каталога
+        candidates = np.sort(candidates)
+        ranked = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [self.products[pid] for pid in ranked]
@@ -6,8 +6,9 @@ import logging
 from datetime import datetime, timedelta
 from typing import Optional
 
+from catalog.search_index import CatalogSearchIndex
 from config import CATALOG_SHEETS_ID, CATALOG_CACHE_TTL
-from gdrive.sheets_client import read_catalog_from_sheets
+from gdrive.sheet_snapshot import SheetSnapshot, get_sheet_snapshot, same_sheet
 
 logger = logging.getLogger(__name__)
 
@@ -16,9 +17,69 @@ class CatalogLoader:
     """Загрузчик каталога из Google Sheets с кэшированием."""
 
     def __init__(self):
-        self._cache: Optional[list[dict]] = None
-        self._cache_time: Optional[datetime] = None
+        # Снимок (товары, поисковый индекс, время загрузки) — заменяется одним
+        # присваиванием, поэтому читатели всегда видят целый каталог и индекс к нему.
+        self._snapshot: Optional[tuple[list[dict], CatalogSearchIndex, datetime]] = None
         self._cache_ttl = timedelta(seconds=CATALOG_CACHE_TTL)
+        # Включается фоновым обновлением (scheduler/cache_refresher.py):
+        # запросы получают текущий снимок даже после истечения TTL.
+        self.serve_stale = False
+        # Лист, из которого построен снимок, и товары по содержимому строк —
+        # при изменении листа заново разбираются только изменившиеся строки
+        self._sheet: Optional[SheetSnapshot] = None
+        self._products_by_row: dict[tuple[str, ...], dict] = {}
+
+    def refresh(self, force: bool = False) -> list[dict]:
+        """
+        Загрузить каталог из Google Sheets и атомарно заменить снимок.
+
+        Лист берётся из общего снимка (gdrive/sheet_snapshot.py): если он не
+        менялся, текущий каталог просто продлевается без повторного разбора.
+
+        Raises:
+            Exception: ошибки Google API пробрасываются, старый снимок сохраняется.
+        """
+        if not CATALOG_SHEETS_ID:
+            logger.warning("CATALOG_SHEETS_ID не задан в .env")
+            return []
+
+        sheet = get_sheet_snapshot(CATALOG_SHEETS_ID, force=force)
+        current = self._snapshot
+        if current is not None and same_sheet(sheet, self._sheet):
+            products, index, _ = current
+            self._snapshot = (products, index, datetime.now())
+            logger.debug("Лист каталога не изменился, продлеваем снимок")
+            return products
+
+        products = self._derive_products(sheet)
+        index = CatalogSearchIndex(products, previous=current[1] if current else None)
+        self._sheet = sheet
+        self._snapshot = (products, index, datetime.now())
+        logger.info(f"Загружено {len(products)} товаров из Google Sheets")
+        return products
+
+    def _derive_products(self, sheet: SheetSnapshot) -> list[dict]:
+        """Товары из строк листа; неизменённые строки берутся из прошлой загрузки."""
+        headers = sheet.headers
+        previous = self._products_by_row
+        if self._sheet is None or self._sheet.headers != headers:
+            previous = {}
+
+        products = []
+        by_row: dict[tuple[str, ...], dict] = {}
+        for row in sheet.data_rows():
+            if not any(row):  # Пропускаем пустые строки
+                continue
+            product = by_row.get(row) or previous.get(row)
+            if product is None:
+                product = dict(zip(headers, row))
+            by_row[row] = product
+            products.append(product)
+
+        reused = sum(1 for row in by_row if row in previous)
+        logger.info(f"Каталог: {len(by_row) - reused} новых/изменённых строк, {reused} без изменений")
+        self._products_by_row = by_row
+        return products
 
     def load_catalog(self, force_reload: bool = False) -> list[dict]:
         """
@@ -35,38 +96,44 @@ class CatalogLoader:
             - colors: доступные цвета
             - descriptions: описание
         """
-        now = datetime.now()
+        snapshot = self._snapshot
 
         # Проверяем кэш
-        if not force_reload and self._cache is not None and self._cache_time is not None:
-            if now - self._cache_time < self._cache_ttl:
-                logger.debug(f"Используем кэшированный catalog (age: {now - self._cache_time})")
-                return self._cache
+        if not force_reload and snapshot is not None:
+            products, _, loaded_at = snapshot
+            age = datetime.now() - loaded_at
+            if self.serve_stale or age < self._cache_ttl:
+                logger.debug(f"Используем кэшированный catalog (age: {age})")
+                return products
 
         # Загружаем из Google Sheets
         try:
-            if not CATALOG_SHEETS_ID:
-                logger.warning("CATALOG_SHEETS_ID не задан в .env")
-                return []
-
-            logger.info(f"Загружаем catalog из Google Sheets {CATALOG_SHEETS_ID}")
-            products = read_catalog_from_sheets(CATALOG_SHEETS_ID)
-
-            # Обновляем кэш
-            self._cache = products
-            self._cache_time = now
-
-            logger.info(f"Загружено {len(products)} товаров из Google Sheets")
-            return products
+            return self.refresh(force=force_reload)
 
         except Exception as e:
             logger.error(f"Ошибка загрузки catalog из Google Sheets: {e}", exc_info=True)
             # В случае ошибки возвращаем пустой список (или старый кэш если есть)
-            if self._cache is not None:
+            if snapshot is not None:
                 logger.warning("Возвращаем старый кэш из-за ошибки загрузки")
-                return self._cache
+                return snapshot[0]
             return []
 
+    def version(self) -> str:
+        """
+        Версия текущего каталога без загрузки: ревизия листа, а если ревизия
+        неизвестна — время скачивания листа ("" — каталог ещё не загружен).
+        """
+        sheet = self._sheet
+        if sheet is None:
+            return ""
+        return sheet.revision or sheet.fetched_at.isoformat()
+
+    def get_search_index(self) -> Optional[CatalogSearchIndex]:
+        """Поисковый индекс текущего каталога (с той же проверкой TTL, что и load_catalog)."""
+        self.load_catalog()
+        snapshot = self._snapshot
+        return snapshot[1] if snapshot is not None else None
+
 
 # Singleton instance
 _catalog_loader = CatalogLoader()
@@ -95,6 +162,24 @@ def reload_catalog() -> list[dict]:
     return get_catalog(force_reload=True)
 
 
+def refresh_catalog() -> list[dict]:
+    """
+    Обновить снимок каталога (для фоновой задачи).
+    Ошибки пробрасываются — старый снимок при этом остаётся в силе.
+    """
+    return _catalog_loader.refresh()
+
+
+def get_catalog_version() -> str:
+    """Версия загруженного каталога (см. CatalogLoader.version)."""
+    return _catalog_loader.version()
+
+
+def set_background_refresh(enabled: bool) -> None:
+    """Каталог обновляется фоновой задачей — отдавать снимок без проверки TTL."""
+    _catalog_loader.serve_stale = enabled
+
+
 def search_catalog(query: str, max_results: int = 5) -> list[dict]:
     """
     Поиск товаров в каталоге по запросу.
@@ -106,45 +191,12 @@ def search_catalog(query: str, max_results: int = 5) -> list[dict]:
     Returns:
         Список найденных товаров
     """
-    from gdrive.photo_mapper import tokenize_text
-
-    catalog = get_catalog()
-    if not catalog:
-        return []
-
-    query_tokens = tokenize_text(query.lower())
-    if not query_tokens:
+    # Индекс строится один раз при загрузке каталога (см. catalog/search_index.py)
+    index = _catalog_loader.get_search_index()
+    if index is None or not len(index):
         return []
 
-    # Оценка релевантности для каждого товара
-    scored_products = []
-    for product in catalog:
-        # Формируем строку для поиска из всех полей товара
-        search_text = " ".join([
-            product.get("name", ""),
-            product.get("category", ""),
-            product.get("colors", ""),
-            product.get("descriptions", ""),
-        ]).lower()
-
-        product_tokens = tokenize_text(search_text)
-        if not product_tokens:
-            continue
-
-        # Считаем пересечение токенов
-        overlap = query_tokens & product_tokens
-        if not overlap:
-            continue
-
-        # Простая оценка: количество совпавших токенов
-        score = len(overlap)
-        scored_products.append((score, product))
-
-    # Сортируем по релевантности
-    scored_products.sort(key=lambda x: x[0], reverse=True)
-
-    # Возвращаем топ N результатов
-    return [product for score, product in scored_products[:max_results]]
+    return index.search(query, max_results=max_results)
 
 
 def format_product_for_prompt(product: dict) -> str:
@@ -20,6 +20,16 @@ GREEN_API_TOKEN = os.getenv("GREEN_API_TOKEN", "")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o")
 OPENAI_EMBEDDING_MODEL = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small")
+# Модель для внутренних задач (извлечение полей заказа в JSON); OPENAI_MODEL — для ответа клиенту
+OPENAI_EXTRACTION_MODEL = os.getenv("OPENAI_EXTRACTION_MODEL", "gpt-4o-mini")
+
+# Шлюз запросов к OpenAI (ai/llm_gateway.py): бюджеты в минуту (0 — без ограничения),
+# одновременные запросы, длина очереди для фоновых/вспомогательных запросов, повторы
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "500"))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", "200000"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "100"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
 
 # Google Drive
 GOOGLE_CREDENTIALS_FILE = os.getenv("GOOGLE_CREDENTIALS_FILE", "credentials/google_credentials.json")
@@ -29,6 +39,10 @@ GOOGLE_DRIVE_PHOTOS_FOLDER_ID = os.getenv("GOOGLE_DRIVE_PHOTOS_FOLDER_ID", "")
 CHROMA_DB_PATH = os.getenv("CHROMA_DB_PATH", "data/chroma_db")
 SQLITE_DB_PATH = os.getenv("SQLITE_DB_PATH", "data/ottenok.db")
 KNOWLEDGE_BASE_PATH = os.getenv("KNOWLEDGE_BASE_PATH", "data/knowledge_base")
+VECTOR_INDEX_PATH = os.getenv("VECTOR_INDEX_PATH", "data/vector_index")
+
+# Поиск по скриптам продаж: "numpy" (локальный индекс в памяти) или "chroma"
+SCRIPTS_RETRIEVER = os.getenv("SCRIPTS_RETRIEVER", "numpy").lower()
 
 # Server
 WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
@@ -38,6 +52,10 @@ WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
 MAX_CONVERSATION_HISTORY = int(os.getenv("MAX_CONVERSATION_HISTORY", "20"))
 MAX_RAG_RESULTS = int(os.getenv("MAX_RAG_RESULTS", "5"))
 MAX_PHOTOS_PER_MESSAGE = int(os.getenv("MAX_PHOTOS_PER_MESSAGE", "3"))
+# Поиск и скачивание фото одновременно с запросом к GPT (gdrive/photo_prefetch.py)
+PHOTO_PREFETCH_ENABLED = os.getenv("PHOTO_PREFETCH_ENABLED", "1").lower() in ("1", "true", "yes")
+PHOTO_PREFETCH_COUNT = int(os.getenv("PHOTO_PREFETCH_COUNT", "3"))  # сколько первых фото скачивать заранее
+PHOTO_PREFETCH_TTL = float(os.getenv("PHOTO_PREFETCH_TTL", "120"))  # сек, потом неотправленное сбрасывается
 # При показе товара с разными цветами: макс. фото всего и макс. одного цвета (2 розовых, 2 черных, 2 бежевых = 6)
 MAX_PHOTOS_PRODUCT_SHOWCASE = int(os.getenv("MAX_PHOTOS_PRODUCT_SHOWCASE", "6"))
 MAX_PHOTOS_PER_COLOR = int(os.getenv("MAX_PHOTOS_PER_COLOR", "2"))
@@ -69,9 +87,51 @@ INVENTORY_CACHE_TTL = int(os.getenv("INVENTORY_CACHE_TTL", "300"))  # 5 мину
 # Catalog (Google Sheets)
 CATALOG_SHEETS_ID = os.getenv("CATALOG_SHEETS_ID", "")
 CATALOG_CACHE_TTL = int(os.getenv("CATALOG_CACHE_TTL", "300"))  # 5 минут
+# Как часто сверять ревизию листа через Drive API (каталог и наличие делят снимок)
+SHEETS_REVISION_CHECK_SECONDS = int(os.getenv("SHEETS_REVISION_CHECK_SECONDS", "30"))
+# Постраничное чтение листа: строк на страницу и страниц в одном batchGet
+SHEETS_PAGE_ROWS = int(os.getenv("SHEETS_PAGE_ROWS", "1000"))
+SHEETS_BATCH_RANGES = int(os.getenv("SHEETS_BATCH_RANGES", "5"))
 
 # Photo index (Google Drive)
 PHOTO_INDEX_CACHE_TTL = int(os.getenv("PHOTO_INDEX_CACHE_TTL", "1800"))  # 30 минут
+# Кэш результатов поиска фото по названию (записей, LRU)
+PHOTO_SEARCH_CACHE_SIZE = int(os.getenv("PHOTO_SEARCH_CACHE_SIZE", "512"))
+
+# Пулы потоков для блокирующих клиентов (executors.py): размер пула и таймаут вызова, сек
+CHROMA_POOL_SIZE = int(os.getenv("CHROMA_POOL_SIZE", "4"))
+CHROMA_TIMEOUT = float(os.getenv("CHROMA_TIMEOUT", "10"))
+SHEETS_POOL_SIZE = int(os.getenv("SHEETS_POOL_SIZE", "2"))
+SHEETS_TIMEOUT = float(os.getenv("SHEETS_TIMEOUT", "30"))
+DRIVE_POOL_SIZE = int(os.getenv("DRIVE_POOL_SIZE", "4"))
+DRIVE_TIMEOUT = float(os.getenv("DRIVE_TIMEOUT", "120"))
+
+# Обход папок Drive при построении индекса фото: потоков и запросов в секунду
+DRIVE_CRAWL_WORKERS = int(os.getenv("DRIVE_CRAWL_WORKERS", "8"))
+DRIVE_REQUESTS_PER_SECOND = float(os.getenv("DRIVE_REQUESTS_PER_SECOND", "10"))
+
+# Фоновое обновление кэшей каталога/наличия/фото до истечения TTL (scheduler/cache_refresher.py)
+CACHE_BACKGROUND_REFRESH = os.getenv("CACHE_BACKGROUND_REFRESH", "1").lower() in ("1", "true", "yes")
+CACHE_REFRESH_LEAD = float(os.getenv("CACHE_REFRESH_LEAD", "0.8"))  # доля TTL
+CACHE_REFRESH_RETRY_SECONDS = float(os.getenv("CACHE_REFRESH_RETRY_SECONDS", "60"))
+
+# Семантический кэш ответов на общие вопросы (ai/response_cache.py)
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "1").lower() in ("1", "true", "yes")
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "86400"))  # 24 часа
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.93"))  # косинусная близость
+
+# Быстрый путь без GPT для простых ходов (ai/fast_path.py)
+FAST_PATH_ENABLED = os.getenv("FAST_PATH_ENABLED", "1").lower() in ("1", "true", "yes")
+
+# Сжатие старой переписки в сводку по чату (ai/history_summary.py)
+HISTORY_SUMMARY_ENABLED = os.getenv("HISTORY_SUMMARY_ENABLED", "1").lower() in ("1", "true", "yes")
+HISTORY_RECENT_MESSAGES = int(os.getenv("HISTORY_RECENT_MESSAGES", "12"))  # последние — в промпт дословно
+HISTORY_SUMMARY_BATCH = int(os.getenv("HISTORY_SUMMARY_BATCH", "8"))  # сжимать, когда накопилось столько старых
+HISTORY_SUMMARY_MAX_CHARS = int(os.getenv("HISTORY_SUMMARY_MAX_CHARS", "1500"))
+
+# Бюджет токенов промпта ответа: инструкции + каталог + скрипты + история +
+# сообщение клиента (ai/context_budget.py); 0 — без ограничения
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "7000"))
 
 # Telegram alerts
 TELEGRAM_ALERT_BOT_TOKEN = os.getenv("TELEGRAM_ALERT_BOT_TOKEN", "")
@@ -53,16 +53,16 @@ async def get_conversation_history(chat_id: str, limit: int = MAX_CONVERSATION_H
     async with aiosqlite.connect(SQLITE_DB_PATH) as db:
         db.row_factory = aiosqlite.Row
         cursor = await db.execute(
-            """SELECT role, content, created_at
+            """SELECT id, role, content, created_at
                FROM conversations
                WHERE chat_id = ?
-               ORDER BY created_at DESC
+               ORDER BY created_at DESC, id DESC
                LIMIT ?""",
             (chat_id, limit),
         )
         rows = await cursor.fetchall()
         return [
-            {"role": r["role"], "content": r["content"], "created_at": r["created_at"]}
+            {"id": r["id"], "role": r["role"], "content": r["content"], "created_at": r["created_at"]}
             for r in reversed(rows)
         ]
 
@@ -247,6 +247,80 @@ async def clear_old_conversations(days: int = 30):
         await db.commit()
 
 
+async def get_cached_responses(context_key: str, max_age_seconds: int, limit: int) -> list[tuple[bytes, str]]:
+    """Свежие записи кэша ответов для контекста: [(эмбеддинг вопроса, ответ)], новые первыми."""
+    async with aiosqlite.connect(SQLITE_DB_PATH) as db:
+        cursor = await db.execute(
+            """SELECT embedding, answer
+               FROM response_cache
+               WHERE context_key = ? AND created_at >= datetime('now', ?)
+               ORDER BY id DESC
+               LIMIT ?""",
+            (context_key, f"-{int(max_age_seconds)} seconds", limit),
+        )
+        return [(bytes(row[0]), row[1]) for row in await cursor.fetchall()]
+
+
+async def save_cached_response(
+    context_key: str, question: str, embedding: bytes, answer: str, max_age_seconds: int
+) -> None:
+    """Сохранить ответ в кэш и удалить устаревшие записи."""
+    async with aiosqlite.connect(SQLITE_DB_PATH) as db:
+        await db.execute(
+            "INSERT INTO response_cache (context_key, question, embedding, answer) VALUES (?, ?, ?, ?)",
+            (context_key, question, embedding, answer),
+        )
+        await db.execute(
+            "DELETE FROM response_cache WHERE created_at < datetime('now', ?)",
+            (f"-{int(max_age_seconds)} seconds",),
+        )
+        await db.commit()
+
+
+async def get_messages_after(chat_id: str, after_id: int, limit: int) -> list[dict]:
+    """Сообщения чата с id больше after_id, старые первыми."""
+    async with aiosqlite.connect(SQLITE_DB_PATH) as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute(
+            """SELECT id, role, content
+               FROM conversations
+               WHERE chat_id = ? AND id > ?
+               ORDER BY id
+               LIMIT ?""",
+            (chat_id, after_id, limit),
+        )
+        return [{"id": r["id"], "role": r["role"], "content": r["content"]} for r in await cursor.fetchall()]
+
+
+async def get_conversation_summary(chat_id: str) -> tuple[str, int] | None:
+    """Сводка старой переписки: (текст, id последнего вошедшего в неё сообщения)."""
+    async with aiosqlite.connect(SQLITE_DB_PATH) as db:
+        cursor = await db.execute(
+            "SELECT summary, covered_until FROM conversation_summaries WHERE chat_id = ?",
+            (chat_id,),
+        )
+        row = await cursor.fetchone()
+        return (row[0], int(row[1])) if row else None
+
+
+async def save_conversation_summary(chat_id: str, summary: str, covered_until: int) -> None:
+    """Сохранить сводку; более старая (covered_until меньше) не перезаписывает новую."""
+    async with aiosqlite.connect(SQLITE_DB_PATH) as db:
+        await db.execute(
+            """
+            INSERT INTO conversation_summaries (chat_id, summary, covered_until, updated_at)
+            VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(chat_id) DO UPDATE SET
+                summary = excluded.summary,
+                covered_until = excluded.covered_until,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE excluded.covered_until > conversation_summaries.covered_until
+            """,
+            (chat_id, summary, covered_until),
+        )
+        await db.commit()
+
+
 # ============================================================================
 # Функции для системы автоматического дожима
 # ============================================================================
@@ -78,6 +78,33 @@ def init_db():
         )
     """)
 
+    # Кэш ответов GPT на общие вопросы (ai/response_cache.py)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS response_cache (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            context_key TEXT NOT NULL,
+            question TEXT NOT NULL,
+            embedding BLOB NOT NULL,
+            answer TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_response_cache_context_key
+        ON response_cache(context_key)
+    """)
+
+    # Сводка старой части переписки (ai/history_summary.py)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS conversation_summaries (
+            chat_id TEXT PRIMARY KEY,
+            summary TEXT NOT NULL,
+            covered_until INTEGER NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
     # Миграция: добавляем новые поля если они отсутствуют (для существующих БД)
     _add_column_if_not_exists(cursor, "clients", "last_client_message_at", "TIMESTAMP DEFAULT CURRENT_TIMESTAMP")
     _add_column_if_not_exists(cursor, "clients", "last_bot_message_at", "TIMESTAMP DEFAULT CURRENT_TIMESTAMP")
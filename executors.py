@@ -0,0 +1,87 @@
+"""
+Пулы потоков для блокирующих вызовов внешних сервисов.
+
+ChromaDB, Google Sheets и Google Drive клиенты синхронные. Чтобы они не
+останавливали event loop FastAPI, каждый вызов уходит в отдельный
+ограниченный пул своего backend'а и ждётся с таймаутом:
+
+    rows = await run_blocking("sheets", read_catalog_from_sheets, sheet_id)
+
+Отдельные пулы не дают медленному Drive занять все потоки, нужные Chroma.
+"""
+
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from config import (
+    CHROMA_POOL_SIZE,
+    CHROMA_TIMEOUT,
+    SHEETS_POOL_SIZE,
+    SHEETS_TIMEOUT,
+    DRIVE_POOL_SIZE,
+    DRIVE_TIMEOUT,
+)
+
+logger = logging.getLogger(__name__)
+
+# backend → (макс. потоков, таймаут в секундах)
+_BACKENDS = {
+    "chroma": (CHROMA_POOL_SIZE, CHROMA_TIMEOUT),
+    "sheets": (SHEETS_POOL_SIZE, SHEETS_TIMEOUT),
+    "drive": (DRIVE_POOL_SIZE, DRIVE_TIMEOUT),
+}
+
+_pools: dict[str, ThreadPoolExecutor] = {}
+
+
+def get_executor(backend: str) -> ThreadPoolExecutor:
+    """Пул потоков backend'а (создаётся при первом обращении)."""
+    if backend not in _BACKENDS:
+        raise ValueError(f"Unknown executor backend: {backend}")
+    pool = _pools.get(backend)
+    if pool is None:
+        max_workers, _ = _BACKENDS[backend]
+        pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{backend}-io")
+        _pools[backend] = pool
+    return pool
+
+
+async def run_blocking(
+    backend: str,
+    func: Callable[..., Any],
+    *args,
+    timeout: float | None = None,
+    **kwargs,
+) -> Any:
+    """
+    Выполнить синхронную функцию в пуле backend'а и дождаться результата.
+
+    Args:
+        backend: "chroma", "sheets" или "drive"
+        timeout: Таймаут в секундах (по умолчанию — из конфига backend'а)
+
+    Raises:
+        TimeoutError: если вызов не уложился в таймаут. Поток при этом
+        продолжает работу до конца — Python не умеет прерывать потоки.
+    """
+    pool = get_executor(backend)
+    if timeout is None:
+        timeout = _BACKENDS[backend][1]
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(pool, functools.partial(func, *args, **kwargs))
+    try:
+        return await asyncio.wait_for(future, timeout=timeout)
+    except asyncio.TimeoutError:
+        name = getattr(func, "__name__", repr(func))
+        logger.warning(f"[{backend}] {name} не уложился в {timeout:.0f}с")
+        raise
+
+
+def shutdown_executors() -> None:
+    """Остановить все пулы (при остановке приложения)."""
+    for backend, pool in list(_pools.items()):
+        pool.shutdown(wait=False, cancel_futures=True)
+        _pools.pop(backend, None)
@@ -3,55 +3,121 @@ Google Drive API РєР»РёРµРЅС‚ РґР»СЏ СЂР°Р±РѕС‚С
 """
 
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 from google.oauth2.service_account import Credentials
 from googleapiclient.discovery import build
 
-from config import GOOGLE_CREDENTIALS_FILE, GOOGLE_DRIVE_PHOTOS_FOLDER_ID
+from config import (
+    GOOGLE_CREDENTIALS_FILE,
+    GOOGLE_DRIVE_PHOTOS_FOLDER_ID,
+    DRIVE_CRAWL_WORKERS,
+    DRIVE_REQUESTS_PER_SECOND,
+)
 
 logger = logging.getLogger(__name__)
 
 SCOPES = ["https://www.googleapis.com/auth/drive.readonly"]
+FOLDER_MIME = "application/vnd.google-apps.folder"
+PAGE_SIZE = 1000
+
+_credentials = None
+# googleapiclient (httplib2) не потокобезопасен — у каждого потока свой клиент
+_local = threading.local()
+
+
+class _RateLimiter:
+    """Ограничение частоты запросов к Drive API (общее для всех потоков)."""
+
+    def __init__(self, per_second: float):
+        self._interval = 1.0 / per_second if per_second > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
 
-_service = None
+    def wait(self) -> None:
+        if not self._interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self._interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+_rate_limiter = _RateLimiter(DRIVE_REQUESTS_PER_SECOND)
 
 
 def get_drive_service():
-    """РџРѕР»СѓС‡РёС‚СЊ (РёР»Рё СЃРѕР·РґР°С‚СЊ) РєР»РёРµРЅС‚ Google Drive API."""
-    global _service
-    if _service is None:
-        creds = Credentials.from_service_account_file(
-            GOOGLE_CREDENTIALS_FILE, scopes=SCOPES
+    """Клиент Google Drive API для текущего потока (создаётся при первом обращении)."""
+    global _credentials
+    service = getattr(_local, "service", None)
+    if service is None:
+        if _credentials is None:
+            _credentials = Credentials.from_service_account_file(
+                GOOGLE_CREDENTIALS_FILE, scopes=SCOPES
+            )
+        service = build("drive", "v3", credentials=_credentials)
+        _local.service = service
+    return service
+
+
+def _list_files(query: str, fields: str) -> list[dict]:
+    """files.list по запросу со всеми страницами (nextPageToken) и лимитом частоты."""
+    service = get_drive_service()
+    files = []
+    page_token = None
+    while True:
+        _rate_limiter.wait()
+        results = (
+            service.files()
+            .list(
+                q=query,
+                fields=f"nextPageToken, files({fields})",
+                pageSize=PAGE_SIZE,
+                pageToken=page_token,
+            )
+            .execute()
         )
-        _service = build("drive", "v3", credentials=creds)
-    return _service
+        files.extend(results.get("files", []))
+        page_token = results.get("nextPageToken")
+        if not page_token:
+            return files
 
 
 def list_folders_in_folder(parent_folder_id: str) -> list[dict]:
-    """РЎРїРёСЃРѕРє РїРѕРґРїР°РїРѕРє РІ РїР°РїРєРµ Google Drive."""
-    service = get_drive_service()
+    """Список подпапок в папке Google Drive."""
     query = (
         f"'{parent_folder_id}' in parents "
-        f"and mimeType='application/vnd.google-apps.folder' "
+        f"and mimeType='{FOLDER_MIME}' "
         f"and trashed=false"
     )
-    results = service.files().list(q=query, fields="files(id, name)").execute()
-    return results.get("files", [])
+    return _list_files(query, "id, name")
 
 
 def list_images_in_folder(folder_id: str) -> list[dict]:
-    """РЎРїРёСЃРѕРє РёР·РѕР±СЂР°Р¶РµРЅРёР№ РІ РїР°РїРєРµ Google Drive."""
-    service = get_drive_service()
+    """Список изображений в папке Google Drive."""
     query = (
         f"'{folder_id}' in parents "
         f"and mimeType contains 'image/' "
         f"and trashed=false"
     )
-    results = (
-        service.files()
-        .list(q=query, fields="files(id, name, mimeType)")
-        .execute()
+    return _list_files(query, "id, name, mimeType")
+
+
+def list_folder_children(folder_id: str) -> tuple[list[dict], list[dict]]:
+    """Подпапки и изображения папки одним запросом files.list (все страницы)."""
+    query = (
+        f"'{folder_id}' in parents "
+        f"and (mimeType='{FOLDER_MIME}' or mimeType contains 'image/') "
+        f"and trashed=false"
     )
-    return results.get("files", [])
+    files = _list_files(query, "id, name, mimeType")
+    folders = [f for f in files if f.get("mimeType") == FOLDER_MIME]
+    images = [f for f in files if f.get("mimeType") != FOLDER_MIME]
+    return folders, images
 
 
 def get_direct_download_url(file_id: str) -> str:
@@ -59,6 +125,44 @@ def get_direct_download_url(file_id: str) -> str:
     return f"https://drive.google.com/uc?export=download&id={file_id}"
 
 
+def get_changes_start_token() -> str:
+    """Курсор Drive Changes API: изменения после этого момента вернёт list_changes."""
+    _rate_limiter.wait()
+    result = get_drive_service().changes().getStartPageToken(supportsAllDrives=True).execute()
+    return result["startPageToken"]
+
+
+def list_changes(page_token: str) -> tuple[list[dict], str]:
+    """
+    Все изменения файлов после курсора page_token (все страницы).
+
+    Returns:
+        (изменения, новый курсор). Изменение — dict с fileId, removed и file
+        (id, name, mimeType, parents, trashed).
+    """
+    service = get_drive_service()
+    changes = []
+    while True:
+        _rate_limiter.wait()
+        result = (
+            service.changes()
+            .list(
+                pageToken=page_token,
+                pageSize=PAGE_SIZE,
+                includeRemoved=True,
+                supportsAllDrives=True,
+                includeItemsFromAllDrives=True,
+                fields="nextPageToken, newStartPageToken, "
+                       "changes(fileId, removed, file(id, name, mimeType, parents, trashed))",
+            )
+            .execute()
+        )
+        changes.extend(result.get("changes", []))
+        if "newStartPageToken" in result:
+            return changes, result["newStartPageToken"]
+        page_token = result["nextPageToken"]
+
+
 def download_file_bytes(file_id: str) -> bytes:
     """Скачать файл из Google Drive через API (с авторизацией сервисного аккаунта)."""
     from io import BytesIO
@@ -76,20 +180,63 @@ def download_file_bytes(file_id: str) -> bytes:
     return buffer.getvalue()
 
 
+def _crawl_folders(root_id: str) -> dict[str, tuple[list[dict], list[dict]]]:
+    """
+    Обход дерева папок в ширину: папки одного уровня запрашиваются
+    параллельно в пуле из DRIVE_CRAWL_WORKERS потоков.
+
+    Returns:
+        id папки → (подпапки, изображения)
+    """
+    children: dict[str, tuple[list[dict], list[dict]]] = {}
+    frontier = [root_id]
+    depth = 0
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=DRIVE_CRAWL_WORKERS, thread_name_prefix="drive-crawl") as pool:
+        while frontier:
+            next_frontier = []
+            for folder_id, result in zip(frontier, pool.map(list_folder_children, frontier)):
+                children[folder_id] = result
+                next_frontier.extend(
+                    f["id"] for f in result[0] if f["id"] not in children
+                )
+            images = sum(len(children[f][1]) for f in frontier)
+            logger.info(
+                f"Photo index crawl: level {depth}, {len(frontier)} folders, {images} images "
+                f"({len(children)} folders total, {time.monotonic() - started:.1f}s)"
+            )
+            frontier = next_frontier
+            depth += 1
+    return children
+
+
 def build_product_photo_index(root_folder_id: str | None = None) -> dict:
     """
     Построить индекс: название папки товара → список фото.
-    Рекурсивно обходит структуру папок.
+
+    Дерево папок обходится параллельно (_crawl_folders), затем индекс
+    собирается в том же порядке и с теми же ключами, что и при
+    последовательном рекурсивном обходе.
+    """
+    return build_photo_index_with_folders(root_folder_id)[0]
+
+
+def build_photo_index_with_folders(root_folder_id: str | None = None) -> tuple[dict, dict]:
+    """
+    То же, что build_product_photo_index, плюс карта папок дерева
+    (id → {"name", "path", "parent"}) для инкрементальных обновлений.
     """
     root_id = root_folder_id or GOOGLE_DRIVE_PHOTOS_FOLDER_ID
     if not root_id:
         logger.warning("GOOGLE_DRIVE_PHOTOS_FOLDER_ID не задан")
-        return {}
+        return {}, {}
 
+    children = _crawl_folders(root_id)
     index = {}
+    folders = {root_id: {"name": "", "path": "", "parent": None}}
 
     def add_images_for_folder(folder_id, key, path):
-        images = list_images_in_folder(folder_id)
+        images = children.get(folder_id, ([], []))[1]
         if images:
             index[key.lower()] = {
                 "folder_id": folder_id,
@@ -108,9 +255,10 @@ def build_product_photo_index(root_folder_id: str | None = None) -> dict:
         # Индексируем фото прямо в текущей папке
         if path:
             add_images_for_folder(folder_id, path, path)
-        subfolders = list_folders_in_folder(folder_id)
+        subfolders = children.get(folder_id, ([], []))[0]
         for folder in subfolders:
             current_path = f"{path}/{folder['name']}" if path else folder["name"]
+            folders[folder["id"]] = {"name": folder["name"], "path": current_path, "parent": folder_id}
             add_images_for_folder(folder["id"], folder["name"], current_path)
             traverse(folder["id"], current_path)
 
@@ -118,4 +266,4 @@ def build_product_photo_index(root_folder_id: str | None = None) -> dict:
     add_images_for_folder(root_id, "root", "")
     traverse(root_id)
     logger.info(f"Built photo index: {len(index)} product folders")
-    return index
+    return index, folders
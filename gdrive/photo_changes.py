@@ -0,0 +1,111 @@
+"""
+Инкрементальное обновление индекса фото по Drive Changes API.
+
+Вместо полного обхода дерева папок (build_product_photo_index) к индексу
+применяются только изменения файлов с прошлого раза: новые, переименованные,
+перемещённые и удалённые фото. Изменения самих папок дерева (новая,
+переименованная, перемещённая или удалённая папка) требуют полного обхода —
+apply_drive_changes в этом случае возвращает None.
+"""
+
+import logging
+from typing import Optional
+
+from gdrive.client import FOLDER_MIME, get_direct_download_url
+
+logger = logging.getLogger(__name__)
+
+
+def _folder_keys(folder: dict) -> list[str]:
+    """Ключи индекса папки — как в build_product_photo_index: имя и полный путь."""
+    if not folder["path"]:
+        return ["root"]
+    return list(dict.fromkeys([folder["name"].lower(), folder["path"].lower()]))
+
+
+def _remove_image(index: dict, folder_id: str, folder: dict, file_id: str) -> None:
+    for key in _folder_keys(folder):
+        entry = index.get(key)
+        if entry is None or entry["folder_id"] != folder_id:
+            continue
+        images = [img for img in entry["images"] if img["file_id"] != file_id]
+        if images:
+            index[key] = {**entry, "images": images}
+        else:
+            del index[key]
+
+
+def _add_image(index: dict, folder_id: str, folder: dict, file: dict) -> None:
+    image = {
+        "file_id": file["id"],
+        "filename": file["name"],
+        "direct_url": get_direct_download_url(file["id"]),
+    }
+    for key in _folder_keys(folder):
+        entry = index.get(key)
+        if entry is None:
+            index[key] = {"folder_id": folder_id, "path": folder["path"], "images": [image]}
+        elif entry["folder_id"] == folder_id:
+            index[key] = {**entry, "images": entry["images"] + [image]}
+        # Иначе ключ занят одноимённой папкой в другом месте дерева — как и при полном обходе
+
+
+def apply_drive_changes(index: dict, folders: dict, changes: list[dict]) -> Optional[dict]:
+    """
+    Применить изменения Drive к индексу фото.
+
+    Исходный индекс не меняется: возвращается новый dict, в котором заменены
+    только затронутые записи.
+
+    Args:
+        index: Текущий индекс (ключ папки → {"folder_id", "path", "images"})
+        folders: Папки дерева: id → {"name", "path", "parent"}
+        changes: Результат gdrive.client.list_changes
+
+    Returns:
+        Новый индекс или None, если изменилась структура папок и нужен полный обход.
+    """
+    index = dict(index)
+    image_folder = {
+        img["file_id"]: entry["folder_id"]
+        for entry in index.values()
+        for img in entry.get("images", [])
+    }
+
+    for change in changes:
+        file_id = change.get("fileId")
+        file = change.get("file") or {}
+        gone = change.get("removed") or file.get("trashed")
+        mime = file.get("mimeType", "")
+        parents = [p for p in file.get("parents", []) if p in folders]
+
+        if file_id in folders:
+            known = folders[file_id]
+            if gone:
+                logger.info(f"Photo folder removed: {known['path'] or 'root'}")
+                return None
+            # Корень дерева может называться как угодно; у остальных папок
+            # имя и родитель входят в ключи индекса
+            if known["parent"] is not None and (
+                file.get("name") != known["name"] or known["parent"] not in file.get("parents", [])
+            ):
+                logger.info(f"Photo folder renamed or moved: {known['path']}")
+                return None
+            continue
+
+        if mime == FOLDER_MIME:
+            if parents and not gone:
+                logger.info(f"New photo folder: {file.get('name')}")
+                return None
+            continue
+
+        old_folder = image_folder.pop(file_id, None)
+        if old_folder in folders:
+            _remove_image(index, old_folder, folders[old_folder], file_id)
+
+        if gone or not mime.startswith("image/") or not parents:
+            continue
+        _add_image(index, parents[0], folders[parents[0]], file)
+        image_folder[file_id] = parents[0]
+
+    return index
@@ -3,21 +3,122 @@
 РљСЌС€РёСЂСѓРµС‚ РёРЅРґРµРєСЃ РґР»СЏ Р±С‹СЃС‚СЂРѕРіРѕ РїРѕРёСЃРєР°.
 """
 
+import asyncio
+import itertools
 import json
 import os
 import logging
+import threading
+from collections import OrderedDict
 from datetime import datetime, timedelta
 
-from gdrive.client import build_product_photo_index, list_images_in_folder, get_direct_download_url
-from config import PHOTO_INDEX_CACHE_TTL
+from gdrive.client import (
+    build_photo_index_with_folders,
+    get_changes_start_token,
+    list_changes,
+    list_images_in_folder,
+    get_direct_download_url,
+)
+from gdrive.photo_changes import apply_drive_changes
+from gdrive.photo_store import read_photo_store, write_photo_store
+from config import (
+    PHOTO_INDEX_CACHE_TTL,
+    PHOTO_SEARCH_CACHE_SIZE,
+    GOOGLE_DRIVE_PHOTOS_FOLDER_ID,
+    CACHE_REFRESH_RETRY_SECONDS,
+)
+from executors import run_blocking
 
 logger = logging.getLogger(__name__)
 
+# Индекс с предрассчитанными токенами и цветами (gdrive/photo_store.py)
+STORE_FILE = "data/photo_index.db"
+# Прежний JSON-формат — читается один раз, если файла STORE_FILE ещё нет
 CACHE_FILE = "data/photo_index.json"
+# Курсор Drive Changes API и карта папок дерева — для инкрементальных обновлений
+STATE_FILE = "data/photo_index.state.json"
+
+# Счётчик версий PhotoIndex, общий для всех экземпляров
+_versions = itertools.count(1)
+
+
+class PhotoIndex(dict):
+    """
+    Индекс фото (ключ папки → {"folder_id", "path", "images"}) с версией.
+
+    Любое изменение словаря выдаёт новую version — по ней поисковые структуры
+    (_PhotoSearch) и кэши понимают, что индекс поменялся. Записи папок не
+    меняются на месте, а заменяются целиком (см. photo_changes.py).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.version = next(_versions)
+
+    def _touch(self):
+        self.version = next(_versions)
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._touch()
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._touch()
+
+    def clear(self):
+        super().clear()
+        self._touch()
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self._touch()
+
+    def pop(self, *args):
+        try:
+            return super().pop(*args)
+        finally:
+            self._touch()
+
+    def popitem(self):
+        try:
+            return super().popitem()
+        finally:
+            self._touch()
+
+    def setdefault(self, key, default=None):
+        try:
+            return super().setdefault(key, default)
+        finally:
+            self._touch()
+
+    def __ior__(self, other):
+        result = super().__ior__(other)
+        self._touch()
+        return result
+
 
 # РРЅРґРµРєСЃ РІ РїР°РјСЏС‚Рё
-_photo_index: dict = {}
+_photo_index: PhotoIndex = PhotoIndex()
 _photo_index_loaded_at: datetime | None = None
+# Номер сборки индекса и время сборки (сохраняются в STORE_FILE)
+_photo_index_build = 0
+_photo_index_built_at: datetime | None = None
+# Индекс обновляется фоновой задачей (scheduler/cache_refresher.py) —
+# запросы не пересобирают его сами, даже если TTL истёк
+_serve_stale = False
+
+# Одно обновление индекса за раз: остальные вызовы дожидаются его результата
+_rebuild_lock = threading.Lock()
+# Фоновая пересборка, запущенная запросом при истёкшем TTL, и время последней неудачи
+_rebuild_task: asyncio.Task | None = None
+_rebuild_failed_at: datetime | None = None
+
+
+def set_background_refresh(enabled: bool) -> None:
+    """Включить/выключить режим фонового обновления индекса."""
+    global _serve_stale
+    _serve_stale = enabled
 
 
 def _is_cache_expired() -> bool:
@@ -28,33 +129,217 @@ def _is_cache_expired() -> bool:
 
 def load_photo_index():
     """Р—Р°РіСЂСѓР·РёС‚СЊ РёРЅРґРµРєСЃ РёР· РєСЌС€Р° РёР»Рё РїРµСЂРµСЃРѕР±СЂР°С‚СЊ."""
-    global _photo_index, _photo_index_loaded_at
+    global _photo_index, _photo_index_loaded_at, _photo_index_build, _photo_index_built_at
+
+    try:
+        stored = read_photo_store(STORE_FILE)
+    except Exception as e:
+        logger.warning(f"Failed to load photo index store: {e}")
+        stored = None
+
+    if stored is not None:
+        index = PhotoIndex(stored.index)
+        # Токены и цвета уже посчитаны при сборке — имена файлов не разбираем
+        _get_photo_search(index, stored.features)
+        _photo_index = index
+        _photo_index_loaded_at = datetime.now()
+        _photo_index_build, _photo_index_built_at = stored.version, stored.built_at
+        logger.info(f"Loaded photo index v{stored.version}: {len(index)} products")
+        return
 
     if os.path.exists(CACHE_FILE):
         try:
             with open(CACHE_FILE, "r", encoding="utf-8") as f:
-                _photo_index = json.load(f)
+                index = PhotoIndex(json.load(f))
+            _get_photo_search(index)
+            _photo_index = index
             _photo_index_loaded_at = datetime.now()
-            logger.info(f"Loaded photo index: {len(_photo_index)} products")
-            return
+            _photo_index_built_at = datetime.fromtimestamp(os.path.getmtime(CACHE_FILE))
+            logger.info(f"Loaded photo index from {CACHE_FILE}: {len(index)} products")
         except Exception as e:
             logger.warning(f"Failed to load photo index cache: {e}")
+        else:
+            try:
+                _save_index(index)
+            except Exception as e:
+                logger.warning(f"Failed to save photo index store: {e}")
+            return
 
     rebuild_photo_index()
 
 
 def rebuild_photo_index():
     """РџРµСЂРµСЃРѕР±СЂР°С‚СЊ РёРЅРґРµРєСЃ РёР· Google Drive Рё СЃРѕС…СЂР°РЅРёС‚СЊ РІ РєСЌС€."""
-    global _photo_index, _photo_index_loaded_at
+    global _rebuild_failed_at
     try:
-        _photo_index = build_product_photo_index()
-        _photo_index_loaded_at = datetime.now()
-        with open(CACHE_FILE, "w", encoding="utf-8") as f:
-            json.dump(_photo_index, f, ensure_ascii=False, indent=2)
-        logger.info(f"Rebuilt photo index: {len(_photo_index)} products")
+        refresh_photo_index()
+        _rebuild_failed_at = None
+    except Exception as e:
+        # Текущий индекс остаётся — лучше устаревшие фото, чем никаких
+        logger.error(f"Failed to rebuild photo index, keeping {len(_photo_index)} products: {e}")
+        _rebuild_failed_at = datetime.now()
+
+
+async def _rebuild_in_background() -> None:
+    try:
+        await run_blocking("drive", rebuild_photo_index)
     except Exception as e:
-        logger.error(f"Failed to rebuild photo index: {e}")
-        _photo_index = {}
+        logger.error(f"Background photo index rebuild failed: {e}")
+
+
+def _schedule_rebuild() -> None:
+    """
+    Запустить пересборку индекса в фоне, если она ещё не идёт.
+    После неудачи повтор — не раньше чем через CACHE_REFRESH_RETRY_SECONDS.
+    """
+    global _rebuild_task
+    task = _rebuild_task
+    if task is not None and not task.done() and task.get_loop() is asyncio.get_running_loop():
+        return
+    if (
+        _rebuild_failed_at is not None
+        and (datetime.now() - _rebuild_failed_at).total_seconds() < CACHE_REFRESH_RETRY_SECONDS
+    ):
+        return
+    logger.info("Photo index cache expired, rebuilding from Google Drive in background...")
+    _rebuild_task = asyncio.create_task(_rebuild_in_background())
+
+
+def _save_index(index: PhotoIndex) -> None:
+    """Сохранить индекс в STORE_FILE как следующую сборку."""
+    global _photo_index_build
+    built_at = _photo_index_built_at or datetime.now()
+    write_photo_store(STORE_FILE, index, _get_photo_search(index).features(), _photo_index_build + 1, built_at)
+    _photo_index_build += 1
+
+
+def get_photo_index_version() -> int:
+    """Версия текущего индекса в памяти — меняется при любой его замене или изменении."""
+    return _photo_index.version
+
+
+def get_photo_index_info() -> dict:
+    """Сведения об индексе для /health: число товаров, номер и время сборки."""
+    return {
+        "products": len(_photo_index),
+        "version": _photo_index_build,
+        "built_at": _photo_index_built_at.isoformat(timespec="seconds") if _photo_index_built_at else None,
+    }
+
+
+def _write_json(path: str, data) -> None:
+    """Записать JSON через временный файл — читатель не увидит половину файла."""
+    tmp_file = f"{path}.tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_file, path)
+
+
+def _load_state() -> dict | None:
+    if not os.path.exists(STATE_FILE):
+        return None
+    try:
+        with open(STATE_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        logger.warning(f"Failed to load photo index state: {e}")
+        return None
+
+
+def _apply_changes(state: dict) -> dict | None:
+    """
+    Обновить индекс по изменениям Drive с прошлого курсора.
+    Возвращает новый индекс или None, если нужен полный обход.
+    """
+    global _photo_index, _photo_index_loaded_at, _photo_index_built_at
+    try:
+        changes, next_token = list_changes(state["start_page_token"])
+    except Exception as e:
+        logger.warning(f"Drive changes unavailable, falling back to full rebuild: {e}")
+        return None
+
+    new_index = apply_drive_changes(_photo_index, state["folders"], changes) if changes else _photo_index
+    if new_index is None:
+        logger.info("Photo folder structure changed, full rebuild")
+        return None
+
+    if changes:
+        new_index = PhotoIndex(new_index)
+        _get_photo_search(new_index)
+    _photo_index = new_index
+    _photo_index_loaded_at = datetime.now()
+    if changes:
+        _photo_index_built_at = _photo_index_loaded_at
+        _save_index(new_index)
+    _write_json(STATE_FILE, {**state, "start_page_token": next_token})
+    logger.info(f"Applied {len(changes)} Drive changes to photo index")
+    return new_index
+
+
+def refresh_photo_index() -> dict:
+    """
+    Обновить индекс из Google Drive и атомарно подменить текущий.
+
+    Если есть сохранённый курсор Changes API — применяются только изменения
+    файлов с прошлого обновления (один дешёвый запрос, когда изменений нет).
+    Иначе, или если изменилась структура папок, — полный обход дерева.
+    Ошибки обхода пробрасываются — текущий индекс при этом не меняется;
+    пустой результат обхода при непустом индексе тоже считается ошибкой.
+
+    Одновременно идёт только одно обновление: вызов из другого потока
+    дожидается его и возвращает получившийся индекс.
+    """
+    if not _rebuild_lock.acquire(blocking=False):
+        logger.info("Photo index refresh already in progress, waiting for it")
+        with _rebuild_lock:
+            return _photo_index
+    try:
+        return _refresh_photo_index()
+    finally:
+        _rebuild_lock.release()
+
+
+def _refresh_photo_index() -> dict:
+    global _photo_index, _photo_index_loaded_at, _photo_index_built_at
+    state = _load_state()
+    if (
+        _photo_index
+        and state
+        and state.get("root_id") == GOOGLE_DRIVE_PHOTOS_FOLDER_ID
+        and state.get("start_page_token")
+    ):
+        new_index = _apply_changes(state)
+        if new_index is not None:
+            return new_index
+
+    # Курсор берём до обхода: изменения во время обхода придут в следующий раз
+    start_token = None
+    if GOOGLE_DRIVE_PHOTOS_FOLDER_ID:
+        try:
+            start_token = get_changes_start_token()
+        except Exception as e:
+            logger.warning(f"Failed to get Drive changes start token: {e}")
+
+    # Собираем индекс целиком и только потом подменяем ссылку:
+    # параллельные запросы видят либо старый, либо новый индекс
+    new_index, folders = build_photo_index_with_folders()
+    if not new_index and _photo_index:
+        raise RuntimeError("Google Drive returned an empty photo index")
+    new_index = PhotoIndex(new_index)
+    # Поисковые структуры строим до подмены — первый запрос их не ждёт
+    _get_photo_search(new_index)
+    _photo_index = new_index
+    _photo_index_loaded_at = _photo_index_built_at = datetime.now()
+
+    _save_index(new_index)
+    if start_token:
+        _write_json(STATE_FILE, {
+            "root_id": GOOGLE_DRIVE_PHOTOS_FOLDER_ID,
+            "start_page_token": start_token,
+            "folders": folders,
+        })
+    logger.info(f"Rebuilt photo index: {len(new_index)} products")
+    return new_index
 
 
 # Маппинг русских написаний брендов/моделей → английские (как в именах файлов)
@@ -110,11 +395,11 @@ _STOP_WORDS = {
 }
 
 
-def _tokenize(text: str) -> set[str]:
-    """Разбить текст на значимые слова, с транслитерацией брендов."""
+def _tokenize_terms(text: str) -> list[str]:
+    """Значимые слова текста с повторами (для частот термов), с транслитерацией брендов."""
     import re
     words = re.findall(r'[a-zA-Zа-яА-ЯёЁ0-9]+', text.lower())
-    tokens = set()
+    terms = []
     for w in words:
         if w in _STOP_WORDS:
             continue
@@ -122,15 +407,21 @@ def _tokenize(text: str) -> set[str]:
         if w in _BRAND_MAP:
             mapped = _BRAND_MAP[w]
             if isinstance(mapped, list):
-                tokens.update(mapped)
+                terms.extend(mapped)
             else:
-                tokens.add(mapped)
-            tokens.add(w)
+                terms.append(mapped)
+            if mapped != w:
+                terms.append(w)
         elif w.isdigit() and len(w) >= 2:
-            tokens.add(w)  # числа вроде "25", "95"
+            terms.append(w)  # числа вроде "25", "95"
         elif len(w) > 2:
-            tokens.add(w)
-    return tokens
+            terms.append(w)
+    return terms
+
+
+def _tokenize(text: str) -> set[str]:
+    """Разбить текст на значимые слова, с транслитерацией брендов."""
+    return set(_tokenize_terms(text))
 
 
 def tokenize_text(text: str) -> set[str]:
@@ -138,12 +429,131 @@ def tokenize_text(text: str) -> set[str]:
     return _tokenize(text)
 
 
+def tokenize_terms(text: str) -> list[str]:
+    """Публичный враппер: токены с повторами, в порядке появления."""
+    return _tokenize_terms(text)
+
+
 def _match_score(query_tokens: set[str], filename: str) -> int:
     """Подсчитать количество совпавших токенов запроса в имени файла."""
     file_tokens = _tokenize(filename)
     return len(query_tokens & file_tokens)
 
 
+class _PhotoSearch:
+    """
+    Поисковые структуры по версии индекса фото: все фото в порядке индекса,
+    токены имени файла → номера фото, цвет по имени файла.
+    """
+
+    def __init__(self, index: dict, features: dict[str, tuple[list[str], str]] | None = None):
+        """
+        Args:
+            features: Имя файла → (токены, цвет), сохранённые вместе с индексом
+                (photo_store.py); для остальных имён считаются здесь.
+        """
+        features = features or {}
+        self.version = getattr(index, "version", None)
+        self.images: list[dict] = []
+        self.postings: dict[str, list[int]] = {}
+        self.tokens: dict[str, list[str]] = {}
+        self.colors: dict[str, str] = {}
+        for value in index.values():
+            for img in value.get("images", []):
+                image_id = len(self.images)
+                self.images.append(img)
+                filename = img.get("filename", "")
+                tokens = self.tokens.get(filename)
+                if tokens is None:
+                    known = features.get(filename)
+                    if known is not None:
+                        tokens, self.colors[filename] = known
+                    else:
+                        tokens = sorted(_tokenize(filename))
+                        self.colors[filename] = _color_from_filename(filename)
+                    self.tokens[filename] = tokens
+                for token in tokens:
+                    self.postings.setdefault(token, []).append(image_id)
+
+    def features(self) -> dict[str, tuple[list[str], str]]:
+        """Имя файла → (токены, цвет) — для сохранения вместе с индексом."""
+        return {filename: (tokens, self.colors[filename]) for filename, tokens in self.tokens.items()}
+
+    def match(self, query_tokens: set[str], min_score: int) -> list[tuple[int, dict]]:
+        """(кол-во совпавших токенов, фото) для фото с score >= min_score, в порядке индекса."""
+        scores: dict[int, int] = {}
+        for token in query_tokens:
+            for image_id in self.postings.get(token, ()):
+                scores[image_id] = scores.get(image_id, 0) + 1
+        return [
+            (scores[image_id], self.images[image_id])
+            for image_id in sorted(scores)
+            if scores[image_id] >= min_score
+        ]
+
+
+_photo_search: _PhotoSearch | None = None
+
+
+def _get_photo_search(
+    index: dict | None = None,
+    features: dict[str, tuple[list[str], str]] | None = None,
+) -> _PhotoSearch:
+    """Поисковые структуры для индекса (по умолчанию текущего), перестраиваются при смене версии."""
+    global _photo_search
+    if index is None:
+        index = _photo_index
+    version = getattr(index, "version", None)
+    search = _photo_search
+    if search is not None and version is not None and search.version == version:
+        return search
+    search = _PhotoSearch(index, features)
+    if version is not None:
+        _photo_search = search
+    return search
+
+
+# Результаты поиска по названию: (название в нижнем регистре, версия индекса) → фото.
+# Версия в ключе — после пересборки индекса старые записи просто не находятся;
+# при смене версии кэш очищается целиком.
+_search_cache: OrderedDict[tuple[str, int], list[dict]] = OrderedDict()
+_search_cache_version: int | None = None
+
+
+def _cached_search(product_name: str) -> list[dict] | None:
+    """Результат из кэша (самая свежая запись LRU) или None."""
+    global _search_cache_version
+    version = _photo_index.version
+    if _search_cache_version != version:
+        _search_cache.clear()
+        _search_cache_version = version
+        return None
+    key = (product_name.lower(), version)
+    result = _search_cache.get(key)
+    if result is not None:
+        _search_cache.move_to_end(key)
+    return result
+
+
+def _store_search(product_name: str, result: list[dict]) -> None:
+    if PHOTO_SEARCH_CACHE_SIZE <= 0 or _search_cache_version != _photo_index.version:
+        return
+    _search_cache[(product_name.lower(), _photo_index.version)] = result
+    while len(_search_cache) > PHOTO_SEARCH_CACHE_SIZE:
+        _search_cache.popitem(last=False)
+
+
+def _image_color(img: dict) -> str:
+    """Цвет фото: из предрассчитанных структур индекса, иначе по имени файла."""
+    filename = img.get("filename", "")
+    search = _photo_search
+    if search is not None:
+        color = search.colors.get(filename)
+        if color is not None:
+            return color
+    return _color_from_filename(filename)
+
+
 # Ключевые слова цветов в именах файлов (рус/англ) → нормализованный ключ для группировки
 _COLOR_PATTERNS = [
     ("розов", "розовые"),
@@ -199,7 +609,7 @@ def select_photos_with_color_variety(
 
     by_color: dict[str, list[dict]] = {}
     for img in images:
-        color = _color_from_filename(img.get("filename", ""))
+        color = _image_color(img)
         by_color.setdefault(color, []).append(img)
 
     result = []
@@ -226,16 +636,17 @@ async def find_product_photos(
     или по нечёткому совпадению названия.
     """
     # Обновляем индекс если кэш протух или ещё не загружен
+    # Загрузка/пересборка — блокирующие вызовы Drive API и диска, выполняем в пуле потоков
     if not _photo_index:
-        load_photo_index()
-    elif _is_cache_expired():
-        logger.info("Photo index cache expired, rebuilding from Google Drive...")
-        rebuild_photo_index()
+        await run_blocking("drive", load_photo_index)
+    elif _is_cache_expired() and not _serve_stale:
+        # Пока идёт пересборка, отвечаем по текущему индексу
+        _schedule_rebuild()
 
     # Прямой поиск по folder_id
     if folder_id:
         try:
-            images = list_images_in_folder(folder_id)
+            images = await run_blocking("drive", list_images_in_folder, folder_id)
             return [
                 {
                     "file_id": img["id"],
@@ -247,54 +658,72 @@ async def find_product_photos(
         except Exception as e:
             logger.warning(f"Failed to list images from folder {folder_id}: {e}")
 
-    # Поиск по названию в ключах индекса (точное вхождение)
+    # Поиск по названию не обращается к Drive — результат кэшируется по версии индекса
     if product_name and _photo_index:
-        name_lower = product_name.lower()
-        for key, value in _photo_index.items():
-            if key == "root":
-                continue  # пропускаем root, ищем по конкретным папкам
-            if name_lower in key or key in name_lower:
-                logger.info(f"Photo match by folder key '{key}' for '{product_name}'")
-                return value["images"]
+        cached = _cached_search(product_name)
+        if cached is None:
+            cached = _search_by_name(product_name)
+            _store_search(product_name, cached)
+        if cached:
+            # Копия списка — вызывающий код может его менять
+            return list(cached)
+
+    logger.info(f"No photos found for folder_id={folder_id}, product_name={product_name}")
+    return []
+
+
+def photos_by_name(product_name: str) -> list[dict]:
+    """
+    Фото по названию в текущем индексе — как find_product_photos(product_name=...),
+    но без загрузки индекса и кэша результатов (для построения реестра товаров).
+    """
+    if not product_name or not _photo_index:
+        return []
+    return list(_search_by_name(product_name))
+
+
+def _search_by_name(product_name: str) -> list[dict]:
+    """Фото по названию товара: вхождение в ключ папки, затем токены имён файлов."""
+    # Поиск по названию в ключах индекса (точное вхождение)
+    name_lower = product_name.lower()
+    for key, value in _photo_index.items():
+        if key == "root":
+            continue  # пропускаем root, ищем по конкретным папкам
+        if name_lower in key or key in name_lower:
+            logger.info(f"Photo match by folder key '{key}' for '{product_name}'")
+            return value["images"]
 
     # Токенизированный поиск по именам файлов
-    if product_name and _photo_index:
-        query_tokens = _tokenize(product_name)
-        if not query_tokens:
-            logger.debug(f"No significant tokens in '{product_name}'")
-            return []
+    query_tokens = _tokenize(product_name)
+    if not query_tokens:
+        logger.debug(f"No significant tokens in '{product_name}'")
+        return []
 
-        # Расширяем токены связанными категориями (туфли → +балетки)
-        extra_tokens: set[str] = set()
-        for token in query_tokens:
-            if token in _RELATED_CATEGORIES:
-                extra_tokens.update(_RELATED_CATEGORIES[token])
-        expanded_tokens = query_tokens | extra_tokens
-
-        # Считаем кол-во значимых слов в исходном запросе (до маппинга)
-        import re as _re
-        _orig_words = _re.findall(r'[a-zA-Zа-яА-ЯёЁ0-9]+', product_name.lower())
-        _meaningful = [w for w in _orig_words if w not in _STOP_WORDS and (len(w) > 2 or w in _BRAND_MAP)]
-        min_score = 2 if len(_meaningful) >= 2 else 1
-
-        scored_images = []
-        for value in _photo_index.values():
-            for img in value.get("images", []):
-                score = _match_score(expanded_tokens, img.get("filename", ""))
-                if score >= min_score:
-                    scored_images.append((score, img))
-
-        if scored_images:
-            # Сортируем по количеству совпадений (больше = лучше)
-            scored_images.sort(key=lambda x: x[0], reverse=True)
-            best_score = scored_images[0][0]
-            # Берём только фото с лучшим score
-            best_matches = [img for score, img in scored_images if score == best_score]
-            logger.info(
-                f"Photo match by tokens {query_tokens} (expanded: {expanded_tokens}): "
-                f"{len(best_matches)} photos, best score={best_score}, min_score={min_score}"
-            )
-            return best_matches
+    # Расширяем токены связанными категориями (туфли → +балетки)
+    extra_tokens: set[str] = set()
+    for token in query_tokens:
+        if token in _RELATED_CATEGORIES:
+            extra_tokens.update(_RELATED_CATEGORIES[token])
+    expanded_tokens = query_tokens | extra_tokens
+
+    # Считаем кол-во значимых слов в исходном запросе (до маппинга)
+    import re as _re
+    _orig_words = _re.findall(r'[a-zA-Zа-яА-ЯёЁ0-9]+', product_name.lower())
+    _meaningful = [w for w in _orig_words if w not in _STOP_WORDS and (len(w) > 2 or w in _BRAND_MAP)]
+    min_score = 2 if len(_meaningful) >= 2 else 1
+
+    # Кандидаты — по спискам токенов, без перебора всех фото индекса
+    scored_images = _get_photo_search().match(expanded_tokens, min_score)
+    if not scored_images:
+        return []
 
-    logger.info(f"No photos found for folder_id={folder_id}, product_name={product_name}")
-    return []
+    # Сортируем по количеству совпадений (больше = лучше)
+    scored_images.sort(key=lambda x: x[0], reverse=True)
+    best_score = scored_images[0][0]
+    # Берём только фото с лучшим score
+    best_matches = [img for score, img in scored_images if score == best_score]
+    logger.info(
+        f"Photo match by tokens {query_tokens} (expanded: {expanded_tokens}): "
+        f"{len(best_matches)} photos, best score={best_score}, min_score={min_score}"
+    )
+    return best_matches
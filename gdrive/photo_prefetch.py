@@ -0,0 +1,121 @@
+"""
+Упреждающее скачивание фото товара из Google Drive.
+
+Раньше фото искались только после ответа GPT, а байты скачивались уже
+внутри send_multiple_images — фото уходили клиенту на несколько секунд
+позже текста. Теперь engine начинает основной поиск фото одновременно с
+запросом к GPT и сразу запускает скачивание первых PHOTO_PREFETCH_COUNT
+найденных фото (prefetch). send_multiple_images забирает готовые байты
+(take) вместо повторного скачивания.
+
+Скачанное хранится по чату. После хода handle_message сбрасывает всё
+неотправленное (discard) — и когда фото не отправляются или отправляются
+другие, и при ошибке; если не удался запрос к GPT, generate_response
+отменяет поиск фото. Забытые записи удаляются через PHOTO_PREFETCH_TTL секунд. Без файла учётных данных
+Drive скачивание заранее не запускается.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+
+from config import GOOGLE_CREDENTIALS_FILE, PHOTO_PREFETCH_TTL
+from executors import run_blocking
+
+logger = logging.getLogger(__name__)
+
+
+async def _download(file_id: str) -> bytes | None:
+    from gdrive.client import download_file_bytes
+
+    try:
+        return await run_blocking("drive", download_file_bytes, file_id)
+    except Exception as e:
+        logger.warning(f"Photo prefetch failed for {file_id}: {e}")
+        return None
+
+
+class PhotoPrefetcher:
+    """Скачивания фото, начатые заранее, по (чат, file_id)."""
+
+    def __init__(self, ttl: float = PHOTO_PREFETCH_TTL):
+        self._ttl = ttl
+        self._entries: dict[tuple[str, str], tuple[asyncio.Task, float]] = {}
+        self._lock = threading.Lock()
+        self._stats = {"prefetched": 0, "hits": 0, "discarded": 0}
+
+    def _purge_expired(self, now: float) -> None:
+        expired = [key for key, (_, started) in self._entries.items() if now - started > self._ttl]
+        for key in expired:
+            task, _ = self._entries.pop(key)
+            task.cancel()
+            self._stats["discarded"] += 1
+
+    def prefetch(self, chat_id: str, file_ids: list[str]) -> int:
+        """Начать скачивание фото для чата. Returns: сколько скачиваний запущено."""
+        if not os.path.exists(GOOGLE_CREDENTIALS_FILE):
+            return 0
+        now = time.monotonic()
+        started = 0
+        with self._lock:
+            self._purge_expired(now)
+            for file_id in file_ids:
+                key = (chat_id, file_id)
+                if not file_id or key in self._entries:
+                    continue
+                self._entries[key] = (asyncio.create_task(_download(file_id)), now)
+                started += 1
+            self._stats["prefetched"] += started
+        return started
+
+    async def take(self, chat_id: str, file_id: str) -> bytes | None:
+        """Байты фото, скачанного заранее (None — не скачивалось или не удалось)."""
+        with self._lock:
+            entry = self._entries.pop((chat_id, file_id), None)
+        if entry is None:
+            return None
+        data = await entry[0]
+        if data is not None:
+            with self._lock:
+                self._stats["hits"] += 1
+        return data
+
+    def discard(self, chat_id: str) -> int:
+        """
+        Сбросить всё, что скачивалось для чата и не было отправлено. Скачивание,
+        ещё ждущее в пуле drive, отменяется; уже идущее в потоке дорабатывает,
+        но его результат отбрасывается.
+        """
+        with self._lock:
+            keys = [key for key in self._entries if key[0] == chat_id]
+            for key in keys:
+                task, _ = self._entries.pop(key)
+                task.cancel()
+            self._stats["discarded"] += len(keys)
+        return len(keys)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"pending": len(self._entries), **self._stats}
+
+
+photo_prefetcher = PhotoPrefetcher()
+
+
+def prefetch_photos(chat_id: str, file_ids: list[str]) -> int:
+    return photo_prefetcher.prefetch(chat_id, file_ids)
+
+
+async def take_prefetched(chat_id: str, file_id: str) -> bytes | None:
+    return await photo_prefetcher.take(chat_id, file_id)
+
+
+def discard_prefetched(chat_id: str) -> int:
+    return photo_prefetcher.discard(chat_id)
+
+
+def get_photo_prefetch_stats() -> dict:
+    """Счётчики скачивания фото заранее (для /health)."""
+    return photo_prefetcher.stats()
@@ -0,0 +1,140 @@
+"""
+Индекс фото на диске: SQLite-файл вместо data/photo_index.json.
+
+В файле лежат папки индекса и фото с уже посчитанными токенами имени файла
+и цветом — при загрузке поисковые структуры (_PhotoSearch) не токенизируют
+имена заново. direct_url не хранится: он однозначно строится из file_id.
+
+Файл версионирован: FORMAT_VERSION — формат таблиц (другой формат
+игнорируется, индекс пересобирается), meta.version — номер сборки индекса,
+растёт при каждом сохранении; meta.built_at — время сборки.
+"""
+
+import os
+import sqlite3
+from dataclasses import dataclass
+from datetime import datetime
+
+from gdrive.client import get_direct_download_url
+
+FORMAT_VERSION = 1
+
+_SCHEMA = [
+    "CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)",
+    # Одна строка на ключ индекса (имя папки и полный путь — разные ключи)
+    "CREATE TABLE folders (pos INTEGER PRIMARY KEY, key TEXT NOT NULL, "
+    "folder_id TEXT NOT NULL, path TEXT NOT NULL, image_list INTEGER NOT NULL)",
+    # Списки фото; у ключей одной папки список общий
+    "CREATE TABLE images (image_list INTEGER NOT NULL, pos INTEGER NOT NULL, "
+    "file_id TEXT NOT NULL, filename TEXT NOT NULL, tokens TEXT NOT NULL, color TEXT NOT NULL, "
+    "PRIMARY KEY (image_list, pos))",
+]
+
+
+@dataclass
+class StoredPhotoIndex:
+    """Содержимое файла индекса."""
+
+    index: dict
+    # Имя файла → (токены, цвет), как их считает photo_mapper
+    features: dict[str, tuple[list[str], str]]
+    version: int
+    built_at: datetime
+
+
+def read_photo_store(path: str) -> StoredPhotoIndex | None:
+    """
+    Прочитать индекс из файла.
+
+    Returns:
+        None, если файла нет или он в другом формате.
+    """
+    if not os.path.exists(path):
+        return None
+
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        meta = dict(conn.execute("SELECT key, value FROM meta"))
+        if meta.get("format") != str(FORMAT_VERSION):
+            return None
+
+        lists: dict[int, list[dict]] = {}
+        features: dict[str, tuple[list[str], str]] = {}
+        rows = conn.execute(
+            "SELECT image_list, file_id, filename, tokens, color FROM images ORDER BY image_list, pos"
+        )
+        for image_list, file_id, filename, tokens, color in rows:
+            lists.setdefault(image_list, []).append({
+                "file_id": file_id,
+                "filename": filename,
+                "direct_url": get_direct_download_url(file_id),
+            })
+            features[filename] = (tokens.split(), color)
+
+        index = {
+            key: {"folder_id": folder_id, "path": path_, "images": lists.get(image_list, [])}
+            for key, folder_id, path_, image_list in conn.execute(
+                "SELECT key, folder_id, path, image_list FROM folders ORDER BY pos"
+            )
+        }
+    finally:
+        conn.close()
+
+    return StoredPhotoIndex(
+        index=index,
+        features=features,
+        version=int(meta.get("version", 0)),
+        built_at=datetime.fromisoformat(meta["built_at"]),
+    )
+
+
+def write_photo_store(
+    path: str,
+    index: dict,
+    features: dict[str, tuple[list[str], str]],
+    version: int,
+    built_at: datetime,
+) -> None:
+    """
+    Записать индекс в файл через временный файл — читатель не увидит
+    недописанную базу.
+
+    Args:
+        features: Имя файла → (токены, цвет) для каждого фото индекса
+    """
+    tmp_file = f"{path}.tmp"
+    if os.path.exists(tmp_file):
+        os.remove(tmp_file)
+
+    conn = sqlite3.connect(tmp_file)
+    try:
+        for statement in _SCHEMA:
+            conn.execute(statement)
+        conn.executemany("INSERT INTO meta VALUES (?, ?)", [
+            ("format", str(FORMAT_VERSION)),
+            ("version", str(version)),
+            ("built_at", built_at.isoformat()),
+        ])
+
+        # Ключи одной папки (имя и путь) ссылаются на один список фото
+        list_ids: dict[tuple[str, tuple[str, ...]], int] = {}
+        folder_rows, image_rows = [], []
+        for pos, (key, value) in enumerate(index.items()):
+            images = value.get("images", [])
+            signature = (value["folder_id"], tuple(img["file_id"] for img in images))
+            image_list = list_ids.get(signature)
+            if image_list is None:
+                image_list = list_ids[signature] = len(list_ids)
+                for img_pos, img in enumerate(images):
+                    tokens, color = features[img["filename"]]
+                    image_rows.append(
+                        (image_list, img_pos, img["file_id"], img["filename"], " ".join(tokens), color)
+                    )
+            folder_rows.append((pos, key, value["folder_id"], value.get("path", ""), image_list))
+
+        conn.executemany("INSERT INTO folders VALUES (?, ?, ?, ?, ?)", folder_rows)
+        conn.executemany("INSERT INTO images VALUES (?, ?, ?, ?, ?, ?)", image_rows)
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp_file, path)
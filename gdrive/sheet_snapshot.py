@@ -0,0 +1,135 @@
+"""
+Общий снимок Google Sheets для каталога (catalog/) и наличия (inventory/).
+
+Оба загрузчика читают один и тот же лист. Снимок скачивается один раз на
+обновление и только если лист изменился: перед загрузкой ревизия файла
+сверяется через Drive API (version/modifiedTime). Неизменённый лист
+повторно не скачивается — загрузчики получают тот же объект снимка.
+
+Лист читается постранично (sheets_client.iter_sheet_rows), строки сразу
+приводятся к кортежам ширины заголовков — сырой ответ API целиком в памяти
+не держится.
+"""
+
+import logging
+import threading
+from dataclasses import dataclass, replace
+from datetime import datetime
+from typing import Iterable, Optional
+
+from config import SHEETS_REVISION_CHECK_SECONDS
+from gdrive.client import get_drive_service
+from gdrive.sheets_client import iter_sheet_rows
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class SheetSnapshot:
+    """Содержимое листа на момент загрузки: заголовки и строки данных."""
+
+    spreadsheet_id: str
+    revision: Optional[str]
+    headers: list[str]
+    # Строки данных, дополненные пустыми ячейками до числа заголовков
+    rows: list[tuple[str, ...]]
+    fetched_at: datetime
+    checked_at: datetime
+
+    def data_rows(self) -> list[tuple[str, ...]]:
+        return self.rows
+
+
+def _read_rows(values: Iterable[list[str]]) -> tuple[list[str], list[tuple[str, ...]]]:
+    """Заголовки и строки данных фиксированной ширины из потока строк листа."""
+    values = iter(values)
+    headers = list(next(values, []))
+    width = len(headers)
+    rows = [tuple(row[:width]) + ("",) * (width - len(row)) for row in values]
+    return headers, rows
+
+
+_snapshots: dict[str, SheetSnapshot] = {}
+# Один загрузчик скачивает лист, второй ждёт и получает тот же снимок
+_lock = threading.Lock()
+
+
+def _get_revision(spreadsheet_id: str) -> Optional[str]:
+    """Ревизия файла по Drive API или None, если метаданные недоступны."""
+    try:
+        meta = (
+            get_drive_service()
+            .files()
+            .get(fileId=spreadsheet_id, fields="version,modifiedTime", supportsAllDrives=True)
+            .execute()
+        )
+    except Exception as e:
+        logger.warning(f"Не удалось получить ревизию листа {spreadsheet_id}: {e}")
+        return None
+    version = meta.get("version")
+    modified = meta.get("modifiedTime")
+    if not (version or modified):
+        return None
+    return f"{version}:{modified}"
+
+
+def get_sheet_snapshot(spreadsheet_id: str, force: bool = False) -> SheetSnapshot:
+    """
+    Актуальный снимок листа.
+
+    Ревизия проверяется не чаще раза в SHEETS_REVISION_CHECK_SECONDS;
+    если она не изменилась — возвращается прежний снимок без загрузки.
+    Если ревизию получить не удалось — лист скачивается целиком.
+
+    Args:
+        force: Скачать лист без проверки ревизии (ручная перезагрузка)
+
+    Raises:
+        Exception: ошибки Sheets API при загрузке пробрасываются.
+    """
+    with _lock:
+        current = _snapshots.get(spreadsheet_id)
+        now = datetime.now()
+        if (
+            not force
+            and current is not None
+            and (now - current.checked_at).total_seconds() < SHEETS_REVISION_CHECK_SECONDS
+        ):
+            return current
+
+        revision = _get_revision(spreadsheet_id)
+        if not force and current is not None and revision is not None and revision == current.revision:
+            logger.debug(f"Лист {spreadsheet_id} не изменился (ревизия {revision})")
+            current = replace(current, checked_at=now)
+            _snapshots[spreadsheet_id] = current
+            return current
+
+        logger.info(f"Скачиваем лист {spreadsheet_id} (ревизия {revision})")
+        headers, rows = _read_rows(iter_sheet_rows(spreadsheet_id))
+        snapshot = SheetSnapshot(
+            spreadsheet_id=spreadsheet_id,
+            revision=revision,
+            headers=headers,
+            rows=rows,
+            fetched_at=now,
+            checked_at=now,
+        )
+        logger.info(f"Лист {spreadsheet_id}: {len(rows)} строк")
+        _snapshots[spreadsheet_id] = snapshot
+        return snapshot
+
+
+def same_sheet(a: Optional[SheetSnapshot], b: Optional[SheetSnapshot]) -> bool:
+    """Снимки из одной и той же загрузки листа (проверка ревизии её не меняет)."""
+    return (
+        a is not None
+        and b is not None
+        and a.spreadsheet_id == b.spreadsheet_id
+        and a.fetched_at == b.fetched_at
+    )
+
+
+def reset_sheet_snapshots() -> None:
+    """Сбросить снимки (следующий запрос скачает лист заново)."""
+    with _lock:
+        _snapshots.clear()
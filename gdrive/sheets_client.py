@@ -3,12 +3,12 @@ Google Sheets API client для загрузки каталога товаров
 """
 
 import logging
-from typing import Any
+from typing import Any, Iterator, Optional
 
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
-from config import GOOGLE_CREDENTIALS_FILE
+from config import GOOGLE_CREDENTIALS_FILE, SHEETS_PAGE_ROWS, SHEETS_BATCH_RANGES
 
 logger = logging.getLogger(__name__)
 
@@ -25,51 +25,105 @@ def get_sheets_service():
     return build('sheets', 'v4', credentials=credentials)
 
 
-def read_catalog_from_sheets(spreadsheet_id: str, range_name: str = "A1:Z1000") -> list[dict[str, Any]]:
+def _column_letter(index: int) -> str:
+    """Номер колонки (1 = A) → буквенное обозначение (A, Z, AA, ...)."""
+    letters = ""
+    while index > 0:
+        index, rem = divmod(index - 1, 26)
+        letters = chr(ord("A") + rem) + letters
+    return letters
+
+
+def iter_sheet_rows(
+    spreadsheet_id: str,
+    sheet_title: Optional[str] = None,
+    page_rows: int = SHEETS_PAGE_ROWS,
+) -> Iterator[list[str]]:
+    """
+    Построчно читает лист целиком, без потолка в 1000 строк.
+
+    Реальные размеры листа берутся из get_catalog_metadata (gridProperties),
+    строки запрашиваются страницами по page_rows через values.batchGet —
+    до SHEETS_BATCH_RANGES страниц за один запрос.
+
+    Args:
+        spreadsheet_id: ID Google Sheets документа
+        sheet_title: Название листа (по умолчанию — первый лист)
+        page_rows: Строк в одной странице
+
+    Yields:
+        Строки листа (первая — заголовки). Пустые строки внутри страницы
+        приходят как [], пустой хвост страницы API не возвращает.
+    """
+    metadata = get_catalog_metadata(spreadsheet_id)
+    sheets = metadata["sheets"]
+    if not sheets:
+        return
+    sheet = next((sh for sh in sheets if sh["title"] == sheet_title), None) if sheet_title else sheets[0]
+    if sheet is None:
+        raise ValueError(f"Sheet '{sheet_title}' not found in spreadsheet {spreadsheet_id}")
+
+    last_column = _column_letter(max(sheet["columnCount"], 1))
+    title = sheet["title"].replace("'", "''")
+    pages = [
+        f"'{title}'!A{start}:{last_column}{min(start + page_rows - 1, sheet['rowCount'])}"
+        for start in range(1, sheet["rowCount"] + 1, page_rows)
+    ]
+
+    service = get_sheets_service()
+    for i in range(0, len(pages), SHEETS_BATCH_RANGES):
+        batch = pages[i:i + SHEETS_BATCH_RANGES]
+        result = service.spreadsheets().values().batchGet(
+            spreadsheetId=spreadsheet_id,
+            ranges=batch,
+            majorDimension="ROWS",
+        ).execute()
+        for value_range in result.get("valueRanges", []):
+            yield from value_range.get("values", [])
+        logger.debug(f"Read {len(batch)} page(s) of sheet '{sheet['title']}' ({batch[-1]})")
+
+
+def read_catalog_from_sheets(spreadsheet_id: str, range_name: Optional[str] = None) -> list[dict[str, Any]]:
     """
     Читает каталог товаров из Google Sheets.
 
     Args:
         spreadsheet_id: ID Google Sheets документа
-        range_name: Диапазон ячеек для чтения (по умолчанию A1:Z1000)
+        range_name: Диапазон ячеек для чтения (по умолчанию — весь первый лист,
+            постранично через iter_sheet_rows)
 
     Returns:
         Список словарей с данными о товарах. Первая строка = заголовки колонок.
     """
     try:
-        service = get_sheets_service()
-
-        # Читаем данные из таблицы
-        result = service.spreadsheets().values().get(
-            spreadsheetId=spreadsheet_id,
-            range=range_name
-        ).execute()
-
-        values = result.get('values', [])
+        if range_name is None:
+            rows = iter_sheet_rows(spreadsheet_id)
+        else:
+            service = get_sheets_service()
+            result = service.spreadsheets().values().get(
+                spreadsheetId=spreadsheet_id,
+                range=range_name
+            ).execute()
+            rows = iter(result.get('values', []))
 
-        if not values:
+        # Первая строка - заголовки
+        headers = next(rows, None)
+        if not headers:
             logger.warning(f"No data found in spreadsheet {spreadsheet_id}")
             return []
-
-        # Первая строка - заголовки
-        headers = values[0]
         logger.info(f"Found headers: {headers}")
 
-        # Преобразуем строки в словари
+        # Преобразуем строки в словари по мере чтения
         products = []
-        for row in values[1:]:  # Пропускаем первую строку с заголовками
+        for row in rows:
             if not row:  # Пропускаем пустые строки
                 continue
 
             # Дополняем строку пустыми значениями если колонок меньше чем заголовков
-            while len(row) < len(headers):
-                row.append("")
-
-            product = {}
-            for i, header in enumerate(headers):
-                product[header] = row[i] if i < len(row) else ""
-
-            products.append(product)
+            products.append({
+                header: row[i] if i < len(row) else ""
+                for i, header in enumerate(headers)
+            })
 
         logger.info(f"Loaded {len(products)} products from Google Sheets")
         return products
@@ -96,7 +150,8 @@ def get_catalog_metadata(spreadsheet_id: str) -> dict[str, Any]:
         service = get_sheets_service()
 
         spreadsheet = service.spreadsheets().get(
-            spreadsheetId=spreadsheet_id
+            spreadsheetId=spreadsheet_id,
+            fields='properties.title,sheets.properties(title,sheetId,index,gridProperties)'
         ).execute()
 
         return {
@@ -105,7 +160,9 @@ def get_catalog_metadata(spreadsheet_id: str) -> dict[str, Any]:
                 {
                     'title': sheet['properties']['title'],
                     'sheetId': sheet['properties']['sheetId'],
-                    'index': sheet['properties']['index']
+                    'index': sheet['properties']['index'],
+                    'rowCount': sheet['properties'].get('gridProperties', {}).get('rowCount', 0),
+                    'columnCount': sheet['properties'].get('gridProperties', {}).get('columnCount', 0),
                 }
                 for sheet in spreadsheet.get('sheets', [])
             ]
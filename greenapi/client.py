@@ -9,6 +9,7 @@ from functools import wraps
 import httpx
 
 from config import GREEN_API_INSTANCE_ID, GREEN_API_TOKEN
+from executors import run_blocking
 
 logger = logging.getLogger(__name__)
 
@@ -145,9 +146,11 @@ async def send_multiple_images(chat_id: str, images: list[dict]) -> None:
     """
     Отправить несколько изображений последовательно.
     Каждый dict: {'file_id': str, 'caption': str, 'filename': str}
-    Скачивает из Google Drive через API и загружает в Green API.
+    Скачивает из Google Drive через API (если фото не скачано заранее,
+    см. gdrive/photo_prefetch.py) и загружает в Green API.
     """
     from gdrive.client import download_file_bytes
+    from gdrive.photo_prefetch import take_prefetched
 
     for img in images:
         try:
@@ -157,9 +160,9 @@ async def send_multiple_images(chat_id: str, images: list[dict]) -> None:
                 continue
 
             # Скачиваем из Google Drive через сервисный аккаунт
-            file_bytes = await asyncio.get_event_loop().run_in_executor(
-                None, download_file_bytes, file_id
-            )
+            file_bytes = await take_prefetched(chat_id, file_id)
+            if file_bytes is None:
+                file_bytes = await run_blocking("drive", download_file_bytes, file_id)
 
             # Загружаем в Green API
             await send_image_by_upload(
@@ -6,62 +6,62 @@ Google Sheet формат:
   name | category | price | colors | descriptions | кол-во сумки | 35 | 36 | ... | 42
 
 Возвращает DataFrame в формате (product_name, size, color, quantity, price)
-— по одной строке на каждый размер (unpivot колонок 35-42).
+— по одной строке на каждый размер (unpivot колонок 35-42); типы колонок —
+INVENTORY_DTYPES, индекс — (product_name, size, color).
 """
 
 import logging
 from datetime import datetime, timedelta
 from typing import Optional
 
+import numpy as np
 import pandas as pd
-from google.oauth2.service_account import Credentials
-from googleapiclient.discovery import build
 
-from config import CATALOG_SHEETS_ID, CATALOG_CACHE_TTL, GOOGLE_CREDENTIALS_FILE
+from config import CATALOG_SHEETS_ID, CATALOG_CACHE_TTL
+from gdrive.sheet_snapshot import SheetSnapshot, get_sheet_snapshot, same_sheet
+from .stock_index import get_inventory_index
 
 logger = logging.getLogger(__name__)
 
-SCOPES = ["https://www.googleapis.com/auth/spreadsheets.readonly"]
 SIZE_COLUMNS = ["35", "36", "37", "38", "39", "40", "41", "42"]
 REQUIRED_OUTPUT_COLS = ["product_name", "size", "color", "quantity", "price"]
+# Типы колонок снимка: категории для повторяющихся строк, узкие целые для чисел
+INVENTORY_DTYPES = {
+    "product_name": "category",
+    "size": "Int8",
+    "color": "category",
+    "quantity": "int16",
+    "price": "object",
+}
+
+
+def _sheet_to_frame(sheet: SheetSnapshot) -> pd.DataFrame:
+    """Сырой DataFrame листа: заголовки в нижнем регистре, индекс — номер строки данных."""
+    if not sheet.headers:
+        return pd.DataFrame()
+    headers = [str(h).strip().lower() for h in sheet.headers]
+    # data_rows() дополняет короткие строки пустыми значениями
+    return pd.DataFrame(sheet.data_rows(), columns=headers)
 
-_sheets_service = None
 
+def _text_column(df: pd.DataFrame, name: str) -> pd.Series:
+    """Колонка листа как строки без пробелов по краям ("" если колонки нет)."""
+    if name not in df.columns:
+        return pd.Series("", index=df.index, dtype=object)
+    return df[name].fillna("").astype(str).str.strip()
 
-def _get_sheets_service():
-    global _sheets_service
-    if _sheets_service is None:
-        creds = Credentials.from_service_account_file(
-            GOOGLE_CREDENTIALS_FILE, scopes=SCOPES
-        )
-        _sheets_service = build("sheets", "v4", credentials=creds)
-    return _sheets_service
 
+def _parse_quantity(values: pd.Series) -> pd.Series:
+    """Количество из ячейки: только цифры, всё остальное — 0."""
+    quantity = pd.to_numeric(values.where(values.str.isdigit(), "0"))
+    return quantity.clip(upper=np.iinfo(INVENTORY_DTYPES["quantity"]).max).astype(INVENTORY_DTYPES["quantity"])
 
-def _fetch_sheet_data() -> pd.DataFrame:
-    """Загрузить данные из Google Sheets и вернуть сырой DataFrame."""
-    service = _get_sheets_service()
-    result = (
-        service.spreadsheets()
-        .values()
-        .get(spreadsheetId=CATALOG_SHEETS_ID, range="A1:N1000")
-        .execute()
-    )
-    rows = result.get("values", [])
-    if not rows:
-        return pd.DataFrame()
 
-    headers = [str(h).strip().lower() for h in rows[0]]
-    data = []
-    for row in rows[1:]:
-        # Дополняем короткие строки пустыми значениями
-        padded = row + [""] * (len(headers) - len(row))
-        data.append(dict(zip(headers, padded)))
+def _empty_inventory() -> pd.DataFrame:
+    return pd.DataFrame({col: pd.Series(dtype=dtype) for col, dtype in INVENTORY_DTYPES.items()})
 
-    return pd.DataFrame(data)
 
-
-def _unpivot_sizes(df: pd.DataFrame) -> pd.DataFrame:
+def _melt_sizes(df: pd.DataFrame) -> pd.DataFrame:
     """
     Развернуть колонки размеров (35-42) в строки.
 
@@ -71,61 +71,172 @@ def _unpivot_sizes(df: pd.DataFrame) -> pd.DataFrame:
       ...          | 36   | ...   | 0        | ...
       ...          | 37   | ...   | 1        | ...
 
-    Для товаров без размеров (сумки) — берём количество из колонки "кол-во сумки".
+    Для товаров без размеров (сумки) — берём количество из колонки "кол-во сумки",
+    size у таких строк пустой (<NA>).
+
+    Разворот векторный (melt). Колонка _row — номер строки листа (индекс df);
+    порядок и типы приводит _finalize.
     """
-    result_rows = []
-
-    for _, row in df.iterrows():
-        product_name = str(row.get("name", "")).strip()
-        if not product_name:
-            continue
-
-        color = str(row.get("colors", "")).strip()
-        price = str(row.get("price", "")).strip()
-        category = str(row.get("category", "")).strip().lower()
-
-        # Проверяем, есть ли хоть один размер заполнен
-        has_sizes = False
-        for sc in SIZE_COLUMNS:
-            val = str(row.get(sc, "")).strip()
-            if val and val != "0":
-                has_sizes = True
-                break
-
-        if has_sizes:
-            # Разворачиваем каждый размер в отдельную строку
-            for sc in SIZE_COLUMNS:
-                val = str(row.get(sc, "")).strip()
-                qty = int(val) if val.isdigit() else 0
-                result_rows.append({
-                    "product_name": product_name,
-                    "size": sc,
-                    "color": color,
-                    "quantity": qty,
-                    "price": price,
-                })
-        else:
-            # Нет размеров — берём количество из колонки "кол-во сумки"
-            bag_qty_val = str(row.get("кол-во сумки", "")).strip()
-            bag_qty = int(bag_qty_val) if bag_qty_val.isdigit() else 0
-            result_rows.append({
-                "product_name": product_name,
-                "size": "",
-                "color": color,
-                "quantity": bag_qty,
-                "price": price,
-            })
-
-    return pd.DataFrame(result_rows, columns=REQUIRED_OUTPUT_COLS)
+    base = pd.DataFrame({
+        "product_name": _text_column(df, "name"),
+        "color": _text_column(df, "colors"),
+        "price": _text_column(df, "price"),
+    })
+    base["_row"] = df.index.to_numpy()
+    keep = base["product_name"] != ""
+
+    size_values = pd.DataFrame({sc: _text_column(df, sc) for sc in SIZE_COLUMNS})
+    # Хоть один размер заполнен (любое непустое значение, кроме "0")
+    has_sizes = ((size_values != "") & (size_values != "0")).any(axis=1)
+
+    sized = pd.concat(
+        [base[keep & has_sizes], size_values[keep & has_sizes].apply(_parse_quantity)],
+        axis=1,
+    ).melt(
+        id_vars=["product_name", "color", "price", "_row"],
+        value_vars=SIZE_COLUMNS,
+        var_name="size",
+        value_name="quantity",
+    )
+    sized["size"] = sized["size"].astype(int).astype(INVENTORY_DTYPES["size"])
+
+    # Нет размеров — берём количество из колонки "кол-во сумки"
+    is_bag = keep & ~has_sizes
+    if not is_bag.any():
+        return sized
+    bags = base[is_bag]
+    bags = bags.assign(
+        size=pd.Series(pd.NA, index=bags.index, dtype=INVENTORY_DTYPES["size"]),
+        quantity=_parse_quantity(_text_column(df, "кол-во сумки"))[is_bag],
+    )
+
+    return pd.concat([sized, bags], ignore_index=True)
+
+
+def _finalize(frame: pd.DataFrame) -> tuple[pd.DataFrame, np.ndarray]:
+    """
+    Привести развёрнутые строки к снимку: порядок листа, типы из INVENTORY_DTYPES,
+    индекс (product_name, size, color) — колонки остаются.
+    Возвращает снимок и номер строки листа для каждой его строки.
+    """
+    if frame.empty:
+        return _empty_inventory(), np.empty(0, dtype=np.int64)
+
+    # melt идёт по размерам — возвращаем порядок листа: товар за товаром, размеры по возрастанию
+    frame = frame.sort_values("_row", kind="stable")
+    sheet_rows = frame["_row"].to_numpy(dtype=np.int64)
+    result = frame[REQUIRED_OUTPUT_COLS].astype(INVENTORY_DTYPES)
+    return result.set_index(["product_name", "size", "color"], drop=False), sheet_rows
+
+
+def _unpivot_sizes(df: pd.DataFrame) -> pd.DataFrame:
+    """Развернуть лист целиком (см. _melt_sizes) в снимок наличия."""
+    return _finalize(_melt_sizes(df))[0]
 
 
 class InventoryLoader:
     """Загрузчик каталога из Google Sheets с кэшированием."""
 
     def __init__(self):
-        self._cache: Optional[pd.DataFrame] = None
-        self._cache_time: Optional[datetime] = None
+        # Снимок (DataFrame, время загрузки) — заменяется одним присваиванием
+        self._snapshot: Optional[tuple[pd.DataFrame, datetime]] = None
         self._cache_ttl = timedelta(seconds=CATALOG_CACHE_TTL)
+        # Включается фоновым обновлением: отдаём снимок даже после истечения TTL
+        self.serve_stale = False
+        # Лист, из которого построен снимок, и номер строки листа для каждой строки
+        # снимка — при изменении листа разворачиваются только изменённые строки
+        self._sheet: Optional[SheetSnapshot] = None
+        self._sheet_rows = np.empty(0, dtype=np.int64)
+
+    def refresh(self, force: bool = False) -> pd.DataFrame:
+        """
+        Загрузить каталог из Google Sheets и атомарно заменить снимок.
+        Ошибки пробрасываются, старый снимок сохраняется.
+
+        Лист общий с каталогом (gdrive/sheet_snapshot.py): если он не менялся,
+        текущий снимок просто продлевается.
+        """
+        if not CATALOG_SHEETS_ID:
+            logger.warning("CATALOG_SHEETS_ID не задан")
+            return _empty_inventory()
+
+        sheet = get_sheet_snapshot(CATALOG_SHEETS_ID, force=force)
+        current = self._snapshot
+        if current is not None and same_sheet(sheet, self._sheet):
+            self._snapshot = (current[0], datetime.now())
+            logger.debug("Лист наличия не изменился, продлеваем снимок")
+            return current[0]
+
+        raw_df = _sheet_to_frame(sheet)
+
+        if raw_df.empty:
+            logger.warning("Google Sheet пуст")
+            return _empty_inventory()
+
+        df, sheet_rows = self._derive(sheet, raw_df)
+        # Индекс токенов для check_product_availability строим здесь же,
+        # а не на первом запросе клиента
+        get_inventory_index(df)
+        self._sheet, self._sheet_rows = sheet, sheet_rows
+        self._snapshot = (df, datetime.now())
+
+        logger.info("Загружено %d строк из Google Sheets (%d уникальных товаров)",
+                    len(df), df["product_name"].nunique())
+        return df
+
+    def _derive(self, sheet: SheetSnapshot, raw_df: pd.DataFrame) -> tuple[pd.DataFrame, np.ndarray]:
+        """
+        Снимок наличия из листа. Строки, содержимое которых не изменилось с
+        прошлой загрузки (даже если они сдвинулись), берутся из старого снимка;
+        разворачиваются только новые и изменённые строки.
+        """
+        previous = self._sheet
+        current = self._snapshot
+        if current is None or previous is None or previous.headers != sheet.headers:
+            return _finalize(_melt_sizes(raw_df))
+
+        old_position = {row: pos for pos, row in enumerate(previous.data_rows())}
+        reused: list[tuple[int, int]] = []
+        changed: list[int] = []
+        for pos, row in enumerate(sheet.data_rows()):
+            if row in old_position:
+                reused.append((pos, old_position[row]))
+            else:
+                changed.append(pos)
+
+        # Изменилась большая часть листа — дешевле развернуть целиком
+        if len(changed) * 2 > len(raw_df):
+            return _finalize(_melt_sizes(raw_df))
+
+        try:
+            result = self._merge_changed(raw_df, reused, changed)
+        except Exception as e:
+            # Старый снимок не должен застревать из-за ошибки построчного пересчёта
+            logger.warning("Построчный пересчёт наличия не удался, разворачиваем лист целиком: %s", e)
+            return _finalize(_melt_sizes(raw_df))
+
+        logger.info("Наличие: %d новых/изменённых строк листа, %d без изменений",
+                    len(changed), len(reused))
+        return result
+
+    def _merge_changed(
+        self, raw_df: pd.DataFrame, reused: list[tuple[int, int]], changed: list[int]
+    ) -> tuple[pd.DataFrame, np.ndarray]:
+        """Старые строки снимка для неизменённых строк листа + развёрнутые изменённые."""
+        current = self._snapshot
+        # Строки старого снимка, сгруппированные по номеру строки листа
+        order = np.argsort(self._sheet_rows, kind="stable")
+        sorted_rows = self._sheet_rows[order]
+        take, new_rows = [], []
+        for pos, old_pos in reused:
+            lo, hi = np.searchsorted(sorted_rows, [old_pos, old_pos + 1])
+            take.append(order[lo:hi])
+            new_rows.append(np.full(hi - lo, pos, dtype=np.int64))
+
+        kept = current[0].iloc[np.concatenate(take)].reset_index(drop=True)
+        kept["_row"] = np.concatenate(new_rows)
+        fresh = _melt_sizes(raw_df.iloc[changed])
+        return _finalize(pd.concat([kept, fresh], ignore_index=True))
 
     def load_inventory(self, force_reload: bool = False) -> pd.DataFrame:
         """
@@ -134,41 +245,25 @@ class InventoryLoader:
         Returns:
             DataFrame с колонками: product_name, size, color, quantity, price
         """
-        now = datetime.now()
+        snapshot = self._snapshot
 
-        if not force_reload and self._cache is not None and self._cache_time is not None:
-            if now - self._cache_time < self._cache_ttl:
-                logger.debug("Используем кэшированный inventory (age: %s)", now - self._cache_time)
-                return self._cache
+        if not force_reload and snapshot is not None:
+            df, loaded_at = snapshot
+            age = datetime.now() - loaded_at
+            if self.serve_stale or age < self._cache_ttl:
+                logger.debug("Используем кэшированный inventory (age: %s)", age)
+                return df
 
         try:
-            if not CATALOG_SHEETS_ID:
-                logger.warning("CATALOG_SHEETS_ID не задан")
-                return pd.DataFrame(columns=REQUIRED_OUTPUT_COLS)
-
-            logger.info("Загружаем каталог из Google Sheets: %s", CATALOG_SHEETS_ID)
-            raw_df = _fetch_sheet_data()
-
-            if raw_df.empty:
-                logger.warning("Google Sheet пуст")
-                return pd.DataFrame(columns=REQUIRED_OUTPUT_COLS)
-
-            df = _unpivot_sizes(raw_df)
-
-            self._cache = df
-            self._cache_time = now
-
-            logger.info("Загружено %d строк из Google Sheets (%d уникальных товаров)",
-                        len(df), df["product_name"].nunique())
-            return df
+            return self.refresh(force=force_reload)
 
         except Exception as e:
             logger.error("Ошибка загрузки каталога из Google Sheets: %s", e, exc_info=True)
             # Возвращаем кэш если есть, иначе пустой DataFrame
-            if self._cache is not None:
+            if snapshot is not None:
                 logger.info("Используем устаревший кэш после ошибки")
-                return self._cache
-            return pd.DataFrame(columns=REQUIRED_OUTPUT_COLS)
+                return snapshot[0]
+            return _empty_inventory()
 
 
 # Singleton
@@ -183,3 +278,13 @@ def get_inventory_df(force_reload: bool = False) -> pd.DataFrame:
 def reload_inventory() -> pd.DataFrame:
     """Принудительно перезагрузить каталог из Google Sheets."""
     return get_inventory_df(force_reload=True)
+
+
+def refresh_inventory() -> pd.DataFrame:
+    """Обновить снимок наличия (для фоновой задачи). Ошибки пробрасываются."""
+    return _inventory_loader.refresh()
+
+
+def set_background_refresh(enabled: bool) -> None:
+    """Наличие обновляется фоновой задачей — отдавать снимок без проверки TTL."""
+    _inventory_loader.serve_stale = enabled
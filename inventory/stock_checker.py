@@ -1,19 +1,108 @@
 """
 Проверка наличия товаров в Excel.
-Использует токенизацию для поиска товаров по названию.
+Использует токенизацию для поиска товаров по названию
+(индекс токенов строится один раз на снимок — см. stock_index.py).
 """
 
 import logging
 from typing import Dict, List
 
-import pandas as pd
+import numpy as np
 
 from gdrive.photo_mapper import tokenize_text
 from .excel_loader import get_inventory_df
+from .stock_index import InventoryIndex, get_inventory_index
 
 logger = logging.getLogger(__name__)
 
 
+def _not_found() -> Dict:
+    return {
+        "available": False,
+        "matches": [],
+        "quantity": 0,
+        "price": ""
+    }
+
+
+def match_inventory_rows(index: InventoryIndex, query_tokens: set[str]) -> tuple[np.ndarray, dict[int, int]]:
+    """
+    Строки наличия для токенов названия товара.
+
+    Returns:
+        Номера строк в порядке таблицы и число совпавших токенов для каждой строки.
+    """
+    # Требуем минимум 2 совпавших токена, но для коротких запросов (1 токен) — 1
+    min_overlap = 1 if len(query_tokens) == 1 else 2
+    overlaps = {
+        product_id: score
+        for product_id, score in index.match_products(query_tokens).items()
+        if score >= min_overlap
+    }
+    if not overlaps:
+        return np.empty(0, dtype=np.int64), {}
+
+    # Строки найденных товаров в порядке таблицы
+    rows = np.sort(np.concatenate([index.product_rows[pid] for pid in overlaps]))
+    row_overlap = {
+        int(row): score
+        for pid, score in overlaps.items()
+        for row in index.product_rows[pid]
+    }
+    return rows, row_overlap
+
+
+def availability_for_rows(
+    index: InventoryIndex | None,
+    rows: np.ndarray,
+    row_overlap: dict[int, int],
+    size: str = "",
+    color: str = "",
+) -> Dict:
+    """Результат check_product_availability по найденным строкам с фильтром размера и цвета."""
+    if index is None or not len(rows):
+        return _not_found()
+
+    # Фильтрация по размеру (если задан) — точное совпадение
+    if size and size.strip():
+        rows = rows[index.sizes[rows] == size.strip()]
+
+    # Фильтрация по цвету (если задан)
+    if color and color.strip() and len(rows):
+        rows = rows[index.color_mask(rows, color)]
+
+    matches = [
+        {
+            "product_name": index.product_names[row],
+            "size": index.sizes[row],
+            "color": index.colors[row],
+            "quantity": int(index.quantities[row]),
+            "price": index.prices[row],
+            "overlap_score": row_overlap[int(row)],
+        }
+        for row in rows
+    ]
+
+    # Сортируем по overlap_score (больше совпадений = выше в списке)
+    matches.sort(key=lambda x: x["overlap_score"], reverse=True)
+
+    # Подсчитываем общее количество
+    total_quantity = sum(m["quantity"] for m in matches)
+
+    # Товар доступен, если есть хотя бы одно совпадение с quantity > 0
+    available = any(m["quantity"] > 0 for m in matches)
+
+    # Берем цену из первого совпадения
+    price = matches[0]["price"] if matches else ""
+
+    return {
+        "available": available,
+        "matches": matches,
+        "quantity": total_quantity,
+        "price": price
+    }
+
+
 def check_product_availability(
     product_name: str,
     size: str = "",
@@ -38,95 +127,18 @@ def check_product_availability(
 
     if df.empty:
         logger.warning("Inventory DataFrame пустой")
-        return {
-            "available": False,
-            "matches": [],
-            "quantity": 0,
-            "price": ""
-        }
+        return _not_found()
 
     # Токенизируем название товара
     query_tokens = tokenize_text(product_name)
 
     if not query_tokens:
         logger.warning("Не удалось токенизировать product_name: %s", product_name)
-        return {
-            "available": False,
-            "matches": [],
-            "quantity": 0,
-            "price": ""
-        }
-
-    # Ищем совпадения
-    matches = []
-
-    for idx, row in df.iterrows():
-        row_product_name = str(row.get("product_name", ""))
-        row_size = str(row.get("size", "")).strip()
-        row_color = str(row.get("color", "")).strip().lower()
-        row_quantity = int(row.get("quantity", 0))
-        row_price = str(row.get("price", ""))
-
-        # Токенизируем название товара из Excel
-        product_tokens = tokenize_text(row_product_name)
-
-        # Подсчитываем количество совпавших токенов
-        overlap = query_tokens & product_tokens
-        overlap_score = len(overlap)
-
-        # Требуем минимум 2 совпавших токена, но для коротких запросов (1 токен) — 1
-        min_overlap = 1 if len(query_tokens) == 1 else 2
-        if overlap_score < min_overlap:
-            continue
-
-        # Фильтрация по размеру (если задан)
-        if size and size.strip():
-            # Проверяем точное совпадение размера
-            if row_size != size.strip():
-                continue
-
-        # Фильтрация по цвету (если задан)
-        if color and color.strip():
-            color_lower = color.strip().lower()
-            # Сравниваем по корню цвета (первые 4+ символа), чтобы
-            # "бежевый" совпадал с "бежевые", "черный" с "черные" и т.д.
-            color_stem = color_lower[:min(4, len(color_lower))]
-            row_stem = row_color[:min(4, len(row_color))]
-            if (
-                color_lower not in row_color
-                and row_color not in color_lower
-                and color_stem != row_stem
-            ):
-                continue
-
-        # Добавляем совпадение
-        matches.append({
-            "product_name": row_product_name,
-            "size": row_size,
-            "color": row_color,
-            "quantity": row_quantity,
-            "price": row_price,
-            "overlap_score": overlap_score
-        })
-
-    # Сортируем по overlap_score (больше совпадений = выше в списке)
-    matches.sort(key=lambda x: x["overlap_score"], reverse=True)
-
-    # Подсчитываем общее количество
-    total_quantity = sum(m["quantity"] for m in matches)
-
-    # Товар доступен, если есть хотя бы одно совпадение с quantity > 0
-    available = any(m["quantity"] > 0 for m in matches)
-
-    # Берем цену из первого совпадения
-    price = matches[0]["price"] if matches else ""
+        return _not_found()
 
-    return {
-        "available": available,
-        "matches": matches,
-        "quantity": total_quantity,
-        "price": price
-    }
+    index = get_inventory_index(df)
+    rows, row_overlap = match_inventory_rows(index, query_tokens)
+    return availability_for_rows(index, rows, row_overlap, size, color)
 
 
 def format_availability_message(availability: Dict, product_name: str) -> str:
@@ -0,0 +1,95 @@
+"""
+Индекс наличия для check_product_availability.
+
+Строится один раз на DataFrame наличия (InventoryLoader.refresh):
+  - каждое уникальное название товара токенизируется один раз;
+  - токен → id товаров, id товара → номера его строк (размеры/цвета);
+  - колонки size/color/quantity/price нормализованы в массивы.
+
+Проверка наличия — поиск товаров по спискам токенов и булевы маски
+по строкам найденных товаров вместо df.iterrows() по всей таблице.
+"""
+
+import numpy as np
+import pandas as pd
+
+from gdrive.photo_mapper import tokenize_text
+
+
+class InventoryIndex:
+    """Предрассчитанные токены товаров и нормализованные колонки наличия."""
+
+    def __init__(self, df: pd.DataFrame):
+        n = len(df)
+
+        def column(name: str, default="") -> pd.Series:
+            if name in df.columns:
+                return df[name]
+            return pd.Series([default] * n, index=df.index)
+
+        names = column("product_name").astype(str).to_numpy()
+        self.product_names = names
+        # size бывает строкой ("38", "-") или Int8 с <NA> для товаров без размера
+        self.sizes = column("size").astype("string").fillna("").str.strip().to_numpy(dtype=object)
+        self.colors = column("color").astype(str).str.strip().str.lower().to_numpy()
+        self.quantities = pd.to_numeric(column("quantity", 0), errors="coerce").fillna(0).astype(int).to_numpy()
+        self.prices = column("price").astype(str).to_numpy()
+
+        # Уникальные названия → номера строк (в порядке таблицы)
+        codes, uniques = pd.factorize(names)
+        order = np.argsort(codes, kind="stable")
+        bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+        self.product_rows: list[np.ndarray] = [
+            order[bounds[i]:bounds[i + 1]] for i in range(len(uniques))
+        ]
+
+        self.product_tokens: list[set[str]] = [tokenize_text(name) for name in uniques]
+        self.postings: dict[str, list[int]] = {}
+        for product_id, tokens in enumerate(self.product_tokens):
+            for token in tokens:
+                self.postings.setdefault(token, []).append(product_id)
+
+    def match_products(self, query_tokens: set[str]) -> dict[int, int]:
+        """id товара → число совпавших токенов (только для товаров с совпадениями)."""
+        overlap: dict[int, int] = {}
+        for token in query_tokens:
+            for product_id in self.postings.get(token, ()):
+                overlap[product_id] = overlap.get(product_id, 0) + 1
+        return overlap
+
+    def color_mask(self, rows: np.ndarray, color: str) -> np.ndarray:
+        """
+        Маска строк, чей цвет совпадает с color по вхождению или корню
+        (первые 4 символа): "бежевый" ~ "бежевые", "черный" ~ "черные".
+        """
+        color_lower = color.strip().lower()
+        color_stem = color_lower[:4]
+        verdict: dict[str, bool] = {}
+        mask = np.zeros(len(rows), dtype=bool)
+        for i, row_color in enumerate(self.colors[rows]):
+            ok = verdict.get(row_color)
+            if ok is None:
+                ok = (
+                    color_lower in row_color
+                    or row_color in color_lower
+                    or color_stem == row_color[:4]
+                )
+                verdict[row_color] = ok
+            mask[i] = ok
+        return mask
+
+
+# Последний DataFrame и его индекс: снимок наличия меняется только при
+# перезагрузке, поэтому хватает одной записи, сравнение — по идентичности.
+_cached: tuple[pd.DataFrame, InventoryIndex] | None = None
+
+
+def get_inventory_index(df: pd.DataFrame) -> InventoryIndex:
+    """Индекс для данного DataFrame (строится при первом обращении)."""
+    global _cached
+    cached = _cached
+    if cached is not None and cached[0] is df:
+        return cached[1]
+    index = InventoryIndex(df)
+    _cached = (df, index)
+    return index
@@ -0,0 +1,84 @@
+"""
+Бенчмарк поиска по sales_scripts: ChromaDB vs локальный NumPy индекс.
+
+Запросы — случайные единичные векторы той же размерности, поэтому
+OpenAI API не нужен. Сравниваются только задержки поиска top-k.
+
+Запуск: python -m knowledge.bench_vector_index [--queries 500] [--k 3]
+"""
+
+import argparse
+import statistics
+import time
+
+import chromadb
+import numpy as np
+
+from config import CHROMA_DB_PATH
+from knowledge.vector_index import LocalVectorIndex, export_collection
+
+COLLECTION = "sales_scripts"
+
+
+def _timings_ms(fn, queries) -> list[float]:
+    result = []
+    for q in queries:
+        start = time.perf_counter()
+        fn(q)
+        result.append((time.perf_counter() - start) * 1000)
+    return result
+
+
+def _report(label: str, timings: list[float]) -> None:
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(
+        f"{label:<8} mean={statistics.mean(timings):.3f}ms "
+        f"p50={statistics.median(timings):.3f}ms p95={p95:.3f}ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=3)
+    args = parser.parse_args()
+
+    client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
+    collection = client.get_collection(COLLECTION)
+
+    index = LocalVectorIndex.load(COLLECTION)
+    if index is None:
+        export_collection(collection, COLLECTION)
+        index = LocalVectorIndex.load(COLLECTION)
+    if index is None:
+        print(f"Коллекция {COLLECTION} пуста — нечего сравнивать")
+        return
+
+    rng = np.random.default_rng(42)
+    queries = rng.standard_normal((args.queries, index.matrix.shape[1])).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    queries = [q.tolist() for q in queries]
+
+    # Прогрев: первый запрос к Chroma поднимает HNSW индекс с диска
+    collection.query(query_embeddings=[queries[0]], n_results=args.k)
+    index.query(queries[0], n_results=args.k)
+
+    print(f"{COLLECTION}: {len(index)} vectors x {index.matrix.shape[1]} dims, "
+          f"{args.queries} queries, k={args.k}")
+    _report("chroma", _timings_ms(
+        lambda q: collection.query(query_embeddings=[q], n_results=args.k), queries
+    ))
+    _report("numpy", _timings_ms(lambda q: index.query(q, n_results=args.k), queries))
+
+    # Совпадение top-k между двумя реализациями
+    overlap = []
+    for q in queries[:50]:
+        chroma_docs = set(collection.query(query_embeddings=[q], n_results=args.k)["documents"][0])
+        numpy_docs = {r["text"] for r in index.query(q, n_results=args.k)}
+        overlap.append(len(chroma_docs & numpy_docs) / max(len(chroma_docs), 1))
+    print(f"top-{args.k} agreement: {statistics.mean(overlap):.0%}")
+
+
+if __name__ == "__main__":
+    main()
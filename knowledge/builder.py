@@ -11,7 +11,8 @@ import logging
 
 from knowledge.docx_parser import parse_catalog_docx, parse_scripts_docx
 from knowledge.chat_parser import parse_chat_txt, extract_chat_from_zip, chat_messages_to_chunks
-from knowledge.embeddings import store_in_collection, delete_collection
+from knowledge.embeddings import store_in_collection, delete_collection, chroma_client
+from knowledge.vector_index import export_collection
 from config import KNOWLEDGE_BASE_PATH
 
 logging.basicConfig(
@@ -80,6 +81,8 @@ def build_knowledge_base():
     if all_script_chunks:
         logger.info(f"Сохраняем {len(all_script_chunks)} чанков скриптов/чатов...")
         store_in_collection("sales_scripts", all_script_chunks)
+        # Локальная копия для быстрого поиска в памяти (ai/rag.py, SCRIPTS_RETRIEVER=numpy)
+        export_collection(chroma_client.get_collection("sales_scripts"), "sales_scripts")
     else:
         logger.warning("Файлы скриптов/чатов не найдены")
 
@@ -0,0 +1,155 @@
+"""
+Локальный векторный индекс для небольших коллекций (sales_scripts).
+
+Эмбеддинги хранятся в .npy файле (float32, C-порядок) и открываются через
+memory-map, документы и metadata — в .json рядом. Поиск top-k — одно
+матричное умножение по нормализованным векторам (косинусная близость).
+
+Экспорт из ChromaDB: python -m knowledge.vector_index
+"""
+
+import json
+import logging
+import os
+
+import numpy as np
+
+from config import VECTOR_INDEX_PATH
+
+logger = logging.getLogger(__name__)
+
+
+def _index_paths(name: str, index_dir: str) -> tuple[str, str]:
+    base = os.path.join(index_dir, name)
+    return f"{base}.npy", f"{base}.json"
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def save_vector_index(
+    name: str,
+    ids: list[str],
+    embeddings: list[list[float]],
+    documents: list[str],
+    metadatas: list[dict],
+    index_dir: str = VECTOR_INDEX_PATH,
+) -> None:
+    """Сохранить эмбеддинги (нормализованные, float32) и документы на диск."""
+    os.makedirs(index_dir, exist_ok=True)
+    npy_path, meta_path = _index_paths(name, index_dir)
+
+    matrix = np.ascontiguousarray(
+        _normalize_rows(np.asarray(embeddings, dtype=np.float32)), dtype=np.float32
+    )
+
+    # Пишем во временные файлы и переименовываем — читатель никогда не увидит половину индекса
+    tmp_npy = f"{npy_path}.tmp.npy"
+    tmp_meta = f"{meta_path}.tmp"
+    np.save(tmp_npy, matrix)
+    with open(tmp_meta, "w", encoding="utf-8") as f:
+        json.dump(
+            {"ids": ids, "documents": documents, "metadatas": metadatas},
+            f,
+            ensure_ascii=False,
+        )
+    os.replace(tmp_npy, npy_path)
+    os.replace(tmp_meta, meta_path)
+    logger.info(f"Saved vector index '{name}': {matrix.shape[0]} x {matrix.shape[1]}")
+
+
+def export_collection(collection, name: str, index_dir: str = VECTOR_INDEX_PATH) -> int:
+    """Выгрузить коллекцию ChromaDB в локальный индекс. Возвращает кол-во векторов."""
+    data = collection.get(include=["embeddings", "documents", "metadatas"])
+    ids = list(data.get("ids") or [])
+    embeddings = data.get("embeddings")
+    if embeddings is None or len(ids) == 0:
+        logger.warning(f"Коллекция '{name}' пуста, локальный индекс не создан")
+        return 0
+    save_vector_index(
+        name,
+        ids=ids,
+        embeddings=[list(e) for e in embeddings],
+        documents=list(data.get("documents") or [""] * len(ids)),
+        metadatas=[m or {} for m in (data.get("metadatas") or [{}] * len(ids))],
+        index_dir=index_dir,
+    )
+    return len(ids)
+
+
+class LocalVectorIndex:
+    """Матрица эмбеддингов в памяти (memory-map) + документы для top-k поиска."""
+
+    def __init__(
+        self, matrix: np.ndarray, ids: list[str], documents: list[str], metadatas: list[dict], version: str = ""
+    ):
+        self.matrix = matrix
+        self.ids = ids
+        self.documents = documents
+        self.metadatas = metadatas
+        # Меняется при каждой выгрузке индекса (время изменения и размер файла матрицы)
+        self.version = version
+
+    @classmethod
+    def load(cls, name: str, index_dir: str = VECTOR_INDEX_PATH) -> "LocalVectorIndex | None":
+        """Открыть индекс с диска. Возвращает None, если файлов нет или они повреждены."""
+        npy_path, meta_path = _index_paths(name, index_dir)
+        if not (os.path.exists(npy_path) and os.path.exists(meta_path)):
+            return None
+        try:
+            matrix = np.load(npy_path, mmap_mode="r")
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            stat = os.stat(npy_path)
+        except Exception as e:
+            logger.warning(f"Failed to load vector index '{name}': {e}")
+            return None
+        if matrix.ndim != 2 or matrix.shape[0] != len(meta.get("ids", [])):
+            logger.warning(f"Vector index '{name}' is inconsistent, ignoring")
+            return None
+        return cls(
+            matrix, meta["ids"], meta.get("documents", []), meta.get("metadatas", []),
+            version=f"{stat.st_mtime_ns}:{stat.st_size}",
+        )
+
+    def __len__(self) -> int:
+        return self.matrix.shape[0]
+
+    def query(self, embedding: list[float], n_results: int = 3) -> list[dict]:
+        """Top-k документов по косинусной близости к embedding."""
+        if len(self) == 0 or n_results <= 0:
+            return []
+        q = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(q)
+        if norm == 0:
+            return []
+        scores = self.matrix @ (q / norm)
+
+        k = min(n_results, len(scores))
+        if k < len(scores):
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+
+        return [
+            {
+                "text": self.documents[i],
+                "metadata": self.metadatas[i] if i < len(self.metadatas) else {},
+                "score": float(scores[i]),
+            }
+            for i in top
+        ]
+
+
+if __name__ == "__main__":
+    import chromadb
+    from config import CHROMA_DB_PATH
+
+    logging.basicConfig(level=logging.INFO)
+    client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
+    count = export_collection(client.get_collection("sales_scripts"), "sales_scripts")
+    print(f"Exported {count} vectors to {VECTOR_INDEX_PATH}")
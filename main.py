@@ -13,14 +13,24 @@ import aiosqlite
 import uvicorn
 from fastapi import FastAPI
 
-from config import WEBHOOK_HOST, WEBHOOK_PORT, GREEN_API_POLLING, GREEN_API_POLL_INTERVAL, SQLITE_DB_PATH
+from config import (
+    WEBHOOK_HOST,
+    WEBHOOK_PORT,
+    GREEN_API_POLLING,
+    GREEN_API_POLL_INTERVAL,
+    SQLITE_DB_PATH,
+    CACHE_BACKGROUND_REFRESH,
+)
 from greenapi.webhook import router as webhook_router, set_message_handler
 from greenapi.poller import poll_notifications
 from gdrive.photo_mapper import load_photo_index
 from db.models import init_db
 from ai.engine import handle_message
+from ai.context_budget import load_encoding
 from scheduler.nudge_scheduler import get_nudge_scheduler
+from scheduler.cache_refresher import refresh_caches_forever
 from admin.routes import router as admin_router
+from executors import run_blocking, shutdown_executors
 
 # Логирование
 logging.basicConfig(
@@ -44,7 +54,16 @@ async def lifespan(app: FastAPI):
     """Инициализация при старте, очистка при остановке."""
     logger.info("Запуск бота Sales Ottenok...")
     init_db()
-    load_photo_index()
+    try:
+        await run_blocking("sheets", load_encoding)
+    except Exception as e:
+        logger.warning(f"tiktoken encoding not loaded at startup, estimating tokens by length: {e}")
+    try:
+        await run_blocking("drive", load_photo_index)
+    except Exception as e:
+        # Первый запуск без сохранённого индекса — полный обход Drive может не
+        # уложиться в DRIVE_TIMEOUT; индекс соберёт фоновое обновление
+        logger.warning(f"Photo index not loaded at startup, starting with empty index: {e}")
     set_message_handler(handle_message)
 
     poll_task = None
@@ -52,6 +71,12 @@ async def lifespan(app: FastAPI):
         poll_task = asyncio.create_task(poll_notifications(GREEN_API_POLL_INTERVAL))
         logger.info("Green API polling enabled.")
 
+    # Фоновое обновление каталога, наличия и индекса фото до истечения TTL
+    refresh_task = None
+    if CACHE_BACKGROUND_REFRESH:
+        refresh_task = asyncio.create_task(refresh_caches_forever())
+        logger.info("Background cache refresh enabled.")
+
     # Запускаем scheduler для автоматического дожима
     nudge_scheduler = get_nudge_scheduler()
     nudge_scheduler.start()
@@ -63,11 +88,15 @@ async def lifespan(app: FastAPI):
     # Cleanup
     if poll_task:
         poll_task.cancel()
+    if refresh_task:
+        refresh_task.cancel()
 
     # Останавливаем scheduler
     nudge_scheduler.shutdown()
     logger.info("Nudge scheduler stopped.")
 
+    shutdown_executors()
+
     logger.info("Бот остановлен.")
 
 
@@ -91,8 +120,31 @@ async def health():
         checks["db"] = f"error: {e}"
 
     # Check photo index
-    from gdrive.photo_mapper import _photo_index
-    checks["photo_index_products"] = len(_photo_index) if _photo_index else 0
+    from gdrive.photo_mapper import get_photo_index_info
+    photo_index = get_photo_index_info()
+    checks["photo_index_products"] = photo_index["products"]
+    checks["photo_index_version"] = photo_index["version"]
+    checks["photo_index_built_at"] = photo_index["built_at"]
+
+    # Фото, скачанные заранее (параллельно с запросом к GPT)
+    from gdrive.photo_prefetch import get_photo_prefetch_stats
+    checks["photo_prefetch"] = get_photo_prefetch_stats()
+
+    # Очередь запросов к OpenAI
+    from ai.llm_gateway import get_llm_gateway_stats
+    checks["llm_gateway"] = get_llm_gateway_stats()
+
+    # Задержка и стоимость запросов по классам задач
+    from ai.model_router import get_model_router_stats
+    checks["llm_tasks"] = get_model_router_stats()
+
+    # Доля ходов, обслуженных без GPT
+    from ai.fast_path import get_fast_path_stats
+    checks["fast_path"] = get_fast_path_stats()
+
+    # Размер промптов ответа относительно бюджета токенов
+    from ai.context_budget import get_prompt_budget_stats
+    checks["prompt_budget"] = get_prompt_budget_stats()
 
     # Check ChromaDB
     try:
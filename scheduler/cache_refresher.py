@@ -0,0 +1,85 @@
+"""
+Фоновое обновление кэшей каталога, наличия и индекса фото (stale-while-revalidate).
+
+Каждый источник обновляется своей задачей заранее — на CACHE_REFRESH_LEAD
+доле TTL, — поэтому клиентский запрос никогда не ждёт Google Sheets/Drive:
+он всегда получает текущий снимок, а новый подменяется атомарно.
+При ошибке старый снимок остаётся, повтор — через CACHE_REFRESH_RETRY_SECONDS.
+После каждого обновления перестраивается реестр товаров (catalog/registry.py).
+"""
+
+import asyncio
+import logging
+
+from config import (
+    CATALOG_CACHE_TTL,
+    PHOTO_INDEX_CACHE_TTL,
+    CACHE_REFRESH_LEAD,
+    CACHE_REFRESH_RETRY_SECONDS,
+)
+from executors import run_blocking
+from catalog import sheets_loader
+from catalog.registry import refresh_product_registry
+from inventory import excel_loader
+from gdrive import photo_mapper
+
+logger = logging.getLogger(__name__)
+
+# (имя, пул потоков, обновление, TTL сек, прогреть при старте, переключатель режима)
+_SOURCES = [
+    ("catalog", "sheets", sheets_loader.refresh_catalog, CATALOG_CACHE_TTL, True,
+     sheets_loader.set_background_refresh),
+    ("inventory", "sheets", excel_loader.refresh_inventory, CATALOG_CACHE_TTL, True,
+     excel_loader.set_background_refresh),
+    # Индекс фото при старте читается из файла (main.py), полный обход Drive не нужен
+    ("photo_index", "drive", photo_mapper.refresh_photo_index, PHOTO_INDEX_CACHE_TTL, False,
+     photo_mapper.set_background_refresh),
+]
+
+
+async def _refresh_registry(name: str) -> None:
+    """Реестр товаров связывает каталог, наличие и фото — перестраиваем после обновления любого из них."""
+    try:
+        await run_blocking("sheets", refresh_product_registry)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.warning("[refresh] Не удалось перестроить реестр товаров после %s: %s", name, e)
+
+
+async def _refresh_loop(name: str, backend: str, refresh, ttl: float, warm_on_start: bool) -> None:
+    """Периодически обновлять один источник до отмены задачи."""
+    interval = max(1.0, ttl * CACHE_REFRESH_LEAD)
+    delay = 0.0 if warm_on_start else interval
+    while True:
+        await asyncio.sleep(delay)
+        try:
+            await run_blocking(backend, refresh)
+            logger.info("[refresh] %s обновлён, следующий через %.0fс", name, interval)
+            await _refresh_registry(name)
+            delay = interval
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(
+                "[refresh] Не удалось обновить %s: %s — используем текущий снимок, повтор через %.0fс",
+                name, e, CACHE_REFRESH_RETRY_SECONDS,
+            )
+            delay = CACHE_REFRESH_RETRY_SECONDS
+
+
+async def refresh_caches_forever() -> None:
+    """
+    Запустить фоновое обновление всех источников (задача в lifespan main.py).
+    Пока задача работает, загрузчики отдают текущий снимок без проверки TTL.
+    """
+    for *_, set_background_refresh in _SOURCES:
+        set_background_refresh(True)
+    try:
+        await asyncio.gather(*(
+            _refresh_loop(name, backend, refresh, ttl, warm)
+            for name, backend, refresh, ttl, warm, _ in _SOURCES
+        ))
+    finally:
+        for *_, set_background_refresh in _SOURCES:
+            set_background_refresh(False)
@@ -0,0 +1,139 @@
+"""
+Тесты каталога из Google Sheets (catalog.sheets_loader): кэш-снимок и поиск.
+Google Sheets API замокан.
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+import catalog.sheets_loader as sl
+from gdrive.sheet_snapshot import SheetSnapshot
+
+CATALOG_ROWS = [
+    {"name": "Jimmy Choo Azia 95", "category": "туфли", "price": "38000₸", "colors": "черные", "descriptions": "Лодочки на шпильке"},
+    {"name": "Chanel Jumbo Classic Flap", "category": "сумка", "price": "45000₸", "colors": "черные", "descriptions": "Классическая сумка"},
+]
+
+
+@pytest.fixture
+def loader(monkeypatch):
+    monkeypatch.setattr(sl, "CATALOG_SHEETS_ID", "sheet-id")
+    calls = []
+    headers = list(CATALOG_ROWS[0])
+
+    def fake_snapshot(sheet_id, force=False):
+        calls.append(sheet_id)
+        rows = [tuple(r[h] for h in headers) for r in CATALOG_ROWS]
+        now = datetime.now()
+        return SheetSnapshot(sheet_id, f"rev-{len(calls)}", headers, rows, now, now)
+
+    monkeypatch.setattr(sl, "get_sheet_snapshot", fake_snapshot)
+    loader = sl.CatalogLoader()
+    loader.calls = calls
+    return loader
+
+
+def _expire(loader):
+    products, index, _ = loader._snapshot
+    loader._snapshot = (products, index, datetime.now() - timedelta(days=1))
+
+
+def test_expired_snapshot_reloads_inline(loader):
+    loader.load_catalog()
+    _expire(loader)
+    loader.load_catalog()
+    assert len(loader.calls) == 2
+
+
+def test_serve_stale_returns_snapshot_without_reload(loader):
+    first = loader.load_catalog()
+    _expire(loader)
+    loader.serve_stale = True
+
+    assert loader.load_catalog() is first
+    assert len(loader.calls) == 1
+
+
+def test_failed_refresh_keeps_old_snapshot(loader, monkeypatch):
+    first = loader.load_catalog()
+
+    def broken(sheet_id, force=False):
+        raise RuntimeError("Sheets API 503")
+
+    monkeypatch.setattr(sl, "get_sheet_snapshot", broken)
+    with pytest.raises(RuntimeError):
+        loader.refresh()
+    assert loader.load_catalog() is first
+    assert loader.load_catalog(force_reload=True) is first
+
+
+def test_search_catalog_uses_index_built_once(loader, monkeypatch):
+    monkeypatch.setattr(sl, "_catalog_loader", loader)
+
+    assert [p["name"] for p in sl.search_catalog("туфли Jimmy Choo")] == ["Jimmy Choo Azia 95"]
+    assert [p["name"] for p in sl.search_catalog("шанель джамбо")] == ["Chanel Jumbo Classic Flap"]
+    assert sl.search_catalog("черные")  # совпадение по цвету — оба товара
+    assert sl.search_catalog("зонт") == []
+    assert len(loader.calls) == 1
+
+
+def test_name_match_outranks_description_match():
+    from catalog.search_index import CatalogSearchIndex
+
+    products = [
+        {"name": "Ремень", "category": "аксессуары", "descriptions": "подходит к сумке Prada"},
+        {"name": "Prada Galleria", "category": "сумка", "descriptions": ""},
+    ]
+    assert CatalogSearchIndex(products).search("prada")[0]["name"] == "Prada Galleria"
+
+
+def test_bm25_long_description_does_not_win_ties():
+    from catalog.search_index import CatalogSearchIndex
+
+    products = [
+        {"name": "Сумка Prada", "category": "сумка",
+         "descriptions": "Кожаная модель с длинным ремнем, подходит для офиса, прогулок и вечерних выходов"},
+        {"name": "Сумка Dior", "category": "сумка", "descriptions": "Кожаная"},
+    ]
+    assert CatalogSearchIndex(products).search("кожаная сумка")[0]["name"] == "Сумка Dior"
+
+
+def test_bm25_rare_brand_term_outweighs_common_category():
+    from catalog.search_index import CatalogSearchIndex
+
+    products = [{"name": f"Сумка модель {i}", "category": "сумка"} for i in range(20)]
+    products.append({"name": "Saeda", "category": "туфли"})
+    # "сумку" → "сумка" есть у всех, "саеда" → "saeda" только у одного товара
+    assert CatalogSearchIndex(products).search("саеда сумку")[0]["name"] == "Saeda"
+
+
+@pytest.mark.asyncio
+async def test_background_refresher_warms_and_retries(monkeypatch):
+    import scheduler.cache_refresher as cr
+
+    monkeypatch.setattr(cr, "CACHE_REFRESH_RETRY_SECONDS", 0.01)
+    attempts = []
+    flags = []
+
+    def flaky_refresh():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("Sheets API timeout")
+
+    monkeypatch.setattr(cr, "_SOURCES", [
+        ("catalog", "sheets", flaky_refresh, 3600, True, flags.append),
+    ])
+
+    task = asyncio.create_task(cr.refresh_caches_forever())
+    for _ in range(100):
+        if len(attempts) >= 2:
+            break
+        await asyncio.sleep(0.01)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    assert len(attempts) == 2  # прогрев упал → повтор через retry, дальше ждём TTL
+    assert flags == [True, False]
@@ -0,0 +1,132 @@
+"""
+Тесты сборки контекста промпта в пределах бюджета токенов
+(ai.context_budget): обязательные части не сокращаются, разделы делят
+остаток по долям, выпадают наименее релевантные элементы.
+"""
+
+import ai.context_budget as cb
+
+
+def _text(words: int, word: str = "слово") -> str:
+    return " ".join([word] * words)
+
+
+def test_everything_fits_unchanged():
+    context = cb.assemble(
+        "инструкции", "заказ", "привет",
+        products=["Товар: A", "Товар: B"],
+        scripts=["скрипт"],
+        history_lines=["Клиент: привет", "Алина: здравствуйте"],
+        history_summary="Ранее в диалоге (кратко): выбирали кеды",
+        budget=10_000,
+    )
+    assert context.product_context == "Товар: A\n---\nТовар: B"
+    assert context.sales_context == "скрипт"
+    assert context.conversation_history == (
+        "Ранее в диалоге (кратко): выбирали кеды\nКлиент: привет\nАлина: здравствуйте"
+    )
+    assert not context.truncated and not any(context.dropped.values())
+
+
+def test_zero_budget_disables_trimming():
+    products = [_text(500) for _ in range(5)]
+    context = cb.assemble("инструкции", "", "", products=products, scripts=[], history_lines=[], budget=0)
+    assert context.product_context == "\n---\n".join(products)
+
+
+def test_least_relevant_products_and_oldest_messages_dropped():
+    products = [_text(100, f"товар{i}") for i in range(5)]
+    scripts = [_text(100, f"скрипт{i}") for i in range(5)]
+    history = [f"Клиент: {_text(30, f'реплика{i}')}" for i in range(20)]
+    instructions = _text(200, "правило")
+    budget = cb.count_tokens(instructions) + 1200
+
+    context = cb.assemble(instructions, "", "", products, scripts, history, budget=budget)
+
+    assert context.total_tokens <= budget
+    assert context.product_context.startswith(products[0])
+    assert products[-1] not in context.product_context
+    assert context.sales_context.startswith(scripts[0])
+    # История — последние сообщения в хронологическом порядке
+    assert context.conversation_history.endswith(history[-1])
+    assert history[0] not in context.conversation_history
+    kept = context.conversation_history.split("\n")
+    assert kept == history[-len(kept):]
+    assert context.dropped[cb.PRODUCTS] > 0 and context.dropped[cb.HISTORY] > 0
+
+
+def test_unused_share_goes_to_other_sections():
+    products = [_text(100, f"товар{i}") for i in range(10)]
+    budget = 1000
+    context = cb.assemble("", "", "", products, scripts=[], history_lines=[], budget=budget)
+    # Скрипты и история пусты — каталог получает весь бюджет
+    assert cb.count_tokens(context.product_context) > budget * 0.8
+    assert context.total_tokens <= budget
+
+
+def test_oversized_first_item_truncated_not_dropped():
+    summary = "Ранее в диалоге (кратко): " + _text(2000, "сводка")
+    context = cb.assemble(
+        "", "", "", products=[], scripts=[],
+        history_lines=["Клиент: да"], history_summary=summary, budget=300,
+    )
+    assert context.conversation_history.startswith("Ранее в диалоге (кратко): сводка")
+    assert context.conversation_history.endswith("…")
+    assert context.truncated
+    assert cb.count_tokens(context.conversation_history) <= 300
+
+
+def test_fixed_parts_are_never_trimmed_and_exhaust_budget():
+    instructions = _text(1000, "правило")
+    context = cb.assemble(
+        instructions, "заказ", "сообщение",
+        products=["Товар: A"], scripts=["скрипт"], history_lines=["Клиент: привет"],
+        budget=cb.count_tokens(instructions),
+    )
+    assert context.product_context == context.sales_context == context.conversation_history == ""
+    assert context.tokens["fixed"] >= cb.count_tokens(instructions)
+
+
+def test_encoding_loaded_once_and_replaces_estimate(monkeypatch):
+    class FakeEncoding:
+        def encode(self, text, disallowed_special=()):
+            return text.split()
+
+        def decode(self, tokens):
+            return " ".join(tokens)
+
+    loads = []
+
+    class FakeTiktoken:
+        @staticmethod
+        def encoding_for_model(model):
+            loads.append(model)
+            return FakeEncoding()
+
+    monkeypatch.setattr(cb, "tiktoken", FakeTiktoken)
+    monkeypatch.setattr(cb, "_tiktoken_encoding", None)
+    cb.count_tokens.cache_clear()
+    text = _text(30)
+
+    # До загрузки кодировки — оценка по длине, без обращения к tiktoken
+    assert cb.count_tokens(text) == len(text) // cb._CHARS_PER_TOKEN + 1
+    assert loads == []
+
+    assert cb.load_encoding() and cb.load_encoding()
+    assert len(loads) == 1
+    assert cb.count_tokens(text) == 30
+    cb.count_tokens.cache_clear()
+
+
+def test_encoding_load_failure_keeps_estimate(monkeypatch):
+    class BrokenTiktoken:
+        @staticmethod
+        def encoding_for_model(model):
+            raise OSError("no network")
+
+    monkeypatch.setattr(cb, "tiktoken", BrokenTiktoken)
+    monkeypatch.setattr(cb, "_tiktoken_encoding", None)
+    cb.count_tokens.cache_clear()
+
+    assert cb.load_encoding() is False
+    assert cb.count_tokens("слово слово") == len("слово слово") // cb._CHARS_PER_TOKEN + 1
@@ -0,0 +1,62 @@
+"""
+Тесты обхода Google Drive (gdrive.client): пагинация files.list и
+параллельное построение индекса фото. Drive API замокан.
+"""
+
+import gdrive.client as dc
+
+FOLDER = dc.FOLDER_MIME
+
+
+def _img(file_id, name):
+    return {"id": file_id, "name": name, "mimeType": "image/jpeg"}
+
+
+def _folder(file_id, name):
+    return {"id": file_id, "name": name, "mimeType": FOLDER}
+
+
+TREE = {
+    "root": ([_folder("f-bags", "Сумки"), _folder("f-shoes", "Туфли")], [_img("r1", "root.jpg")]),
+    "f-bags": ([_folder("f-chanel", "Chanel")], [_img("b1", "сумка.jpg")]),
+    "f-shoes": ([], [_img("s1", "туфли.jpg")]),
+    "f-chanel": ([], [_img("c1", "Chanel Jumbo.jpg"), _img("c2", "Chanel Jumbo 2.jpg")]),
+}
+
+
+def test_list_files_follows_page_tokens(monkeypatch):
+    pages = {
+        None: {"files": [{"id": "1"}, {"id": "2"}], "nextPageToken": "p2"},
+        "p2": {"files": [{"id": "3"}], "nextPageToken": "p3"},
+        "p3": {"files": [{"id": "4"}]},
+    }
+    calls = []
+
+    class FakeFiles:
+        def list(self, q, fields, pageSize, pageToken):
+            calls.append(pageToken)
+            assert pageSize == dc.PAGE_SIZE and "nextPageToken" in fields
+            return type("Req", (), {"execute": lambda self: pages[pageToken]})()
+
+    class FakeService:
+        def files(self):
+            return FakeFiles()
+
+    monkeypatch.setattr(dc, "get_drive_service", lambda: FakeService())
+    monkeypatch.setattr(dc, "_rate_limiter", dc._RateLimiter(0))
+
+    assert [f["id"] for f in dc.list_images_in_folder("folder")] == ["1", "2", "3", "4"]
+    assert calls == [None, "p2", "p3"]
+
+
+def test_parallel_crawl_builds_same_index_as_recursive_walk(monkeypatch):
+    monkeypatch.setattr(dc, "list_folder_children", lambda folder_id: TREE[folder_id])
+
+    index = dc.build_product_photo_index("root")
+
+    # Ключи и порядок — как у прежнего рекурсивного обхода:
+    # папка товара по имени и по полному пути
+    assert list(index) == ["root", "сумки", "chanel", "сумки/chanel", "туфли"]
+    assert index["сумки/chanel"]["path"] == "Сумки/Chanel"
+    assert [img["file_id"] for img in index["chanel"]["images"]] == ["c1", "c2"]
+    assert index["root"]["path"] == ""
@@ -402,3 +402,301 @@ async def test_category_browsing_sends_photos(db_path, mock_openai, mock_rag, mo
 
     # Should have photos
     assert len(result["photos"]) >= 1, f"Expected photos for category browsing, got: {result['photos']}"
+
+
+def test_turn_analysis_computes_message_features_once():
+    """TurnAnalysis parses the message and RAG result names once per turn."""
+    from ai.engine import TurnAnalysis, _extract_product_name_from_result
+
+    analysis = TurnAnalysis("покажите черные туфли Jimmy Choo Azia")
+    assert analysis.color == "черные"
+    assert analysis.product_type == "shoes"
+    assert analysis.is_photo_request
+    assert not analysis.browsing_category
+    assert {"jimmy", "choo", "azia"} <= analysis.tokens
+    assert analysis.mentions("Jimmy Choo Azia 95")
+    assert not analysis.mentions("Chanel 25")
+
+    result = {"text": "👠 Jimmy Choo Azia 95 — 38000₸", "metadata": {}}
+    assert analysis.result_name(result) == _extract_product_name_from_result(result)
+    assert analysis.result_name(result) is analysis.result_name(result)
+    assert analysis.result_type(result) == "shoes"
+
+
+@pytest.fixture
+def catalog_product(monkeypatch, test_inventory_df):
+    """Registry record for 'Jimmy Choo Azia 95' served as the product named in the message."""
+    from catalog.registry import ProductRegistry
+
+    catalog = [{"name": "Jimmy Choo Azia 95", "category": "туфли", "price": "38000₸",
+                "colors": "розовые", "descriptions": "Лодочки на шпильке 9,5 см"}]
+    record = ProductRegistry(catalog, test_inventory_df).resolve("Jimmy Choo Azia 95")
+    record.__dict__["photos"] = [
+        {"file_id": "azia1", "filename": "туфли розовые Jimmy Choo Azia 95 1.jpg", "direct_url": ""},
+    ]
+    monkeypatch.setattr(
+        "ai.engine.find_mentioned_product",
+        lambda text: record if "azia" in text.lower() else None,
+    )
+    monkeypatch.setattr("ai.engine.resolve_product", lambda name: record)
+    return record
+
+
+async def _start_dialog(chat_id: str):
+    from db.conversations import save_message
+
+    await save_message(chat_id, "user", "Здравствуйте", "Тест")
+    await save_message(chat_id, "assistant", "Здравствуйте✨", "Алина")
+
+
+@pytest.mark.asyncio
+async def test_fast_path_greeting_skips_gpt(db_path, mock_openai, mock_rag, mock_photos):
+    """A bare greeting from a new client is answered from the template."""
+    from ai.engine import generate_response
+
+    result = await generate_response("test_chat@c.us", "Добрый день!", "Тест")
+
+    assert mock_openai.call_count == 0
+    assert result["is_new_client"] is True
+    assert result["text"].startswith("Здравствуйте")
+    assert result["photos"] == []
+
+
+@pytest.mark.asyncio
+async def test_fast_path_price_question_answered_from_catalog(
+    db_path, mock_openai, mock_rag, mock_photos, catalog_product
+):
+    """Price question about a fully named in-stock model needs no GPT round-trip."""
+    from ai.engine import generate_response
+    from ai.fast_path import get_fast_path_stats
+
+    await _start_dialog("test_chat@c.us")
+    served_before = get_fast_path_stats()["by_intent"].get("price", 0)
+
+    result = await generate_response("test_chat@c.us", "Сколько стоит Jimmy Choo Azia 95?", "Тест")
+
+    assert mock_openai.call_count == 0
+    assert "38000₸" in result["text"]
+    assert [p["file_id"] for p in result["photos"]] == ["azia1"]
+    assert result["order_context"]["product"] == "Jimmy Choo Azia 95"
+    assert result["order_context"]["product_type"] == "shoes"
+    assert get_fast_path_stats()["by_intent"]["price"] == served_before + 1
+
+
+@pytest.mark.asyncio
+async def test_fast_path_replies_stored_like_gpt_replies(
+    db_path, mock_openai, mock_rag, mock_photos, catalog_product
+):
+    """Greeting and availability fast-path replies are saved the same way as GPT replies."""
+    from ai.engine import generate_response
+
+    await generate_response("new_chat@c.us", "Добрый день!", "Тест")
+    await _start_dialog("test_chat@c.us")
+    await generate_response("test_chat@c.us", "Сколько стоит Jimmy Choo Azia 95?", "Тест")
+
+    async with aiosqlite.connect(db_path) as db:
+        cursor = await db.execute(
+            "SELECT chat_id, content, sender_name FROM conversations WHERE role = 'assistant' ORDER BY id"
+        )
+        rows = await cursor.fetchall()
+
+    replies = [(chat_id, content, sender) for chat_id, content, sender in rows if content != "Здравствуйте✨"]
+    assert [chat_id for chat_id, _, _ in replies] == ["new_chat@c.us", "test_chat@c.us"]
+    for _, content, sender in replies:
+        assert sender == ""
+        assert "|||" not in content and "  " not in content
+
+@pytest.mark.asyncio
+async def test_fast_path_skipped_for_order_details(
+    db_path, mock_openai, mock_rag, mock_photos, catalog_product
+):
+    """A message with a size goes through the regular GPT flow."""
+    from ai.engine import generate_response
+
+    await _start_dialog("test_chat@c.us")
+    mock_openai.side_effect = [
+        _make_completion(_fields_json(product="Jimmy Choo Azia 95", size="38")),
+        _make_completion("Отлично, 38 размер есть"),
+    ]
+
+    await generate_response("test_chat@c.us", "Есть Jimmy Choo Azia 95 в 38 размере?", "Тест")
+
+    assert mock_openai.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_fast_path_skipped_when_message_has_extra_details(
+    db_path, mock_openai, mock_rag, mock_photos, catalog_product
+):
+    """A city given alongside the availability question is extracted and stored."""
+    from ai.engine import generate_response
+    from db.conversations import get_order_context
+
+    await _start_dialog("test_chat@c.us")
+    mock_openai.side_effect = [
+        _make_completion(_fields_json(product="Jimmy Choo Azia 95", city="Алматы")),
+        _make_completion("Да, Jimmy Choo Azia 95 есть в наличии"),
+    ]
+
+    await generate_response("test_chat@c.us", "Есть Jimmy Choo Azia 95? Я из Алматы", "Тест")
+
+    assert mock_openai.call_count == 2
+    assert (await get_order_context("test_chat@c.us"))["city"] == "Алматы"
+
+
+def test_fast_path_extra_words():
+    from ai.fast_path import has_extra_words
+
+    assert not has_extra_words("Здравствуйте, есть Jimmy Choo Azia 95 в наличии?", "Jimmy Choo Azia 95")
+    assert not has_extra_words("Покажите фото Jimmy Choo Azia 95 пожалуйста", "Jimmy Choo Azia 95")
+    assert has_extra_words("Есть Jimmy Choo Azia 95? Я из Алматы", "Jimmy Choo Azia 95")
+
+
+@pytest.mark.asyncio
+async def test_general_question_answer_reused_across_clients(
+    db_path, mock_openai, mock_rag, mock_photos, monkeypatch
+):
+    """A returning client's general question reuses a cached answer for the same question."""
+    from ai.engine import generate_response
+
+    def fake_embedding(text):
+        return [1.0, float(len(text))]
+
+    monkeypatch.setattr("ai.engine.cached_query_embedding", fake_embedding)
+    # Перефразированный вопрос находит другие скрипты — ответ из кэша всё равно подходит
+    monkeypatch.setattr("ai.engine.search_scripts", AsyncMock(side_effect=[
+        [{"text": "Доставка: 2-5 дней по Казахстану", "metadata": {}}],
+        [{"text": "Отправляем курьером и Казпочтой", "metadata": {}}],
+    ]))
+    answer = "Доставка по Казахстану 2-5 дней"
+
+    for chat_id in ("client_a@c.us", "client_b@c.us"):
+        await _start_dialog(chat_id)
+    mock_openai.side_effect = [
+        _make_completion(_fields_json()),
+        _make_completion(answer),
+        _make_completion(_fields_json()),
+    ]
+
+    first = await generate_response("client_a@c.us", "Как у вас доставка?", "Тест")
+    second = await generate_response("client_b@c.us", "как у вас доставка", "Тест")
+
+    assert answer in first["text"]
+    assert answer in second["text"]
+    # Второй клиент: только извлечение полей, основной ответ — из кэша
+    assert mock_openai.call_count == 3
+
+
+@pytest.mark.asyncio
+async def test_photo_search_runs_while_gpt_is_generating(db_path, mock_openai, mock_rag, mock_photos):
+    """Primary photo lookup starts before the main GPT reply returns."""
+    import asyncio
+
+    from ai.engine import generate_response
+
+    mock_photos.return_value = [
+        {"file_id": "chanel25_1", "filename": "Сумка черная Chanel 25 1.jpg", "direct_url": ""},
+    ]
+    searched_during_reply = []
+
+    async def create(**kwargs):
+        if kwargs.get("response_format"):
+            return _make_completion(_fields_json())
+        await asyncio.sleep(0)  # ответ модели приходит не сразу
+        searched_during_reply.append(mock_photos.await_count)
+        return _make_completion("Сейчас покажу Chanel 25 ✨")
+
+    mock_openai.side_effect = create
+
+    result = await generate_response("test_chat@c.us", "покажите сумку chanel 25", "Тест")
+
+    assert searched_during_reply and searched_during_reply[0] >= 1
+    assert [p["file_id"] for p in result["photos"]] == ["chanel25_1"]
+
+
+@pytest.mark.asyncio
+async def test_cached_answer_not_shared_between_clients_with_different_cities(
+    db_path, mock_openai, mock_rag, mock_photos, monkeypatch
+):
+    """An answer built for a client with a known city is not served to another client."""
+    from ai.engine import generate_response
+    from db.conversations import get_order_context, upsert_order_context
+
+    def fake_embedding(text):
+        return [1.0, float(len(text))]
+
+    monkeypatch.setattr("ai.engine.cached_query_embedding", fake_embedding)
+
+    for chat_id, city in (("astana@c.us", "Астана"), ("almaty@c.us", "Алматы")):
+        await _start_dialog(chat_id)
+        ctx = await get_order_context(chat_id)
+        ctx["city"] = city
+        await upsert_order_context(chat_id, ctx)
+
+    mock_openai.side_effect = [
+        _make_completion(_fields_json()),
+        _make_completion("Доставка в Астану 2-3 дня"),
+        _make_completion(_fields_json()),
+        _make_completion("Доставка в Алматы в день заказа"),
+    ]
+
+    first = await generate_response("astana@c.us", "Как у вас доставка?", "Тест")
+    second = await generate_response("almaty@c.us", "как у вас доставка", "Тест")
+
+    assert "Астан" in first["text"]
+    assert "Астан" not in second["text"]
+    assert "Алматы" in second["text"]
+    assert mock_openai.call_count == 4
+
+
+@pytest.mark.asyncio
+async def test_cached_answer_not_reused_after_personal_history(
+    db_path, mock_openai, mock_rag, mock_photos, monkeypatch
+):
+    """A general question after a non-trivial dialog is answered by GPT, not from cache."""
+    from ai.engine import generate_response
+    from db.conversations import save_message
+
+    def fake_embedding(text):
+        return [1.0, float(len(text))]
+
+    monkeypatch.setattr("ai.engine.cached_query_embedding", fake_embedding)
+
+    await _start_dialog("client_a@c.us")
+    await _start_dialog("client_b@c.us")
+    await save_message("client_b@c.us", "user", "Я из Астаны, смотрю кеды", "Тест")
+    await save_message("client_b@c.us", "assistant", "Отлично, подскажу по моделям", "Алина")
+
+    mock_openai.side_effect = [
+        _make_completion(_fields_json()),
+        _make_completion("Доставка по Казахстану 2-5 дней"),
+        _make_completion(_fields_json()),
+        _make_completion("В Астану доставим за 2-3 дня"),
+    ]
+
+    await generate_response("client_a@c.us", "Как у вас доставка?", "Тест")
+    second = await generate_response("client_b@c.us", "как у вас доставка", "Тест")
+
+    assert "Астану" in second["text"]
+    assert mock_openai.call_count == 4
+
+
+@pytest.mark.asyncio
+async def test_photo_lookup_cancelled_when_gpt_fails(db_path, mock_openai, mock_rag, mock_photos, monkeypatch):
+    """If the reply call fails, the concurrent photo lookup is cancelled and prefetched photos dropped."""
+    from ai.engine import generate_response
+
+    discarded = []
+    monkeypatch.setattr("ai.engine.discard_prefetched", discarded.append)
+    mock_photos.return_value = [
+        {"file_id": "chanel25_1", "filename": "Сумка черная Chanel 25 1.jpg", "direct_url": ""},
+    ]
+    mock_openai.side_effect = [
+        _make_completion(_fields_json()),
+        RuntimeError("api down"),
+    ]
+
+    with pytest.raises(RuntimeError):
+        await generate_response("test_chat@c.us", "покажите сумку chanel 25", "Тест")
+
+    assert discarded == ["test_chat@c.us"]
@@ -0,0 +1,68 @@
+"""
+Тесты разворота листа наличия (inventory.excel_loader._unpivot_sizes).
+"""
+
+import pandas as pd
+
+from inventory.excel_loader import SIZE_COLUMNS, _unpivot_sizes
+from inventory.stock_index import InventoryIndex
+
+
+def _sheet_row(name, colors="черные", price="38000₸", bag_qty="", **sizes):
+    row = {"name": name, "category": "", "price": price, "colors": colors, "кол-во сумки": bag_qty}
+    row.update({sc: sizes.get(f"s{sc}", "") for sc in SIZE_COLUMNS})
+    return row
+
+
+def test_unpivot_sizes_and_bags():
+    raw = pd.DataFrame([
+        _sheet_row("Jimmy Choo Azia 95", s38="1", s39="0", s40="x"),
+        _sheet_row("", s38="5"),  # без названия — пропускаем
+        _sheet_row("Chanel Jumbo", bag_qty="2", price="45000₸"),
+    ])
+    df = _unpivot_sizes(raw)
+
+    shoes = df[df["product_name"] == "Jimmy Choo Azia 95"]
+    assert list(shoes["size"]) == [int(sc) for sc in SIZE_COLUMNS]
+    assert dict(zip(shoes["size"], shoes["quantity"]))[38] == 1
+    assert shoes["quantity"].sum() == 1  # "x" и пустые ячейки → 0
+
+    bag = df[df["product_name"] == "Chanel Jumbo"]
+    assert len(bag) == 1
+    assert pd.isna(bag["size"].iloc[0])
+    assert bag["quantity"].iloc[0] == 2
+
+
+def test_unpivot_dtypes_and_index():
+    df = _unpivot_sizes(pd.DataFrame([_sheet_row("Miu Miu Arcadie", bag_qty="40000")]))
+
+    assert isinstance(df["product_name"].dtype, pd.CategoricalDtype)
+    assert isinstance(df["color"].dtype, pd.CategoricalDtype)
+    assert str(df["size"].dtype) == "Int8"
+    assert str(df["quantity"].dtype) == "int16"
+    assert df["quantity"].iloc[0] == 32767  # не переполняется
+    assert list(df.index.names) == ["product_name", "size", "color"]
+
+
+def test_stock_index_reads_typed_snapshot():
+    df = _unpivot_sizes(pd.DataFrame([
+        _sheet_row("Jimmy Choo Azia 95", s38="1"),
+        _sheet_row("Chanel Jumbo", bag_qty="2"),
+    ]))
+    index = InventoryIndex(df)
+
+    assert "38" in list(index.sizes)
+    assert "" in list(index.sizes)  # сумка без размера
+    assert index.quantities.sum() == 3
+
+
+def test_unpivot_sheet_with_only_sized_rows():
+    df = _unpivot_sizes(pd.DataFrame([
+        _sheet_row("Jimmy Choo Azia 95", s38="1"),
+        _sheet_row("Golden Goose Super Star", s37="2"),
+    ]))
+
+    assert len(df) == 2 * len(SIZE_COLUMNS)
+    assert not df["size"].isna().any()
+    assert df["quantity"].sum() == 3
+    assert str(df["quantity"].dtype) == "int16"
@@ -0,0 +1,41 @@
+"""
+Тесты пулов потоков для блокирующих клиентов (executors.py).
+"""
+
+import threading
+import time
+
+import pytest
+
+from executors import get_executor, run_blocking
+
+
+@pytest.mark.asyncio
+async def test_run_blocking_runs_off_event_loop():
+    main_thread = threading.get_ident()
+
+    thread_id, value = await run_blocking("sheets", lambda x: (threading.get_ident(), x * 2), 21)
+
+    assert value == 42
+    assert thread_id != main_thread
+
+
+@pytest.mark.asyncio
+async def test_run_blocking_passes_kwargs():
+    def fetch(sheet_id, range_name="A1:Z1000"):
+        return f"{sheet_id}!{range_name}"
+
+    assert await run_blocking("sheets", fetch, "abc", range_name="A1:B2") == "abc!A1:B2"
+
+
+@pytest.mark.asyncio
+async def test_run_blocking_timeout():
+    with pytest.raises(TimeoutError):
+        await run_blocking("drive", time.sleep, 0.5, timeout=0.05)
+
+
+def test_backends_have_separate_bounded_pools():
+    assert get_executor("chroma") is not get_executor("drive")
+    assert get_executor("chroma") is get_executor("chroma")
+    with pytest.raises(ValueError):
+        get_executor("unknown")
@@ -0,0 +1,132 @@
+"""
+Тесты сводки старой переписки (ai.history_summary): старые сообщения
+сжимаются в сводку, в промпт дословно идут только последние. Модель
+подменяется, база — временный SQLite файл.
+"""
+
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+
+import ai.history_summary as hs
+from db.conversations import get_conversation_history, save_message
+
+
+def _client(*texts):
+    create = AsyncMock(side_effect=[
+        SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=t))], usage=None)
+        for t in texts
+    ])
+    return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create))), create
+
+
+@pytest.fixture
+def summary_db(tmp_path, monkeypatch):
+    path = str(tmp_path / "test.db")
+    monkeypatch.setattr("db.models.SQLITE_DB_PATH", path)
+    monkeypatch.setattr("db.conversations.SQLITE_DB_PATH", path)
+    monkeypatch.setattr(hs, "HISTORY_RECENT_MESSAGES", 4)
+    monkeypatch.setattr(hs, "HISTORY_SUMMARY_BATCH", 3)
+    from db.models import init_db
+    init_db()
+    return path
+
+
+async def _dialog(chat_id: str, count: int) -> None:
+    for i in range(count):
+        role = "user" if i % 2 == 0 else "assistant"
+        await save_message(chat_id, role, f"сообщение {i}")
+
+
+def test_history_parts_without_summary_skips_photo_notes():
+    history = [
+        {"id": 1, "role": "user", "content": "Покажите Chanel 25"},
+        {"id": 2, "role": "assistant", "content": "[Показаны фото: Chanel 25]"},
+        {"id": 3, "role": "assistant", "content": "Вот она ✨"},
+    ]
+    assert hs.history_parts(history) == (None, ["Клиент: Покажите Chanel 25", "Алина: Вот она ✨"])
+
+
+def test_history_parts_replace_covered_messages_with_summary():
+    history = [
+        {"id": 5, "role": "user", "content": "старое"},
+        {"id": 6, "role": "assistant", "content": "старый ответ"},
+        {"id": 7, "role": "user", "content": "новое"},
+    ]
+    header, lines = hs.history_parts(history, hs.HistorySummary("клиент выбрал Chanel 25, размер 38", 6))
+    assert header == "Ранее в диалоге (кратко): клиент выбрал Chanel 25, размер 38"
+    assert lines == ["Клиент: новое"]
+
+
+@pytest.mark.asyncio
+async def test_short_dialog_is_not_summarized(summary_db):
+    await _dialog("chat1", 6)
+    client, create = _client()
+    assert await hs.update_summary("chat1", client) is False
+    create.assert_not_called()
+    assert await hs.get_summary("chat1") is None
+
+
+@pytest.mark.asyncio
+async def test_old_messages_compressed_incrementally(summary_db):
+    await _dialog("chat1", 10)
+    client, create = _client("сводка 1", "сводка 2")
+
+    assert await hs.update_summary("chat1", client) is True
+    history = await get_conversation_history("chat1")
+    summary = await hs.get_summary("chat1")
+    # Все, кроме последних 4, вошли в сводку
+    assert summary == hs.HistorySummary("сводка 1", history[-5]["id"])
+    prompt = create.call_args.kwargs["messages"][1]["content"]
+    assert "Прежняя сводка: нет" in prompt
+    assert "сообщение 5" in prompt and "сообщение 6" not in prompt
+
+    header, lines = hs.history_parts(history, summary)
+    assert header == "Ранее в диалоге (кратко): сводка 1"
+    assert lines[0] == "Клиент: сообщение 6"
+    assert not any("сообщение 5" in line for line in lines)
+
+    # Пока новых старых сообщений меньше порога — модель не вызывается
+    await _dialog("chat1", 2)
+    assert await hs.update_summary("chat1", client) is False
+    assert create.call_count == 1
+
+    await _dialog("chat1", 1)
+    assert await hs.update_summary("chat1", client) is True
+    prompt = create.call_args.kwargs["messages"][1]["content"]
+    assert "Прежняя сводка: сводка 1" in prompt
+    assert (await hs.get_summary("chat1")).text == "сводка 2"
+
+
+@pytest.mark.asyncio
+async def test_summary_uses_background_priority_and_cheap_model(summary_db, monkeypatch):
+    from ai import model_router
+    from ai.llm_gateway import PRIORITY_BACKGROUND
+
+    calls = []
+
+    async def llm_call(request, *, priority, tokens, label):
+        calls.append(priority)
+        return await request()
+
+    monkeypatch.setattr(model_router, "llm_call", llm_call)
+    await _dialog("chat1", 8)
+    client, create = _client("сводка")
+    await hs.update_summary("chat1", client)
+    assert calls == [PRIORITY_BACKGROUND]
+    assert create.call_args.kwargs["model"] == model_router.model_for(model_router.TASK_SUMMARY)
+
+
+@pytest.mark.asyncio
+async def test_schedule_update_runs_once_per_chat_and_swallows_errors(summary_db):
+    await _dialog("chat1", 8)
+    client, create = _client()
+    create.side_effect = RuntimeError("api down")
+
+    task = hs.schedule_update("chat1", client)
+    assert task is not None
+    assert hs.schedule_update("chat1", client) is None
+    await task
+    assert await hs.get_summary("chat1") is None
+    assert "chat1" not in hs._updates
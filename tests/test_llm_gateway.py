@@ -0,0 +1,141 @@
+"""
+Тесты шлюза запросов к OpenAI (ai.llm_gateway): приоритеты, обратное
+давление, повторы с Retry-After и бюджеты в минуту. Запросы к API —
+локальные корутины.
+"""
+
+import asyncio
+
+import httpx
+import openai
+import pytest
+
+from ai.llm_gateway import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_EXTRACTION,
+    PRIORITY_REPLY,
+    LLMGateway,
+    LLMGatewayBusy,
+    _Bucket,
+)
+
+
+def _rate_limit_error(headers: dict) -> openai.RateLimitError:
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    response = httpx.Response(429, headers=headers, request=request)
+    return openai.RateLimitError("Rate limit reached", response=response, body=None)
+
+
+def _gateway(**kwargs) -> LLMGateway:
+    params = dict(requests_per_minute=0, tokens_per_minute=0, max_concurrency=1, max_queue=10, max_retries=3)
+    params.update(kwargs)
+    return LLMGateway(**params)
+
+
+@pytest.mark.asyncio
+async def test_higher_priority_dispatched_first():
+    gateway = _gateway()
+    started = asyncio.Event()
+    release = asyncio.Event()
+    order = []
+
+    async def blocking():
+        started.set()
+        await release.wait()
+        return "first"
+
+    def request(name):
+        async def run():
+            order.append(name)
+            return name
+        return run
+
+    first = asyncio.create_task(gateway.call(blocking))
+    await started.wait()
+    background = asyncio.create_task(gateway.call(request("background"), priority=PRIORITY_BACKGROUND))
+    extraction = asyncio.create_task(gateway.call(request("extraction"), priority=PRIORITY_EXTRACTION))
+    reply = asyncio.create_task(gateway.call(request("reply"), priority=PRIORITY_REPLY))
+    await asyncio.sleep(0)
+    assert gateway.stats()["queue_depth"] == 3
+    assert gateway.stats()["queue_by_priority"] == {"reply": 1, "extraction": 1, "background": 1}
+
+    release.set()
+    await asyncio.gather(first, background, extraction, reply)
+    assert order == ["reply", "extraction", "background"]
+    assert gateway.stats()["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_full_queue_rejects_all_but_replies():
+    gateway = _gateway(max_queue=1)
+    release = asyncio.Event()
+
+    async def blocking():
+        await release.wait()
+
+    async def noop():
+        return None
+
+    running = asyncio.create_task(gateway.call(blocking))
+    await asyncio.sleep(0)
+    queued = asyncio.create_task(gateway.call(noop, priority=PRIORITY_EXTRACTION))
+    await asyncio.sleep(0)
+
+    with pytest.raises(LLMGatewayBusy):
+        await gateway.call(noop, priority=PRIORITY_BACKGROUND)
+    reply = asyncio.create_task(gateway.call(noop, priority=PRIORITY_REPLY))
+    await asyncio.sleep(0)
+
+    release.set()
+    await asyncio.gather(running, queued, reply)
+    assert gateway.stats()["rejected"] == 1
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_retried_after_retry_after():
+    gateway = _gateway()
+    attempts = []
+
+    async def flaky():
+        attempts.append(asyncio.get_running_loop().time())
+        if len(attempts) == 1:
+            raise _rate_limit_error({"retry-after-ms": "50"})
+        return "ok"
+
+    assert await gateway.call(flaky) == "ok"
+    assert attempts[1] - attempts[0] >= 0.05
+    stats = gateway.stats()
+    assert stats["rate_limited"] == 1
+    assert stats["retries"] == 1
+
+
+@pytest.mark.asyncio
+async def test_non_retryable_errors_and_exhausted_retries_raise():
+    gateway = _gateway(max_retries=1)
+    calls = 0
+
+    async def bad_request():
+        nonlocal calls
+        calls += 1
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        await gateway.call(bad_request)
+    assert calls == 1
+
+    async def always_limited():
+        raise _rate_limit_error({"retry-after-ms": "1"})
+
+    with pytest.raises(openai.RateLimitError):
+        await gateway.call(always_limited)
+    assert gateway.stats()["errors"] == 2
+
+
+def test_bucket_waits_for_refill():
+    bucket = _Bucket(60)  # 1 единица в секунду
+    now = bucket.updated
+    assert bucket.wait_time(60, now) == 0
+    bucket.take(60)
+    assert bucket.wait_time(1, now) == pytest.approx(1.0)
+    assert bucket.wait_time(1, now + 1.0) == pytest.approx(0.0)
+    assert _Bucket(0).wait_time(10**6, now) == 0
@@ -0,0 +1,84 @@
+"""
+Тесты выбора модели по задаче (ai.model_router): извлечение полей идёт
+в дешёвую модель, основная — только при невалидном JSON; задержка и
+стоимость учитываются по классам задач.
+"""
+
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+
+import ai.model_router as router
+from config import OPENAI_MODEL
+
+
+def _completion(content: str, prompt_tokens: int = 1000, completion_tokens: int = 100):
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+        usage=SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens),
+    )
+
+
+def _client(*responses):
+    create = AsyncMock(side_effect=list(responses))
+    return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create))), create
+
+
+@pytest.fixture(autouse=True)
+def fresh_stats(monkeypatch):
+    monkeypatch.setattr(router, "_stats", {})
+    monkeypatch.setitem(router._TASK_MODELS, router.TASK_EXTRACTION, "gpt-4o-mini")
+
+
+def _is_order(parsed: dict) -> bool:
+    return isinstance(parsed.get("city"), str)
+
+
+@pytest.mark.asyncio
+async def test_extraction_uses_small_model():
+    client, create = _client(_completion('{"city": "Алматы"}'))
+
+    parsed = await router.chat_json(router.TASK_EXTRACTION, client, [{"role": "user", "content": "Алматы"}], _is_order)
+
+    assert parsed == {"city": "Алматы"}
+    assert create.await_count == 1
+    assert create.await_args.kwargs["model"] == "gpt-4o-mini"
+    assert create.await_args.kwargs["response_format"] == {"type": "json_object"}
+    stats = router.get_model_router_stats()["extraction"]
+    assert stats["calls"] == 1 and stats["fallbacks"] == 0
+    assert stats["cost_usd"] == pytest.approx((1000 * 0.15 + 100 * 0.60) / 1_000_000, abs=1e-4)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("bad", ["не json", '{"city": ["Алматы"]}', "[1, 2]"])
+async def test_invalid_json_falls_back_to_main_model(bad):
+    client, create = _client(_completion(bad), _completion('{"city": "Астана"}'))
+
+    parsed = await router.chat_json(router.TASK_EXTRACTION, client, [{"role": "user", "content": "x"}], _is_order)
+
+    assert parsed == {"city": "Астана"}
+    assert [c.kwargs["model"] for c in create.await_args_list] == ["gpt-4o-mini", OPENAI_MODEL]
+    stats = router.get_model_router_stats()["extraction"]
+    assert stats["fallbacks"] == 1
+    assert stats["models"] == {"gpt-4o-mini": 1, OPENAI_MODEL: 1}
+
+
+@pytest.mark.asyncio
+async def test_no_valid_json_raises():
+    client, _ = _client(_completion("нет"), _completion("тоже нет"))
+    with pytest.raises(ValueError):
+        await router.chat_json(router.TASK_EXTRACTION, client, [], _is_order)
+
+
+@pytest.mark.asyncio
+async def test_reply_uses_main_model_and_failures_are_counted():
+    client, create = _client(_completion("Здравствуйте"), RuntimeError("API down"))
+
+    await router.chat(router.TASK_REPLY, client, [{"role": "user", "content": "Привет"}], max_tokens=700)
+    with pytest.raises(RuntimeError):
+        await router.chat(router.TASK_REPLY, client, [], max_tokens=700)
+
+    assert create.await_args_list[0].kwargs["model"] == OPENAI_MODEL
+    stats = router.get_model_router_stats()["reply"]
+    assert stats["calls"] == 2 and stats["failures"] == 1
@@ -0,0 +1,101 @@
+"""
+Тесты инкрементального обновления индекса фото по Drive Changes API
+(gdrive.photo_changes и photo_mapper.refresh_photo_index). Drive API замокан.
+"""
+
+import json
+
+import gdrive.photo_mapper as pm
+from gdrive.client import FOLDER_MIME
+from gdrive.photo_changes import apply_drive_changes
+from gdrive.photo_store import read_photo_store
+
+FOLDERS = {
+    "root-id": {"name": "", "path": "", "parent": None},
+    "f-bags": {"name": "Сумки", "path": "Сумки", "parent": "root-id"},
+    "f-chanel": {"name": "Chanel", "path": "Сумки/Chanel", "parent": "f-bags"},
+}
+
+
+def _entry(folder_id, path, *images):
+    return {
+        "folder_id": folder_id,
+        "path": path,
+        "images": [{"file_id": fid, "filename": name, "direct_url": ""} for fid, name in images],
+    }
+
+
+def _index():
+    return {
+        "сумки": _entry("f-bags", "Сумки", ("b1", "сумка.jpg")),
+        "chanel": _entry("f-chanel", "Сумки/Chanel", ("c1", "Chanel Jumbo.jpg")),
+        "сумки/chanel": _entry("f-chanel", "Сумки/Chanel", ("c1", "Chanel Jumbo.jpg")),
+    }
+
+
+def _image_change(file_id, name, parent, trashed=False):
+    return {"fileId": file_id, "removed": False,
+            "file": {"id": file_id, "name": name, "mimeType": "image/jpeg", "parents": [parent], "trashed": trashed}}
+
+
+def _filenames(index, key):
+    return [img["filename"] for img in index[key]["images"]]
+
+
+def test_added_renamed_and_trashed_images():
+    index = _index()
+    new = apply_drive_changes(index, FOLDERS, [
+        _image_change("c2", "Chanel Jumbo 2.jpg", "f-chanel"),
+        _image_change("c1", "Chanel Jumbo черные.jpg", "f-chanel"),
+        _image_change("b1", "сумка.jpg", "f-bags", trashed=True),
+        _image_change("x1", "чужое.jpg", "other-folder"),
+    ])
+
+    assert _filenames(new, "chanel") == ["Chanel Jumbo 2.jpg", "Chanel Jumbo черные.jpg"]
+    assert _filenames(new, "сумки/chanel") == _filenames(new, "chanel")
+    assert "сумки" not in new  # последнее фото папки удалено
+    assert _filenames(index, "chanel") == ["Chanel Jumbo.jpg"]  # исходный индекс не тронут
+
+
+def test_image_in_root_and_removed_change():
+    new = apply_drive_changes(_index(), FOLDERS, [
+        _image_change("r1", "root.jpg", "root-id"),
+        {"fileId": "c1", "removed": True},
+    ])
+    assert _filenames(new, "root") == ["root.jpg"]
+    assert "chanel" not in new
+
+
+def test_folder_structure_change_requires_full_rebuild():
+    renamed = {"fileId": "f-chanel", "removed": False,
+               "file": {"id": "f-chanel", "name": "Chanel 2.55", "mimeType": FOLDER_MIME, "parents": ["f-bags"]}}
+    created = {"fileId": "f-dior", "removed": False,
+               "file": {"id": "f-dior", "name": "Dior", "mimeType": FOLDER_MIME, "parents": ["f-bags"]}}
+
+    assert apply_drive_changes(_index(), FOLDERS, [renamed]) is None
+    assert apply_drive_changes(_index(), FOLDERS, [created]) is None
+    assert apply_drive_changes(_index(), FOLDERS, [{"fileId": "f-bags", "removed": True}]) is None
+
+
+def test_refresh_applies_changes_without_crawl(tmp_path, monkeypatch):
+    store_file, state_file = tmp_path / "photo_index.db", tmp_path / "photo_index.state.json"
+    state_file.write_text(json.dumps({"root_id": "root-id", "start_page_token": "10", "folders": FOLDERS}))
+    monkeypatch.setattr(pm, "STORE_FILE", str(store_file))
+    monkeypatch.setattr(pm, "STATE_FILE", str(state_file))
+    monkeypatch.setattr(pm, "GOOGLE_DRIVE_PHOTOS_FOLDER_ID", "root-id")
+    monkeypatch.setattr(pm, "_photo_index", _index())
+    monkeypatch.setattr(pm, "_photo_index_loaded_at", None)
+
+    def no_crawl(*args, **kwargs):
+        raise AssertionError("full crawl must not run")
+
+    monkeypatch.setattr(pm, "build_photo_index_with_folders", no_crawl)
+    monkeypatch.setattr(pm, "list_changes", lambda token: (
+        [_image_change("c2", "Chanel Jumbo 2.jpg", "f-chanel")], "11"
+    ))
+
+    new = pm.refresh_photo_index()
+
+    assert _filenames(new, "chanel")[-1] == "Chanel Jumbo 2.jpg"
+    assert json.loads(state_file.read_text())["start_page_token"] == "11"
+    assert "chanel" in read_photo_store(str(store_file)).index
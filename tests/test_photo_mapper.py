@@ -290,6 +290,133 @@ class TestFindProductPhotos:
         assert any("Azia" in f for f in filenames)
 
 
+
+class TestPhotoSearchIndex:
+    """Предрассчитанные токены/цвета фото: те же результаты, что и полный перебор."""
+
+    def test_matches_full_scan(self):
+        import gdrive.photo_mapper as pm
+
+        for query in ["сумки", "Chanel 25", "джимми чу азия", "балетки черные", "платье Zara"]:
+            tokens = _tokenize(query)
+            expected = [
+                (_match_score(tokens, img["filename"]), img)
+                for value in pm._photo_index.values()
+                for img in value["images"]
+                if _match_score(tokens, img["filename"]) >= 1
+            ]
+            assert pm._get_photo_search().match(tokens, 1) == expected, query
+
+    def test_index_mutation_rebuilds_search(self):
+        import gdrive.photo_mapper as pm
+
+        before = pm._get_photo_search()
+        assert pm._get_photo_search() is before  # без изменений — те же структуры
+
+        pm._photo_index["новая"] = {
+            "folder_id": "new",
+            "path": "новая",
+            "images": [{"file_id": "z1", "filename": "сумка Zara черные.jpg", "direct_url": ""}],
+        }
+        after = pm._get_photo_search()
+        assert after is not before
+        assert "zara" in after.postings
+        assert pm._image_color({"filename": "сумка Zara черные.jpg"}) == "черные"
+
+
+class TestPhotoSearchCache:
+    """Кэш результатов find_product_photos по (названию, версии индекса)."""
+
+    @pytest.fixture(autouse=True)
+    def fresh_index(self):
+        # Индекс из фикстуры считаем свежим — без пересборки из Drive
+        with patch("gdrive.photo_mapper._is_cache_expired", return_value=False):
+            yield
+
+    @pytest.mark.asyncio
+    async def test_repeated_query_uses_cache(self):
+        import gdrive.photo_mapper as pm
+
+        with patch("gdrive.photo_mapper._search_by_name", wraps=pm._search_by_name) as search:
+            first = await find_product_photos(product_name="Chanel 25")
+            first.clear()  # изменение результата не портит кэш
+            second = await find_product_photos(product_name="chanel 25")
+        assert search.call_count == 1
+        assert second and all("Chanel 25" in p["filename"] for p in second)
+
+    @pytest.mark.asyncio
+    async def test_index_change_invalidates(self):
+        import gdrive.photo_mapper as pm
+
+        assert await find_product_photos(product_name="платье Zara") == []
+        pm._photo_index["платье zara"] = {
+            "folder_id": "zara",
+            "path": "платье zara",
+            "images": [{"file_id": "z1", "filename": "платье Zara 1.jpg", "direct_url": ""}],
+        }
+        photos = await find_product_photos(product_name="платье Zara")
+        assert [p["file_id"] for p in photos] == ["z1"]
+
+    @pytest.mark.asyncio
+    async def test_lru_eviction(self):
+        import gdrive.photo_mapper as pm
+
+        with patch("gdrive.photo_mapper.PHOTO_SEARCH_CACHE_SIZE", 2):
+            for query in ["балетки", "кроссовки", "балетки", "сумки"]:
+                await find_product_photos(product_name=query)
+        assert [name for name, _ in pm._search_cache] == ["балетки", "сумки"]
+
+
+class TestIndexRebuild:
+    """Пересборка индекса: в фоне, одна за раз, старый индекс при неудаче."""
+
+    def test_failed_or_empty_rebuild_keeps_index(self, monkeypatch):
+        import gdrive.photo_mapper as pm
+
+        monkeypatch.setattr(pm, "_load_state", lambda: None)
+        monkeypatch.setattr(pm, "_rebuild_failed_at", None)
+        before = pm._photo_index
+
+        def drive_down(*args, **kwargs):
+            raise ConnectionError("drive down")
+
+        for build in (drive_down, lambda *a, **kw: ({}, {})):
+            monkeypatch.setattr(pm, "build_photo_index_with_folders", build)
+            pm.rebuild_photo_index()
+            assert pm._photo_index is before
+            assert "root" in pm._photo_index
+            assert pm._rebuild_failed_at is not None
+
+    @pytest.mark.asyncio
+    async def test_expired_index_rebuilds_once_in_background(self, monkeypatch):
+        import asyncio
+        import threading
+        import gdrive.photo_mapper as pm
+
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def slow_rebuild():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+
+        monkeypatch.setattr(pm, "_is_cache_expired", lambda: True)
+        monkeypatch.setattr(pm, "_serve_stale", False)
+        monkeypatch.setattr(pm, "_rebuild_failed_at", None)
+        monkeypatch.setattr(pm, "rebuild_photo_index", slow_rebuild)
+
+        # Запросы не ждут пересборку и отвечают по текущему индексу
+        results = await asyncio.gather(*(find_product_photos(product_name="балетки") for _ in range(3)))
+        assert all(len(photos) == 6 for photos in results)
+
+        await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+        await find_product_photos(product_name="балетки")
+        release.set()
+        await pm._rebuild_task
+        assert len(calls) == 1
+
+
 # ── F) Product Key Grouping (from engine.py) ────────────────────────────────
 
 
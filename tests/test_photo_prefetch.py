@@ -0,0 +1,95 @@
+"""
+Тесты скачивания фото заранее (gdrive.photo_prefetch): байты скачиваются
+параллельно с ответом GPT, отправка берёт готовые, неотправленное
+сбрасывается. Drive и Green API подменяются.
+"""
+
+import asyncio
+from unittest.mock import AsyncMock
+
+import pytest
+
+import gdrive.photo_prefetch as pp
+
+
+@pytest.fixture
+def downloads(tmp_path, monkeypatch):
+    credentials = tmp_path / "credentials.json"
+    credentials.write_text("{}")
+    monkeypatch.setattr(pp, "GOOGLE_CREDENTIALS_FILE", str(credentials))
+    monkeypatch.setattr(pp, "photo_prefetcher", pp.PhotoPrefetcher(ttl=60))
+
+    calls = []
+
+    def download_file_bytes(file_id):
+        calls.append(file_id)
+        if file_id == "broken":
+            raise RuntimeError("drive error")
+        return f"bytes:{file_id}".encode()
+
+    monkeypatch.setattr("gdrive.client.download_file_bytes", download_file_bytes)
+    return calls
+
+
+@pytest.mark.asyncio
+async def test_prefetched_bytes_taken_once(downloads):
+    assert pp.prefetch_photos("chat1", ["f1", "f2", "f1"]) == 2
+    assert await pp.take_prefetched("chat1", "f1") == b"bytes:f1"
+    # Забранное второй раз не отдаётся, чужой чат — тоже
+    assert await pp.take_prefetched("chat1", "f1") is None
+    assert await pp.take_prefetched("chat2", "f2") is None
+    assert await pp.take_prefetched("chat1", "f2") == b"bytes:f2"
+    assert sorted(downloads) == ["f1", "f2"]
+    assert pp.get_photo_prefetch_stats()["hits"] == 2
+
+
+@pytest.mark.asyncio
+async def test_failed_download_returns_none(downloads):
+    pp.prefetch_photos("chat1", ["broken"])
+    assert await pp.take_prefetched("chat1", "broken") is None
+
+
+@pytest.mark.asyncio
+async def test_discard_drops_unsent_photos(downloads):
+    pp.prefetch_photos("chat1", ["f1", "f2"])
+    pp.prefetch_photos("chat2", ["f3"])
+    assert pp.discard_prefetched("chat1") == 2
+    assert await pp.take_prefetched("chat1", "f1") is None
+    assert await pp.take_prefetched("chat2", "f3") == b"bytes:f3"
+    assert pp.get_photo_prefetch_stats()["discarded"] == 2
+
+
+@pytest.mark.asyncio
+async def test_expired_entries_purged(downloads, monkeypatch):
+    monkeypatch.setattr(pp, "photo_prefetcher", pp.PhotoPrefetcher(ttl=0))
+    pp.prefetch_photos("chat1", ["f1"])
+    await asyncio.sleep(0.01)
+    pp.prefetch_photos("chat1", ["f2"])
+    assert await pp.take_prefetched("chat1", "f1") is None
+    assert pp.get_photo_prefetch_stats()["pending"] == 1
+
+
+@pytest.mark.asyncio
+async def test_no_prefetch_without_drive_credentials(downloads, monkeypatch, tmp_path):
+    monkeypatch.setattr(pp, "GOOGLE_CREDENTIALS_FILE", str(tmp_path / "missing.json"))
+    assert pp.prefetch_photos("chat1", ["f1"]) == 0
+    assert downloads == []
+
+
+@pytest.mark.asyncio
+async def test_send_multiple_images_uses_prefetched_bytes(downloads, monkeypatch):
+    import greenapi.client as greenapi
+
+    upload = AsyncMock()
+    monkeypatch.setattr(greenapi, "send_image_by_upload", upload)
+    monkeypatch.setattr(greenapi.asyncio, "sleep", AsyncMock())
+
+    pp.prefetch_photos("chat1", ["f1"])
+    await greenapi.send_multiple_images(
+        "chat1",
+        [{"file_id": "f1", "filename": "a.jpg"}, {"file_id": "f2", "filename": "b.jpg"}],
+    )
+
+    assert [c.args[1] for c in upload.await_args_list] == [b"bytes:f1", b"bytes:f2"]
+    # f1 скачан один раз (заранее), f2 — при отправке
+    assert sorted(downloads) == ["f1", "f2"]
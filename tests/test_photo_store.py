@@ -0,0 +1,90 @@
+"""
+Тесты файла индекса фото (gdrive.photo_store) и его загрузки в photo_mapper.
+"""
+
+import json
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+import gdrive.photo_mapper as pm
+from gdrive.photo_store import read_photo_store, write_photo_store
+
+IMAGES = [
+    {"file_id": "c1", "filename": "Сумка черная Chanel 25 1.jpg", "direct_url": ""},
+    {"file_id": "b1", "filename": "Chanel балетки бежевые 1.jpg", "direct_url": ""},
+]
+INDEX = {
+    "root": {"folder_id": "root-id", "path": "", "images": []},
+    "chanel": {"folder_id": "f-chanel", "path": "Сумки/Chanel", "images": IMAGES},
+    "сумки/chanel": {"folder_id": "f-chanel", "path": "Сумки/Chanel", "images": IMAGES},
+}
+
+
+@pytest.fixture
+def files(tmp_path, monkeypatch):
+    store_file, cache_file = tmp_path / "photo_index.db", tmp_path / "photo_index.json"
+    monkeypatch.setattr(pm, "STORE_FILE", str(store_file))
+    monkeypatch.setattr(pm, "CACHE_FILE", str(cache_file))
+    monkeypatch.setattr(pm, "_photo_index", pm.PhotoIndex())
+    monkeypatch.setattr(pm, "_photo_index_build", 0)
+    monkeypatch.setattr(pm, "_photo_index_built_at", None)
+
+    def no_rebuild():
+        raise AssertionError("rebuild must not run")
+
+    monkeypatch.setattr(pm, "rebuild_photo_index", no_rebuild)
+    return store_file, cache_file
+
+
+def test_round_trip_keeps_order_and_features(tmp_path):
+    path = str(tmp_path / "photo_index.db")
+    features = pm._PhotoSearch(INDEX).features()
+    built_at = datetime(2026, 1, 2, 3, 4, 5)
+    write_photo_store(path, INDEX, features, 7, built_at)
+
+    stored = read_photo_store(path)
+
+    assert list(stored.index) == list(INDEX)
+    assert stored.index["chanel"]["images"][0]["direct_url"].endswith("c1")
+    assert [img["file_id"] for img in stored.index["сумки/chanel"]["images"]] == ["c1", "b1"]
+    assert stored.features == features
+    assert (stored.version, stored.built_at) == (7, built_at)
+    # Ключи одной папки делят список фото — в файле он один
+    conn = sqlite3.connect(path)
+    assert conn.execute("SELECT COUNT(*) FROM images").fetchone()[0] == len(IMAGES)
+    conn.close()
+
+
+def test_other_format_is_ignored(tmp_path):
+    path = str(tmp_path / "photo_index.db")
+    write_photo_store(path, INDEX, pm._PhotoSearch(INDEX).features(), 1, datetime.now())
+    conn = sqlite3.connect(path)
+    conn.execute("UPDATE meta SET value = '0' WHERE key = 'format'")
+    conn.commit()
+    conn.close()
+
+    assert read_photo_store(path) is None
+
+
+def test_legacy_json_is_migrated(files, monkeypatch):
+    store_file, cache_file = files
+    cache_file.write_text(json.dumps(INDEX, ensure_ascii=False), encoding="utf-8")
+
+    pm.load_photo_index()
+
+    assert dict(pm._photo_index) == INDEX
+    assert read_photo_store(str(store_file)).index.keys() == INDEX.keys()
+    info = pm.get_photo_index_info()
+    assert info["products"] == 3 and info["version"] == 1 and info["built_at"]
+
+    # Повторная загрузка — из файла индекса, имена файлов не токенизируются
+    cache_file.unlink()
+    monkeypatch.setattr(pm, "_photo_index", pm.PhotoIndex())
+    monkeypatch.setattr(pm, "_tokenize", lambda text: pytest.fail("tokenized on load"))
+    pm.load_photo_index()
+
+    matches = pm._get_photo_search().match({"chanel"}, 1)
+    assert [img["file_id"] for _, img in matches] == ["c1", "b1", "c1", "b1"]
+    assert pm.get_photo_index_info()["version"] == 1
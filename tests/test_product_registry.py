@@ -0,0 +1,88 @@
+"""
+Тесты реестра товаров (catalog.registry): одна запись связывает строку
+каталога, строки наличия и фото. Google Sheets/Drive не используются.
+"""
+
+import pytest
+
+import catalog.registry as registry
+import gdrive.photo_mapper as pm
+from catalog.registry import ProductRegistry
+from inventory.stock_checker import check_product_availability
+
+CATALOG = [
+    {"name": "Jimmy Choo Azia 95", "category": "туфли", "price": "38000₸", "colors": "розовые"},
+    {"name": "Chanel Jumbo Classic Flap", "category": "сумка", "price": "", "colors": "черные"},
+    {"name": "Valentino Garavani", "category": "туфли", "price": "42000₸", "colors": "белые"},
+]
+
+PHOTO_INDEX = {
+    "root": {
+        "folder_id": "root",
+        "path": "",
+        "images": [
+            {"file_id": "azia1", "filename": "туфли розовые Jimmy Choo Azia 95 1.jpg", "direct_url": ""},
+            {"file_id": "jumbo1", "filename": "Сумка черная Chanel Jumbo Classic Flap 1.jpg", "direct_url": ""},
+        ],
+    }
+}
+
+
+@pytest.fixture
+def photo_index(monkeypatch):
+    monkeypatch.setattr(pm, "_photo_index", pm.PhotoIndex(PHOTO_INDEX))
+
+
+def test_record_links_catalog_inventory_and_photos(test_inventory_df, mock_inventory_loader, photo_index):
+    products = ProductRegistry(CATALOG, test_inventory_df)
+
+    record = products.resolve("jimmy choo azia 95")
+    assert record.product is CATALOG[0]
+    assert record.price == "38000₸"
+    assert [p["file_id"] for p in record.photos] == ["azia1"]
+    assert record.stock() == [
+        {"size": "38", "color": "розовые", "quantity": 1},
+        {"size": "39", "color": "розовые", "quantity": 0},
+    ]
+    # Цена из наличия, если в каталоге её нет
+    assert products.resolve("Chanel Jumbo Classic Flap").price == "45000₸"
+
+
+@pytest.mark.parametrize("size,color", [("", ""), ("38", ""), ("39", "розовые"), ("40", ""), ("", "белые")])
+def test_availability_matches_stock_checker(test_inventory_df, mock_inventory_loader, photo_index, size, color):
+    record = ProductRegistry(CATALOG, test_inventory_df).resolve("Jimmy Choo Azia 95")
+    assert record.availability(size, color) == check_product_availability("Jimmy Choo Azia 95", size, color)
+
+
+def test_resolve_by_unique_tokens_only(test_inventory_df, photo_index):
+    products = ProductRegistry(CATALOG + [{"name": "Jimmy Choo Saeda", "price": ""}], test_inventory_df)
+
+    assert products.resolve("Azia").name == "Jimmy Choo Azia 95"
+    assert products.resolve("Azia 95, Jimmy Choo").name == "Jimmy Choo Azia 95"
+    assert products.resolve("Jimmy Choo") is None  # два товара — неоднозначно
+    assert products.resolve("Chanel 25") is None
+    assert products.resolve("") is None
+
+
+def test_find_mentioned_requires_full_name(test_inventory_df, photo_index):
+    products = ProductRegistry(CATALOG + [{"name": "Jimmy Choo Saeda", "price": ""}], test_inventory_df)
+
+    assert products.find_mentioned("Есть Jimmy Choo Azia 95 в наличии?").name == "Jimmy Choo Azia 95"
+    assert products.find_mentioned("покажите chanel jumbo classic flap").name == "Chanel Jumbo Classic Flap"
+    assert products.find_mentioned("есть Jimmy Choo?") is None  # название не полное
+    assert products.find_mentioned("Здравствуйте") is None
+
+
+def test_registry_rebuilt_when_snapshot_changes(monkeypatch, test_inventory_df, photo_index):
+    catalog = list(CATALOG)
+    monkeypatch.setattr(registry, "_registry", None)
+    monkeypatch.setattr(registry, "get_catalog", lambda: catalog)
+    monkeypatch.setattr(registry, "get_inventory_df", lambda: test_inventory_df)
+
+    first = registry.get_product_registry()
+    assert registry.get_product_registry() is first
+
+    pm._photo_index["chanel"] = PHOTO_INDEX["root"]
+    second = registry.get_product_registry()
+    assert second is not first
+    assert registry.resolve_product("Valentino Garavani").price == "42000₸"
@@ -0,0 +1,97 @@
+"""
+Тесты семантического кэша ответов (ai.response_cache). Эмбеддинги —
+детерминированная функция, база — временный SQLite файл.
+"""
+
+import sqlite3
+
+import numpy as np
+import pytest
+
+import ai.response_cache as rc
+
+
+def _fake_embedding(text: str) -> list[float]:
+    # Мешок слов по 64 корзинам — одинаковые слова дают близкие векторы
+    vector = np.zeros(64, dtype=np.float32)
+    for word in text.split():
+        vector[sum(word.encode("utf-8")) % 64] += 1.0
+    return vector.tolist()
+
+
+@pytest.fixture
+def cache_db(tmp_path, monkeypatch):
+    path = str(tmp_path / "test.db")
+    monkeypatch.setattr("db.models.SQLITE_DB_PATH", path)
+    monkeypatch.setattr("db.conversations.SQLITE_DB_PATH", path)
+    from db.models import init_db
+    init_db()
+    return path
+
+
+async def _lookup(question: str, key: str):
+    return await rc.lookup(question, key, _fake_embedding(rc.normalize_question(question)))
+
+
+def test_general_question_detection():
+    assert rc.is_general_question("Какие условия доставки?")
+    assert rc.is_general_question("это оригинал?")
+    assert not rc.is_general_question("хочу Chanel 25")
+
+
+def test_context_key_depends_on_prompt_versions_and_order_state(monkeypatch):
+    key = rc.context_key("scripts-1", "catalog-1", {"product": ""})
+    assert key == rc.context_key("scripts-1", "catalog-1", {"product": ""})
+    assert key != rc.context_key("scripts-2", "catalog-1", {"product": ""})
+    assert key != rc.context_key("scripts-1", "catalog-2", {"product": ""})
+    assert key != rc.context_key("scripts-1", "catalog-1", {"product": "Chanel 25"})
+    assert rc.context_key("s", "c", {"city": "Астана"}) != rc.context_key("s", "c", {"city": "Алматы"})
+    monkeypatch.setattr(rc, "PROMPT_VERSION", "changed")
+    assert key != rc.context_key("scripts-1", "catalog-1", {"product": ""})
+
+
+@pytest.mark.asyncio
+async def test_similar_question_served_from_cache(cache_db):
+    key = rc.context_key("scripts-1", "catalog-1", {})
+
+    probe = await _lookup("Какие условия доставки?", key)
+    assert probe is not None and probe.answer is None
+    await rc.store(probe, "Доставка по Казахстану 2-5 дней")
+
+    hit = await _lookup("какие условия доставки", key)
+    assert hit.answer == "Доставка по Казахстану 2-5 дней"
+    assert hit.similarity == pytest.approx(1.0)
+    # Другой контекст (например, пересобраны скрипты) — промах
+    assert (await _lookup("какие условия доставки", rc.context_key("scripts-2", "catalog-1", {}))).answer is None
+    # Далёкий по смыслу вопрос — промах
+    assert (await _lookup("есть ли рассрочка каспи", key)).answer is None
+
+
+@pytest.mark.asyncio
+async def test_expired_entries_not_served(cache_db):
+    key = rc.context_key("scripts-1", "catalog-1", {})
+    probe = await _lookup("где вы находитесь", key)
+    await rc.store(probe, "Егизбаева 7/2")
+
+    with sqlite3.connect(cache_db) as conn:
+        conn.execute(
+            "UPDATE response_cache SET created_at = datetime('now', ?)",
+            (f"-{rc.RESPONSE_CACHE_TTL + 60} seconds",),
+        )
+    assert (await _lookup("где вы находитесь", key)).answer is None
+
+
+@pytest.mark.asyncio
+async def test_empty_question_or_embedding_disables_cache(cache_db):
+    key = rc.context_key("", "", {})
+    assert await rc.lookup("?!", key, [1.0, 0.0]) is None
+    assert await rc.lookup("где вы находитесь", key, [0.0, 0.0]) is None
+
+
+@pytest.mark.asyncio
+async def test_database_failure_disables_cache(cache_db, monkeypatch):
+    async def broken(*args):
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(rc, "get_cached_responses", broken)
+    assert await _lookup("где вы находитесь", rc.context_key("", "", {})) is None
@@ -0,0 +1,196 @@
+"""
+Тесты общего снимка Google Sheets (gdrive.sheet_snapshot) и построчного
+пересчёта каталога и наличия. Drive и Sheets API замоканы.
+"""
+
+import re
+
+import pandas as pd
+import pytest
+
+import catalog.sheets_loader as sl
+import gdrive.sheet_snapshot as ss
+import inventory.excel_loader as el
+
+HEADERS = ["name", "category", "price", "colors", "descriptions", "кол-во сумки"] + el.SIZE_COLUMNS
+
+
+def _row(name, colors="черные", bag_qty="", **sizes):
+    return [name, "", "38000₸", colors, "", bag_qty] + [sizes.get(f"s{sc}", "") for sc in el.SIZE_COLUMNS]
+
+
+@pytest.fixture
+def sheet(monkeypatch):
+    """Лист в «Google»: values и ревизия меняются тестом, счётчики вызовов API."""
+    state = {
+        "values": [HEADERS, _row("Jimmy Choo Azia 95", s38="1"), _row("Chanel Jumbo", bag_qty="2")],
+        "revision": "1",
+        "downloads": 0,
+        "revision_checks": 0,
+    }
+
+    def fake_revision(spreadsheet_id):
+        state["revision_checks"] += 1
+        return state["revision"]
+
+    def fake_rows(spreadsheet_id):
+        state["downloads"] += 1
+        return iter([list(r) for r in state["values"]])
+
+    monkeypatch.setattr(ss, "_get_revision", fake_revision)
+    monkeypatch.setattr(ss, "iter_sheet_rows", fake_rows)
+    monkeypatch.setattr(ss, "SHEETS_REVISION_CHECK_SECONDS", 0)
+    monkeypatch.setattr(sl, "CATALOG_SHEETS_ID", "sheet-id")
+    monkeypatch.setattr(el, "CATALOG_SHEETS_ID", "sheet-id")
+    ss.reset_sheet_snapshots()
+    yield state
+    ss.reset_sheet_snapshots()
+
+
+def test_unchanged_revision_is_not_downloaded(sheet):
+    first = ss.get_sheet_snapshot("sheet-id")
+    second = ss.get_sheet_snapshot("sheet-id")
+
+    assert sheet["downloads"] == 1
+    assert sheet["revision_checks"] == 2
+    assert ss.same_sheet(first, second)
+
+    sheet["revision"] = "2"
+    assert not ss.same_sheet(first, ss.get_sheet_snapshot("sheet-id"))
+    assert sheet["downloads"] == 2
+
+
+def test_catalog_and_inventory_share_one_download(sheet):
+    catalog = sl.CatalogLoader()
+    inventory = el.InventoryLoader()
+
+    assert len(catalog.refresh()) == 2
+    assert not inventory.refresh().empty
+    assert sheet["downloads"] == 1
+
+
+def test_revision_check_failure_downloads_sheet(sheet, monkeypatch):
+    monkeypatch.setattr(ss, "_get_revision", lambda spreadsheet_id: None)
+    ss.get_sheet_snapshot("sheet-id")
+    ss.get_sheet_snapshot("sheet-id")
+    assert sheet["downloads"] == 2
+
+
+def test_catalog_reuses_unchanged_rows(sheet):
+    catalog = sl.CatalogLoader()
+    before = catalog.refresh()
+
+    sheet["values"][2] = _row("Chanel Jumbo", bag_qty="5")
+    sheet["revision"] = "2"
+    after = catalog.refresh()
+
+    assert after[0] is before[0]  # строка не менялась — тот же объект
+    assert after[1] is not before[1]
+    assert after[1]["кол-во сумки"] == "5"
+
+
+def test_inventory_row_level_update_matches_full_rebuild(sheet, monkeypatch):
+    sheet["values"] += [_row("Golden Goose Super Star", s37="2"), _row("Saint Laurent Opyum", s36="1")]
+    inventory = el.InventoryLoader()
+    inventory.refresh()
+
+    melted = []
+    original_melt = el._melt_sizes
+    monkeypatch.setattr(el, "_melt_sizes", lambda df: melted.append(len(df)) or original_melt(df))
+
+    # Вставка строки сдвигает остальные, одна строка меняется
+    sheet["values"] = [
+        HEADERS,
+        _row("Miu Miu Arcadie", bag_qty="3"),
+        _row("Jimmy Choo Azia 95", s38="1"),
+        _row("Chanel Jumbo", bag_qty="1"),
+        _row("Golden Goose Super Star", s37="2"),
+        _row("Saint Laurent Opyum", s36="1"),
+    ]
+    sheet["revision"] = "2"
+    incremental = inventory.refresh()
+
+    assert melted == [2]  # развёрнуты только вставленная и изменённая строки
+    full = original_melt(el._sheet_to_frame(ss.get_sheet_snapshot("sheet-id")))
+    pd.testing.assert_frame_equal(
+        incremental.reset_index(drop=True).astype(object),
+        el._finalize(full)[0].reset_index(drop=True).astype(object),
+    )
+    assert list(inventory._sheet_rows) == [0] + [1] * 8 + [2] + [3] * 8 + [4] * 8
+
+
+
+def test_inventory_row_level_update_of_sized_row(sheet):
+    sheet["values"] += [_row("Golden Goose Super Star", s37="2"), _row("Saint Laurent Opyum", s36="1")]
+    inventory = el.InventoryLoader()
+    inventory.refresh()
+
+    # Меняется только остаток обуви — развёрнутые строки без сумок
+    sheet["values"][1] = _row("Jimmy Choo Azia 95", s38="4")
+    sheet["revision"] = "2"
+    df = inventory.refresh()
+
+    shoes = df[df["product_name"] == "Jimmy Choo Azia 95"]
+    assert dict(zip(shoes["size"], shoes["quantity"]))[38] == 4
+    assert len(df) == 3 * len(el.SIZE_COLUMNS) + 1
+
+
+def test_inventory_row_level_failure_falls_back_to_full_rebuild(sheet, monkeypatch):
+    sheet["values"] += [_row("Golden Goose Super Star", s37="2"), _row("Saint Laurent Opyum", s36="1")]
+    inventory = el.InventoryLoader()
+    inventory.refresh()
+
+    def broken(*args):
+        raise ValueError("broken merge")
+
+    monkeypatch.setattr(inventory, "_merge_changed", broken)
+    sheet["values"][2] = _row("Chanel Jumbo", bag_qty="7")
+    sheet["revision"] = "2"
+    df = inventory.refresh()
+
+    assert df[df["product_name"] == "Chanel Jumbo"]["quantity"].iloc[0] == 7
+    assert len(inventory._sheet_rows) == len(df)
+
+def test_iter_sheet_rows_reads_past_1000_rows_in_pages(monkeypatch):
+    import gdrive.sheets_client as sc
+
+    total_rows = 2500  # заголовок + 2499 товаров
+    requests = []
+
+    class FakeRequest:
+        def __init__(self, ranges):
+            self.ranges = ranges
+
+        def execute(self):
+            value_ranges = []
+            for r in self.ranges:
+                start, end = map(int, re.search(r"!A(\d+):N(\d+)$", r).groups())
+                value_ranges.append({"values": [[f"row{i}"] for i in range(start, end + 1)]})
+            return {"valueRanges": value_ranges}
+
+    class FakeService:
+        def spreadsheets(self):
+            return self
+
+        def values(self):
+            return self
+
+        def batchGet(self, spreadsheetId, ranges, majorDimension):
+            requests.append(list(ranges))
+            return FakeRequest(ranges)
+
+    monkeypatch.setattr(sc, "get_sheets_service", lambda: FakeService())
+    monkeypatch.setattr(sc, "get_catalog_metadata", lambda sid: {
+        "title": "Каталог",
+        "sheets": [{"title": "Лист1", "sheetId": 0, "index": 0, "rowCount": total_rows, "columnCount": 14}],
+    })
+    monkeypatch.setattr(sc, "SHEETS_BATCH_RANGES", 2)
+
+    rows = list(sc.iter_sheet_rows("sheet-id", page_rows=1000))
+
+    assert len(rows) == total_rows
+    assert rows[0] == ["row1"] and rows[-1] == [f"row{total_rows}"]
+    assert requests == [
+        ["'Лист1'!A1:N1000", "'Лист1'!A1001:N2000"],
+        ["'Лист1'!A2001:N2500"],
+    ]
@@ -77,3 +77,25 @@ def test_format_availability_message_not_found(mock_inventory_loader):
 
     assert "не вижу в наличии" in message
     assert "похожий вариант" in message
+
+
+def test_product_names_tokenized_once_per_snapshot(mock_inventory_loader, monkeypatch):
+    """Названия из таблицы токенизируются один раз на снимок, а не на каждый запрос."""
+    import inventory.stock_index as stock_index
+
+    calls = []
+    original = stock_index.tokenize_text
+
+    def counting_tokenize(text):
+        calls.append(text)
+        return original(text)
+
+    monkeypatch.setattr(stock_index, "tokenize_text", counting_tokenize)
+    monkeypatch.setattr(stock_index, "_cached", None)
+
+    check_product_availability("Jimmy Choo Azia", size="38")
+    first = len(calls)
+    check_product_availability("Chanel Jumbo", color="черный")
+
+    assert first == 3  # уникальные названия, а не строки таблицы
+    assert len(calls) == first
@@ -0,0 +1,38 @@
+"""
+Тесты общего матчера ключевых слов (ai.text_features): результат должен
+совпадать с прямой проверкой `pattern in text.lower()` для каждой подстроки.
+"""
+
+import random
+
+from ai.text_features import _Matcher, keyword_group, text_features
+
+
+def test_matcher_finds_overlapping_and_nested_patterns():
+    patterns = ["фото", "фотк", "покажи", "покажите", "кажи", "ите"]
+    matcher = _Matcher(patterns)
+    text = "покажите фотку"
+    assert matcher.find_all(text) == {p for p in patterns if p in text}
+
+
+def test_matcher_matches_naive_substring_check():
+    rng = random.Random(7)
+    alphabet = "абвгa b"
+    patterns = ["".join(rng.choice(alphabet) for _ in range(rng.randint(1, 4))) for _ in range(40)]
+    matcher = _Matcher(patterns)
+    for _ in range(500):
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 20)))
+        assert matcher.find_all(text) == {p for p in patterns if p and p in text}
+
+
+def test_has_any_and_first_follow_group_order():
+    group = keyword_group(["розов", "черн", "бел"])
+    features = text_features("Есть Черные и белые?")
+    assert features.has_any(group)
+    assert features.first(group) == "черн"
+    assert text_features("Есть синие?").first(group) is None
+
+
+def test_features_are_cached_by_text():
+    assert text_features("покажи фото") is text_features("покажи фото")
+    assert text_features("").keywords == frozenset()
@@ -0,0 +1,77 @@
+"""
+Тесты локального векторного индекса (knowledge.vector_index) и его
+использования в ai.rag.search_scripts.
+"""
+
+import numpy as np
+import pytest
+from unittest.mock import AsyncMock
+
+from knowledge.vector_index import LocalVectorIndex, save_vector_index
+
+
+def _save_sample(index_dir):
+    save_vector_index(
+        "sales_scripts",
+        ids=["a", "b", "c"],
+        embeddings=[[1.0, 0.0, 0.0], [0.0, 2.0, 0.0], [0.6, 0.8, 0.0]],
+        documents=["про доставку", "про оплату", "про доставку и оплату"],
+        metadatas=[{"section": "доставка"}, {"section": "оплата"}, {}],
+        index_dir=str(index_dir),
+    )
+
+
+def test_saved_matrix_is_normalized_float32(tmp_path):
+    _save_sample(tmp_path)
+    index = LocalVectorIndex.load("sales_scripts", str(tmp_path))
+
+    assert index is not None
+    assert len(index) == 3
+    assert index.matrix.dtype == np.float32
+    assert isinstance(index.matrix, np.memmap)
+    assert np.allclose(np.linalg.norm(index.matrix, axis=1), 1.0)
+
+
+def test_query_returns_top_k_by_cosine(tmp_path):
+    _save_sample(tmp_path)
+    index = LocalVectorIndex.load("sales_scripts", str(tmp_path))
+
+    results = index.query([0.0, 5.0, 0.0], n_results=2)
+
+    assert [r["text"] for r in results] == ["про оплату", "про доставку и оплату"]
+    assert results[0]["metadata"] == {"section": "оплата"}
+    assert results[0]["score"] == pytest.approx(1.0)
+
+
+def test_query_k_larger_than_index(tmp_path):
+    _save_sample(tmp_path)
+    index = LocalVectorIndex.load("sales_scripts", str(tmp_path))
+
+    assert len(index.query([1.0, 0.0, 0.0], n_results=10)) == 3
+    assert index.query([0.0, 0.0, 0.0], n_results=3) == []
+
+
+def test_load_missing_returns_none(tmp_path):
+    assert LocalVectorIndex.load("sales_scripts", str(tmp_path)) is None
+
+
+@pytest.mark.asyncio
+async def test_search_scripts_uses_local_index(tmp_path, monkeypatch):
+    import ai.rag as rag
+
+    _save_sample(tmp_path)
+    monkeypatch.setattr(rag, "SCRIPTS_RETRIEVER", "numpy")
+    monkeypatch.setattr(rag, "_scripts_index", LocalVectorIndex.load("sales_scripts", str(tmp_path)))
+    monkeypatch.setattr(rag, "_scripts_index_checked", True)
+    monkeypatch.setattr(rag, "get_embedding", AsyncMock(return_value=[1.0, 0.1, 0.0]))
+    monkeypatch.setattr(rag.chroma_client, "get_collection", lambda name: pytest.fail("Chroma must not be used"))
+
+    monkeypatch.setattr(rag, "_query_embeddings", type(rag._query_embeddings)())
+
+    results = await rag.search_scripts("как доставка?", n_results=1)
+
+    assert [r["text"] for r in results] == ["про доставку"]
+    # Эмбеддинг запроса доступен кэшу ответов без второго запроса к API
+    assert rag.cached_query_embedding("как доставка?") == [1.0, 0.1, 0.0]
+    assert rag.get_embedding.await_count == 1
+    assert rag.get_scripts_version() == rag._scripts_index.version != ""